@@ -0,0 +1,331 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query used as a cache key"""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def chunk_fingerprint(chunk: Dict[str, Any]) -> str:
+    """
+    Cache key of a chunk: its ID plus a hash of its text. Chunk IDs survive
+    re-indexing a changed paper, so results computed from a chunk's text
+    (answers, re-rank scores) must not be keyed by the ID alone.
+    """
+    digest = hashlib.blake2b(chunk.get("text", "").encode("utf-8"), digest_size=8).hexdigest()
+    return f"{chunk['chunk_id']}#{digest}"
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = 3600.0):
+        """
+        Args:
+            max_size: Maximum number of entries kept
+            ttl_seconds: Entry lifetime in seconds (None keeps entries until evicted)
+        """
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value or None, counting the hit or miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries when full"""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry (hit and miss counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class GraphCache:
+    """
+    Thread-safe, size-bounded LRU cache of graph query results.
+
+    Each entry remembers the graph version it was computed at. get() only
+    returns entries of the requested version that are younger than the TTL,
+    but outdated entries stay cached (until evicted) so that get_stale() can
+    serve them while the graph database is unreachable.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl_seconds: Optional[float] = 3600.0):
+        """
+        Args:
+            max_size: Maximum number of entries kept
+            ttl_seconds: Lifetime of a fresh entry in seconds (None: until the graph version changes)
+        """
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        """Return the value cached for key at this graph version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_version, stored_at = entry
+                if entry_version == version and (not self.ttl_seconds or time.monotonic() - stored_at < self.ttl_seconds):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """Return the last value cached for key regardless of version and age, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, version: Any):
+        """Store a value computed at the given graph version"""
+        with self._lock:
+            self._entries[key] = (value, version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers.
+
+    Entries are grouped by the set of chunks the answer was generated from,
+    identified by their chunk_fingerprint so that a chunk whose text changed
+    in a new index version no longer matches. A lookup hits when the same
+    chunk set was retrieved and the query embedding is within a cosine-similarity threshold of a cached query.
+    With db_path set, entries are also written to an SQLite file and
+    reloaded on startup.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: Optional[float] = 86400.0,
+                 similarity_threshold: float = 0.95, db_path: Optional[str] = None,
+                 max_queries_per_chunk_set: int = 8):
+        """
+        Args:
+            max_entries: Maximum number of chunk sets kept (LRU eviction)
+            ttl_seconds: Entry lifetime in seconds (None keeps entries until evicted)
+            similarity_threshold: Minimum cosine similarity between query embeddings
+            db_path: Optional SQLite file that persists the cache across restarts
+            max_queries_per_chunk_set: Query embeddings remembered per chunk set
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_queries_per_chunk_set = max(1, int(max_queries_per_chunk_set))
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+        if db_path:
+            self._open_db()
+
+    @staticmethod
+    def chunk_set_key(chunk_keys) -> str:
+        return "|".join(sorted(str(key) for key in chunk_keys))
+
+    def _open_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                chunk_key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS answer_cache_key ON answer_cache (chunk_key)")
+        self._db.commit()
+
+        # Rows trimmed in memory below are deleted from the file as well, so
+        # it stays within max_entries x max_queries_per_chunk_set rows
+        self._trim_db()
+
+        rows = self._db.execute(
+            "SELECT chunk_key, vector, answer, created FROM answer_cache ORDER BY created, rowid"
+        ).fetchall()
+        for chunk_key, vector, answer, created in rows:
+            queries = self._entries.setdefault(chunk_key, [])
+            queries.append((np.frombuffer(vector, dtype=np.float32), json.loads(answer), created))
+            self._entries.move_to_end(chunk_key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._entries.popitem(last=False)[0])
+        self._db.executemany("DELETE FROM answer_cache WHERE chunk_key = ?", [(key,) for key in evicted])
+        self._db.commit()
+        print(f"SUCCESS: Loaded {len(self._entries)} cached answer sets from {self.db_path}")
+
+    def _trim_db(self, chunk_key: Optional[str] = None):
+        """
+        Delete expired rows and, for chunk_key (or every chunk set), all but the
+        newest max_queries_per_chunk_set rows. The caller commits.
+        """
+        if self.ttl_seconds:
+            self._db.execute("DELETE FROM answer_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+        if chunk_key is not None:
+            self._db.execute("""
+                DELETE FROM answer_cache WHERE chunk_key = ? AND rowid NOT IN (
+                    SELECT rowid FROM answer_cache WHERE chunk_key = ?
+                    ORDER BY created DESC, rowid DESC LIMIT ?
+                )
+            """, (chunk_key, chunk_key, self.max_queries_per_chunk_set))
+        else:
+            self._db.execute("""
+                DELETE FROM answer_cache WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY chunk_key ORDER BY created DESC, rowid DESC
+                        ) AS position FROM answer_cache
+                    ) WHERE position > ?
+                )
+            """, (self.max_queries_per_chunk_set,))
+
+    def get(self, chunk_keys, query_vector) -> Optional[Dict[str, Any]]:
+        """Return the cached answer for a matching chunk set and similar query, or None"""
+        chunk_key = self.chunk_set_key(chunk_keys)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        with self._lock:
+            queries = self._entries.get(chunk_key)
+            if queries:
+                if self.ttl_seconds:
+                    cutoff = time.time() - self.ttl_seconds
+                    queries[:] = [entry for entry in queries if entry[2] >= cutoff]
+                if queries:
+                    # Query vectors are L2-normalized, so the dot product is the cosine
+                    similarities = np.stack([entry[0] for entry in queries]) @ query_vector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        self._entries.move_to_end(chunk_key)
+                        self.hits += 1
+                        return queries[best][1]
+            self.misses += 1
+            return None
+
+    def put(self, chunk_keys, query_vector, answer_data: Dict[str, Any]):
+        """Store an answer generated from the chunks with chunk_keys for the given query embedding"""
+        chunk_key = self.chunk_set_key(chunk_keys)
+        vector = np.array(query_vector, dtype=np.float32)
+        created = time.time()
+        with self._lock:
+            queries = self._entries.setdefault(chunk_key, [])
+            queries.append((vector, answer_data, created))
+            del queries[:-self.max_queries_per_chunk_set]
+            self._entries.move_to_end(chunk_key)
+
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT INTO answer_cache (chunk_key, vector, answer, created) VALUES (?, ?, ?, ?)",
+                        (chunk_key, vector.tobytes(), json.dumps(answer_data), created)
+                    )
+                    self._db.executemany("DELETE FROM answer_cache WHERE chunk_key = ?", [(key,) for key in evicted])
+                    self._trim_db(chunk_key)
+                    self._db.commit()
+                except Exception as e:
+                    print(f"WARNING: Failed to persist cached answer: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answer_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "similarity_threshold": self.similarity_threshold,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,388 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import shutil
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+STORE_VERSION = 1
+
+TEXT_FILE = "text.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+CHUNK_ID_FILE = "chunk_ids.bin"
+CHUNK_ID_OFFSETS_FILE = "chunk_id_offsets.npy"
+PAPER_CODES_FILE = "paper_codes.npy"
+PAGE_NUMS_FILE = "page_nums.npy"
+PAPER_ROWS_FILE = "paper_rows.npy"
+PAPER_BOUNDS_FILE = "paper_bounds.npy"
+PAPERS_FILE = "papers.json"
+LABELS_FILE = "labels.npy"
+META_FILE = "meta.json"
+
+
+def chunk_label(paper_id, chunk_id) -> int:
+    """
+    Stable 63-bit FAISS id of a chunk, derived from its paper and chunk IDs,
+    so a chunk keeps its id when other papers are added or removed
+    """
+    key = f"{paper_id}\x1f{chunk_id}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") & 0x7FFFFFFFFFFFFFFF
+
+
+def assign_chunk_ids(chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield chunks with paper_id as a string and a chunk_id. Chunks without one
+    (ingestion/create_chunks.py writes none) get "<paper_id>_<n>", n being the
+    chunk's position among the chunks of its paper in the file, so the FAISS
+    index, chunk store and Neo4j Documents all derive the same ID.
+    """
+    positions: Dict[str, int] = {}
+    for chunk in chunks:
+        paper_id = chunk["paper_id"] = str(chunk["paper_id"])
+        position = positions.get(paper_id, 0)
+        positions[paper_id] = position + 1
+        if not chunk.get("chunk_id"):
+            chunk["chunk_id"] = f"{paper_id}_{position}"
+        yield chunk
+
+
+def chunk_labels(chunks: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """chunk_label of every chunk; raises ValueError on duplicate chunk IDs"""
+    labels = np.fromiter((chunk_label(chunk["paper_id"], chunk["chunk_id"]) for chunk in chunks), dtype=np.int64)
+    if len(np.unique(labels)) != len(labels):
+        raise ValueError("Duplicate (paper_id, chunk_id) pairs in chunks")
+    return labels
+
+
+def _save_array(directory: str, name: str, array: np.ndarray):
+    with open(os.path.join(directory, name), "wb") as f:
+        np.save(f, array)
+
+
+def _columns(chunks: Iterable[Dict[str, Any]], text_sink, chunk_id_sink):
+    """
+    Stream chunks into the two byte sinks and return the per-row columns.
+
+    Paper codes are assigned in order of first appearance.
+    """
+    text_offsets = [0]
+    chunk_id_offsets = [0]
+    paper_codes = []
+    page_nums = []
+    papers = {}
+
+    for row, chunk in enumerate(chunks):
+        text = chunk.get("text", "").encode("utf-8")
+        chunk_id = str(chunk.get("chunk_id", row)).encode("utf-8")
+        text_sink.write(text)
+        chunk_id_sink.write(chunk_id)
+        text_offsets.append(text_offsets[-1] + len(text))
+        chunk_id_offsets.append(chunk_id_offsets[-1] + len(chunk_id))
+        paper_codes.append(papers.setdefault(str(chunk.get("paper_id", f"unknown_{row}")), len(papers)))
+        page_nums.append(int(chunk.get("page_num", 1)))
+
+    paper_codes = np.asarray(paper_codes, dtype=np.int32)
+    counts = np.bincount(paper_codes, minlength=len(papers)) if len(paper_codes) else np.zeros(len(papers), dtype=np.int64)
+    return {
+        "text_offsets": np.asarray(text_offsets, dtype=np.int64),
+        "chunk_id_offsets": np.asarray(chunk_id_offsets, dtype=np.int64),
+        "paper_codes": paper_codes,
+        "page_nums": np.asarray(page_nums, dtype=np.int32),
+        # Rows grouped by paper: rows of paper c are paper_rows[bounds[c]:bounds[c + 1]]
+        "paper_rows": np.argsort(paper_codes, kind="stable").astype(np.int64),
+        "paper_bounds": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        "papers": list(papers),
+    }
+
+
+def write_chunk_store(chunks: Iterable[Dict[str, Any]], directory, labels: Optional[np.ndarray] = None) -> str:
+    """
+    Write chunks (in FAISS row order) as a columnar store that ChunkStore maps read-only.
+
+    labels are the FAISS ids of the rows when the index is ID-mapped
+    (see chunk_labels); without them the FAISS id of a chunk is its row.
+
+    The store is written to a sibling directory and swapped into place, so a
+    process that still maps the previous store keeps a consistent view.
+    """
+    directory = os.path.abspath(str(directory))
+    tmp_dir = directory + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    with open(os.path.join(tmp_dir, TEXT_FILE), "wb") as text_sink, \
+         open(os.path.join(tmp_dir, CHUNK_ID_FILE), "wb") as chunk_id_sink:
+        columns = _columns(chunks, text_sink, chunk_id_sink)
+
+    _save_array(tmp_dir, TEXT_OFFSETS_FILE, columns["text_offsets"])
+    _save_array(tmp_dir, CHUNK_ID_OFFSETS_FILE, columns["chunk_id_offsets"])
+    _save_array(tmp_dir, PAPER_CODES_FILE, columns["paper_codes"])
+    _save_array(tmp_dir, PAGE_NUMS_FILE, columns["page_nums"])
+    _save_array(tmp_dir, PAPER_ROWS_FILE, columns["paper_rows"])
+    _save_array(tmp_dir, PAPER_BOUNDS_FILE, columns["paper_bounds"])
+    if labels is not None:
+        if len(labels) != len(columns["paper_codes"]):
+            raise ValueError(f"{len(labels)} labels for {len(columns['paper_codes'])} chunks")
+        _save_array(tmp_dir, LABELS_FILE, np.asarray(labels, dtype=np.int64))
+    with open(os.path.join(tmp_dir, PAPERS_FILE), "w", encoding="utf-8") as f:
+        json.dump(columns["papers"], f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"version": STORE_VERSION, "chunks": len(columns["paper_codes"]),
+                   "papers": len(columns["papers"])}, f)
+
+    # Unlink the old store rather than overwrite it: running workers keep their mapping
+    old_dir = directory + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old_dir)
+    os.rename(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return directory
+
+
+def _map_bytes(path: str):
+    """Read-only mapping of a file (mmap cannot map empty files)"""
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ChunkStore:
+    """
+    Read-only columnar view of the chunk metadata.
+
+    Text and chunk IDs live in contiguous byte buffers indexed by offset
+    arrays, paper IDs are integer codes, and rows are pre-grouped by paper.
+    Opened from disk every column is memory-mapped, so nothing is built per
+    chunk until it is looked up. Indexing by FAISS row returns the same
+    dictionary shape as chunk_metadata.json entries.
+    """
+
+    def __init__(self, text, text_offsets, chunk_ids, chunk_id_offsets, paper_codes, page_nums,
+                 paper_rows, paper_bounds, papers: List[str], directory: Optional[str] = None,
+                 labels: Optional[np.ndarray] = None):
+        self._text = text
+        self._text_offsets = text_offsets
+        self._chunk_ids = chunk_ids
+        self._chunk_id_offsets = chunk_id_offsets
+        self._paper_codes = paper_codes
+        self._page_nums = page_nums
+        self._paper_rows = paper_rows
+        self._paper_bounds = paper_bounds
+        self.papers = papers
+        self._paper_code = {paper_id: code for code, paper_id in enumerate(papers)}
+        self.directory = directory
+        # FAISS id of each row for ID-mapped indexes (None: the id is the row)
+        self.labels = labels
+
+    @classmethod
+    def open(cls, directory) -> "ChunkStore":
+        """Map a store written by write_chunk_store"""
+        directory = str(directory)
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported chunk store version {meta.get('version')} in {directory}")
+        with open(os.path.join(directory, PAPERS_FILE), "r", encoding="utf-8") as f:
+            papers = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        return cls(
+            text=_map_bytes(os.path.join(directory, TEXT_FILE)),
+            text_offsets=load(TEXT_OFFSETS_FILE),
+            chunk_ids=_map_bytes(os.path.join(directory, CHUNK_ID_FILE)),
+            chunk_id_offsets=load(CHUNK_ID_OFFSETS_FILE),
+            paper_codes=load(PAPER_CODES_FILE),
+            page_nums=load(PAGE_NUMS_FILE),
+            paper_rows=load(PAPER_ROWS_FILE),
+            paper_bounds=load(PAPER_BOUNDS_FILE),
+            papers=papers,
+            directory=directory,
+            labels=load(LABELS_FILE) if os.path.exists(os.path.join(directory, LABELS_FILE)) else None,
+        )
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Dict[str, Any]], labels: Optional[np.ndarray] = None) -> "ChunkStore":
+        """Build an in-memory store, e.g. from a chunk_metadata.json of an older build"""
+        text_sink, chunk_id_sink = io.BytesIO(), io.BytesIO()
+        columns = _columns(chunks, text_sink, chunk_id_sink)
+        return cls(
+            text=text_sink.getvalue(),
+            text_offsets=columns["text_offsets"],
+            chunk_ids=chunk_id_sink.getvalue(),
+            chunk_id_offsets=columns["chunk_id_offsets"],
+            paper_codes=columns["paper_codes"],
+            page_nums=columns["page_nums"],
+            paper_rows=columns["paper_rows"],
+            paper_bounds=columns["paper_bounds"],
+            papers=columns["papers"],
+            labels=None if labels is None else np.asarray(labels, dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self._paper_codes)
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"chunk row {row} out of range")
+        return {
+            "paper_id": self.paper_id(row),
+            "chunk_id": self.chunk_id(row),
+            "text": self.text(row),
+            "page_num": int(self._page_nums[row]),
+        }
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def text(self, row: int) -> str:
+        start, end = self._text_offsets[row], self._text_offsets[row + 1]
+        return self._text[start:end].decode("utf-8")
+
+    def chunk_id(self, row: int) -> str:
+        start, end = self._chunk_id_offsets[row], self._chunk_id_offsets[row + 1]
+        return self._chunk_ids[start:end].decode("utf-8")
+
+    def paper_id(self, row: int) -> str:
+        return self.papers[self._paper_codes[row]]
+
+    def page_num(self, row: int) -> int:
+        return int(self._page_nums[row])
+
+    @property
+    def paper_count(self) -> int:
+        return len(self.papers)
+
+    def has_paper(self, paper_id) -> bool:
+        return str(paper_id) in self._paper_code
+
+    def paper_rows(self, paper_id) -> np.ndarray:
+        """FAISS rows of a paper's chunks, in chunk order (empty for unknown papers)"""
+        code = self._paper_code.get(str(paper_id))
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(self._paper_rows[self._paper_bounds[code]:self._paper_bounds[code + 1]])
+
+    def rows_for_papers(self, paper_ids) -> np.ndarray:
+        """FAISS rows of every chunk belonging to the given papers"""
+        rows = [self.paper_rows(paper_id) for paper_id in paper_ids]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def nbytes(self) -> int:
+        """Bytes held by the columns (mapped from disk when opened with ChunkStore.open)"""
+        return sum(len(buffer) for buffer in (self._text, self._chunk_ids)) + sum(
+            array.nbytes for array in (self._text_offsets, self._chunk_id_offsets, self._paper_codes,
+                                       self._page_nums, self._paper_rows, self._paper_bounds)
+        )
+
+
+def _rss_mb() -> Dict[str, float]:
+    """
+    Resident memory of this process in MiB (Linux), split into private
+    (anonymous) pages and file-backed pages, which for the store are page
+    cache shared by every worker mapping the same files
+    """
+    rss = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                rss[key] = int(value.split()[0]) / 1024.0
+    return {"rss": rss.get("VmRSS", 0.0), "anon": rss.get("RssAnon", 0.0), "file": rss.get("RssFile", 0.0)}
+
+
+def _benchmark_worker(mode: str, workdir: str, lookups: int) -> Dict[str, float]:
+    """Load chunk metadata the old way (json) or through the store and touch random rows"""
+    import random
+    import time
+    from collections import defaultdict
+
+    before = _rss_mb()
+    start = time.perf_counter()
+    if mode == "json":
+        with open(os.path.join(workdir, "chunk_metadata.json"), "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        # What RAGService._build_paper_chunks_map used to build on top
+        paper_map = defaultdict(list)
+        for i, chunk in enumerate(chunks):
+            paper_map[chunk["paper_id"]].append({"chunk_id": chunk["chunk_id"], "text": chunk["text"],
+                                                 "page_num": chunk.get("page_num", 1), "index": i})
+    else:
+        chunks = ChunkStore.open(os.path.join(workdir, "chunk_store"))
+    load_s = time.perf_counter() - start
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        chunk = chunks[rng.randrange(len(chunks))]
+        _ = chunk["text"]
+    lookup_us = (time.perf_counter() - start) / max(1, lookups) * 1e6
+    return {"rss_before_mb": before, "rss_after_mb": _rss_mb(), "load_s": load_s, "lookup_us": lookup_us}
+
+
+def _benchmark(sizes: List[int], text_chars: int, chunks_per_paper: int, lookups: int, workdir: str):
+    """Write synthetic corpora and measure each loader in a fresh interpreter"""
+    import subprocess
+    import sys
+
+    words = "microgravity spaceflight bone loss mice gene expression radiation muscle atrophy".split()
+    report = []
+    for size in sizes:
+        size_dir = os.path.join(workdir, str(size))
+        os.makedirs(size_dir, exist_ok=True)
+
+        def synthetic():
+            for row in range(size):
+                paper = row // chunks_per_paper
+                text = " ".join(words[(row + i) % len(words)] for i in range(text_chars // 8))[:text_chars]
+                yield {"paper_id": f"PMC{paper}", "chunk_id": f"PMC{paper}_{row % chunks_per_paper}",
+                       "text": text, "page_num": 1 + (row % chunks_per_paper) // 4}
+
+        with open(os.path.join(size_dir, "chunk_metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(list(synthetic()), f, ensure_ascii=False, indent=2)
+        write_chunk_store(synthetic(), os.path.join(size_dir, "chunk_store"))
+
+        for mode in ("json", "store"):
+            code = (f"import json, sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+                    f"from chunk_store import _benchmark_worker; "
+                    f"print(json.dumps(_benchmark_worker({mode!r}, {size_dir!r}, {lookups})))")
+            output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result.update(chunks=size, mode=mode)
+            report.append(result)
+            before, after = result["rss_before_mb"], result["rss_after_mb"]
+            print(f"{size:>9} chunks  {mode:<5}  RSS {before['rss']:7.1f} -> {after['rss']:7.1f} MiB "
+                  f"(private {before['anon']:7.1f} -> {after['anon']:7.1f}, file-backed {after['file']:7.1f})  "
+                  f"load {result['load_s']:6.2f} s  lookup {result['lookup_us']:6.1f} us")
+        shutil.rmtree(size_dir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="RSS of chunk_metadata.json vs. the columnar chunk store")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--text-chars", type=int, default=500, help="Characters per synthetic chunk")
+    parser.add_argument("--chunks-per-paper", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--workdir", default=None, help="Scratch directory (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="chunk_store_bench_")
+    try:
+        _benchmark(args.sizes, args.text_chars, args.chunks_per_paper, args.lookups, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
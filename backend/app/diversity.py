@@ -0,0 +1,63 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def mmr_select(query_vector: np.ndarray, candidate_vectors: np.ndarray, k: int, lambda_mult: float = 0.7,
+               groups: Optional[Sequence] = None, max_per_group: Optional[int] = None) -> List[int]:
+    """
+    Maximal Marginal Relevance selection over a candidate embedding matrix.
+
+    Each step picks the candidate maximizing
+        lambda * sim(query, c) - (1 - lambda) * max(sim(c, selected))
+    keeping the running max similarity to the selected set as one vector,
+    so a step costs a single (n, d) @ (d,) product.
+
+    Args:
+        query_vector: (d,) normalized query embedding
+        candidate_vectors: (n, d) normalized candidate embeddings
+        k: Number of candidates to select
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+        groups: Optional group label per candidate (e.g. paper_id)
+        max_per_group: Maximum number of selected candidates per group
+
+    Returns:
+        Candidate positions in selection order
+    """
+    candidate_vectors = np.asarray(candidate_vectors, dtype=np.float32)
+    n = len(candidate_vectors)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    relevance = candidate_vectors @ np.asarray(query_vector, dtype=np.float32)
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    group_codes = group_counts = None
+    if groups is not None and max_per_group:
+        _, group_codes = np.unique(np.asarray(groups, dtype=object).astype(str), return_inverse=True)
+        group_counts = np.zeros(group_codes.max() + 1, dtype=np.int64)
+
+    selected = []
+    for _ in range(k):
+        if selected:
+            scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        if not available[best]:
+            break
+
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, candidate_vectors @ candidate_vectors[best], out=max_similarity)
+
+        if group_codes is not None:
+            group = group_codes[best]
+            group_counts[group] += 1
+            if group_counts[group] >= max_per_group:
+                available[group_codes == group] = False
+
+    return selected
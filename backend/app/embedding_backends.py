@@ -0,0 +1,282 @@
+"""
+Embedding model backends.
+
+"torch" is the sentence-transformers model. "onnx" and "onnx-int8" run the
+same MiniLM model exported to ONNX (optionally with int8 dynamic
+quantization) on ONNX Runtime, which needs neither torch at query time nor
+its memory footprint. Both expose the subset of the SentenceTransformer API
+used by RAGService and BatchEmbeddingCreator.
+
+Export, parity check and throughput benchmark:
+
+    python -m app.embedding_backends export [--quantize]
+    python -m app.embedding_backends check [--backend onnx-int8]
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# torch | onnx | onnx-int8
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("RAG_ONNX_MODEL_DIR", os.path.join(backend_dir, "data", "models", "all-MiniLM-L6-v2-onnx"))
+ONNX_THREADS = int(os.getenv("RAG_ONNX_THREADS", "0"))  # 0 lets ONNX Runtime decide
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+
+def export_onnx(model_name: str = DEFAULT_MODEL_NAME, output_dir: str = ONNX_MODEL_DIR,
+                quantize: bool = True, opset: int = 14) -> Path:
+    """
+    Export the transformer of a sentence-transformers model to ONNX.
+
+    Writes model.onnx, the fast tokenizer (tokenizer.json), and with quantize
+    an int8 dynamically quantized model.int8.onnx. Pooling and normalization
+    are done by OnnxEmbeddingModel, so only the transformer is exported.
+    Needs torch, transformers and onnxruntime.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    dummy = tokenizer(["an example sentence"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    onnx_path = output_dir / ONNX_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(dummy[name] for name in input_names),
+            str(onnx_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    tokenizer.save_pretrained(str(output_dir))
+    with open(output_dir / "embedding_config.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": st_model.max_seq_length,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "input_names": input_names,
+        }, f, indent=2)
+    print(f"✅ Exported {model_name} to {onnx_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(onnx_path), str(output_dir / ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+        print(f"✅ Quantized model written to {output_dir / ONNX_INT8_FILE}")
+
+    return onnx_path
+
+
+class OnnxEmbeddingModel:
+    """
+    Mean-pooled, L2-normalized sentence embeddings from an exported MiniLM
+    model on ONNX Runtime.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = False, threads: int = ONNX_THREADS):
+        """
+        Args:
+            model_dir: Directory written by export_onnx
+            quantized: Use the int8 model instead of the float32 one
+            threads: Intra-op threads (0 lets ONNX Runtime decide)
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        with open(model_dir / "embedding_config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+        self.model_name = config["model_name"]
+        self.max_seq_length = config["max_seq_length"]
+        self.dimension = config["dimension"]
+        self.input_names = config["input_names"]
+        self.quantized = quantized
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = ONNX_INT8_FILE if quantized else ONNX_FILE
+        self.session = ort.InferenceSession(str(model_dir / model_file), options, providers=["CPUExecutionProvider"])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Encode sentences into a (n, dimension) float32 array"""
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        batch_size = max(1, int(batch_size))
+
+        batches = range(0, len(sentences), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            batches = tqdm(batches, desc="Batches")
+
+        embeddings = []
+        for start in batches:
+            encodings = self.tokenizer.encode_batch(list(sentences[start:start + batch_size]))
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+
+            # Mean pooling over real tokens, then L2 normalization (as in the
+            # Pooling + Normalize modules of all-MiniLM-L6-v2)
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings.append(pooled.astype(np.float32))
+
+        if not embeddings:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.concatenate(embeddings)
+
+
+def load_embedding_model(model_name: str = DEFAULT_MODEL_NAME, backend: Optional[str] = None,
+                         model_dir: str = ONNX_MODEL_DIR):
+    """
+    Load the embedding model for a backend (default: RAG_EMBEDDING_BACKEND).
+
+    The ONNX backends export the model on first use when model_dir does not
+    hold an export yet.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    quantized = backend == "onnx-int8"
+    model_file = Path(model_dir) / (ONNX_INT8_FILE if quantized else ONNX_FILE)
+    if not model_file.exists():
+        print(f"⚠️ No ONNX export at {model_file}, exporting {model_name}")
+        export_onnx(model_name, model_dir, quantize=quantized)
+    return OnnxEmbeddingModel(model_dir, quantized=quantized)
+
+
+def _sample_texts(n: int) -> List[str]:
+    """Chunk texts from the built index, or generic sentences when there is none"""
+    try:
+        from .index_snapshot import resolve_index_dir
+    except ImportError:
+        from index_snapshot import resolve_index_dir
+    _, index_dir = resolve_index_dir(os.path.join(backend_dir, "data", "embeddings"))
+    metadata_path = os.path.join(index_dir, "chunk_metadata.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            texts = [chunk["text"] for chunk in json.load(f)[:n]]
+        if texts:
+            return texts
+    base = [
+        "How does microgravity affect bone density in mice?",
+        "Spaceflight alters gene expression in the immune system.",
+        "Radiation exposure during long-duration missions",
+        "Plant root growth on the International Space Station",
+    ]
+    return [base[i % len(base)] + f" (sample {i})" for i in range(n)]
+
+
+def _throughput(model, texts: List[str], batch_size: int, repeats: int = 3) -> float:
+    """Best-of-repeats sentences per second"""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def check_backend(backend: str = "onnx-int8", model_name: str = DEFAULT_MODEL_NAME, n_texts: int = 256,
+                  min_cosine: float = 0.99, model_dir: str = ONNX_MODEL_DIR) -> dict:
+    """
+    Compare a backend against the torch model: per-sentence cosine similarity
+    of the embeddings and throughput for single queries and batches.
+    """
+    texts = _sample_texts(n_texts)
+    reference = load_embedding_model(model_name, "torch")
+    candidate = load_embedding_model(model_name, backend, model_dir)
+
+    expected = reference.encode(texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+    actual = candidate.encode(texts, batch_size=32, convert_to_numpy=True)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    actual /= np.linalg.norm(actual, axis=1, keepdims=True)
+    cosine = (expected * actual).sum(axis=1)
+
+    report = {
+        "backend": backend,
+        "texts": len(texts),
+        "cosine_min": float(cosine.min()),
+        "cosine_mean": float(cosine.mean()),
+        "min_cosine_required": min_cosine,
+        "parity_ok": bool(cosine.min() >= min_cosine),
+        "throughput": {},
+    }
+    for name, model in (("torch", reference), (backend, candidate)):
+        report["throughput"][name] = {
+            "batch_1_per_sec": _throughput(model, texts[:64], 1),
+            "batch_32_per_sec": _throughput(model, texts, 32),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and check the ONNX embedding backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export the model to ONNX")
+    export_parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    export_parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    export_parser.add_argument("--quantize", action="store_true", help="Also write the int8 model")
+
+    check_parser = subparsers.add_parser("check", help="Parity and throughput against torch")
+    check_parser.add_argument("--backend", default="onnx-int8", choices=("onnx", "onnx-int8"))
+    check_parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    check_parser.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    check_parser.add_argument("--texts", type=int, default=256)
+    check_parser.add_argument("--min-cosine", type=float, default=0.99)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_onnx(args.model, args.output_dir, quantize=args.quantize)
+    else:
+        report = check_backend(args.backend, args.model, args.texts, args.min_cosine, args.model_dir)
+        print(json.dumps(report, indent=2))
+        if not report["parity_ok"]:
+            print(f"❌ Parity check failed: min cosine {report['cosine_min']:.4f} < {args.min_cosine}")
+            raise SystemExit(1)
+        print("✅ Parity check passed")
@@ -0,0 +1,208 @@
+"""
+Dictionary-based entity linking for queries.
+
+All Organism, Gene, Mission, Assay, ExperimentType/Experiment and Outcome
+names, taken from Neo4j or from the data/entities/*.jsonl extraction files,
+are compiled into an Aho-Corasick automaton. A query is matched against every
+name in one pass over its characters, and the longest non-overlapping
+whole-word matches are returned with the canonical IDs ("Label:name") of the
+nodes they name.
+
+pyahocorasick is used when installed; otherwise an equivalent pure-Python
+automaton is built.
+"""
+import glob
+import json
+import os
+import re
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from .fulltext import ENTITY_LABELS
+except ImportError:
+    from fulltext import ENTITY_LABELS
+
+# Names shorter than this (after normalization) are not linked
+MIN_NAME_LENGTH = int(os.getenv("RAG_ENTITY_MIN_LENGTH", "3"))
+# Longer names are sentences (Outcome descriptions) that never occur in a query
+MAX_NAME_WORDS = 8
+
+# Entity names that are ordinary words in a question
+STOPWORDS = {
+    "the", "and", "for", "with", "what", "which", "who", "how", "why", "when", "where",
+    "are", "was", "were", "does", "did", "has", "have", "not", "all", "any", "can",
+    "from", "that", "this", "these", "those", "into", "than", "then", "there", "their",
+}
+
+# Extraction file keys and the labels load_to_neo4j.py gives their nodes
+FILE_KEY_LABELS = {
+    "organism": "Organism",
+    "gene": "Gene",
+    "mission": "Mission",
+    "assay": "Assay",
+    "experimenttype": "Experiment",
+    "outcome": "Outcome",
+}
+
+# Outcomes loaded by load_to_neo4j.py only have a description
+ENTITY_NAMES_QUERY = """
+MATCH (n:{labels})
+WITH n, coalesce(n.name, n.description) AS name
+WHERE name IS NOT NULL
+RETURN [label IN labels(n) WHERE label IN $labels][0] AS label, name
+""".replace("{labels}", "|".join(ENTITY_LABELS))
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase words separated by single spaces ("STS-131" and "sts 131" are equal)"""
+    return " ".join(re.findall(r"[^\W_]+", text.lower()))
+
+
+def canonical_id(label: str, name: str) -> str:
+    return f"{label}:{name}"
+
+
+class _PyAutomaton:
+    """Pure-Python Aho-Corasick automaton with the subset of the pyahocorasick API used here"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Any]] = [[]]
+
+    def add_word(self, word: str, value: Any):
+        node = 0
+        for char in word:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = self._goto[node][char] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = child
+        self._out[node].append(value)
+
+    def make_automaton(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter(self, text: str):
+        """Yield (index of the last matched character, value) for every match"""
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for value in self._out[node]:
+                yield index, value
+
+
+class EntityLinker:
+    """
+    Immutable automaton over the entity names of one graph version.
+    """
+
+    def __init__(self, entities: Iterable[Tuple[str, str]], version: Optional[int] = None, source: str = "graph"):
+        """
+        Args:
+            entities: (label, name) pairs
+            version: Graph version the names were read at (None for extraction files)
+            source: Where the names came from, for stats
+        """
+        start = time.perf_counter()
+        self.version = version
+        self.source = source
+        # Normalized name -> canonical IDs of every node with that name
+        self.ids: Dict[str, List[str]] = {}
+        for label, name in entities:
+            name = str(name).strip()
+            key = normalize_name(name)
+            if (len(key) < MIN_NAME_LENGTH or key in STOPWORDS or key.replace(" ", "").isdigit()
+                    or key.count(" ") >= MAX_NAME_WORDS):
+                continue
+            ids = self.ids.setdefault(key, [])
+            node_id = canonical_id(label, name)
+            if node_id not in ids:
+                ids.append(node_id)
+
+        self.automaton = ahocorasick.Automaton() if ahocorasick is not None else _PyAutomaton()
+        for key in self.ids:
+            # Padding with spaces makes every match a whole-word match
+            self.automaton.add_word(f" {key} ", key)
+        if self.ids:
+            self.automaton.make_automaton()
+        self.build_ms = (time.perf_counter() - start) * 1000.0
+
+    @classmethod
+    def from_graph(cls, graph_db, version: Optional[int]) -> "EntityLinker":
+        """Names of every entity node in Neo4j, read through the access layer (neo4j_access)"""
+        records = graph_db.execute_read(ENTITY_NAMES_QUERY, {"labels": ENTITY_LABELS}, name="entity_names")
+        return cls([(record["label"], record["name"]) for record in records], version, source="graph")
+
+    @classmethod
+    def from_entity_files(cls, directory: str) -> "EntityLinker":
+        """Names in the <paper>_entities.jsonl extraction files"""
+        entities = set()
+        for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    for key, label in FILE_KEY_LABELS.items():
+                        for name in record.get(key) or []:
+                            if isinstance(name, str):
+                                entities.add((label, name))
+        return cls(sorted(entities), None, source="files")
+
+    def link(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Entities named in the query, in query order.
+
+        Overlapping matches are resolved leftmost-longest ("bone loss" wins
+        over "bone"). Every canonical ID of a matched name is returned.
+        """
+        if not self.ids:
+            return []
+        text = f" {normalize_name(query)} "
+        spans = []
+        for end, key in self.automaton.iter(text):
+            # [start, end) of the name without its padding spaces
+            spans.append((end - len(key), end, key))
+        spans.sort(key=lambda span: (span[0], -(span[1] - span[0])))
+
+        matches = []
+        covered_until = -1
+        for start, end, key in spans:
+            if start < covered_until:
+                continue
+            covered_until = end
+            for node_id in self.ids[key]:
+                label, name = node_id.split(":", 1)
+                matches.append({"id": node_id, "label": label, "name": name, "text": key})
+        return matches
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "names": len(self.ids),
+            "entities": sum(len(ids) for ids in self.ids.values()),
+            "automaton": "pyahocorasick" if ahocorasick is not None else "python",
+            "build_ms": round(self.build_ms, 1),
+        }
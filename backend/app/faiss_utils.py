@@ -0,0 +1,161 @@
+import os
+import faiss
+import numpy as np
+
+# faiss >= 1.10 can map the codes of flat, HNSW, scalar-quantized and IVF
+# indexes straight out of a file written by faiss.write_index.  Older builds
+# only know how to map IVF inverted lists kept in a separate .ivfdata file.
+MMAP_IFC_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def apply_search_params(index, search_params):
+    """
+    Apply stored query-time parameters (e.g. {"nprobe": 16} or {"efSearch": 64})
+    to a loaded index.
+    """
+    if not search_params:
+        return
+    parameter_space = faiss.ParameterSpace()
+    for name, value in search_params.items():
+        parameter_space.set_index_parameter(index, name, value)
+
+
+def save_vectors(vectors, vectors_path):
+    """Write full-precision vectors as a .npy file that np.load can memory-map"""
+    vectors_path = str(vectors_path)
+    tmp_path = vectors_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+    os.replace(tmp_path, vectors_path)
+    return vectors_path
+
+
+def rerank_exact(vectors, queries, candidate_ids, k):
+    """
+    Re-score approximate candidates exactly against full-precision vectors.
+
+    Args:
+        vectors: (n, d) normalized float32 vectors, typically a np.load mmap
+        queries: (nq, d) normalized query vectors
+        candidate_ids: (nq, n_candidates) ids from index.search (-1 = no result)
+        k: Results kept per query
+
+    Returns:
+        (distances, indices) shaped (nq, k), padded with -inf / -1
+    """
+    nq = len(queries)
+    distances = np.full((nq, k), -np.inf, dtype=np.float32)
+    indices = np.full((nq, k), -1, dtype=np.int64)
+    for row in range(nq):
+        # Sorted ids keep reads from the mapped file roughly sequential
+        ids = np.unique(candidate_ids[row][candidate_ids[row] >= 0])
+        if len(ids) == 0:
+            continue
+        scores = vectors[ids] @ queries[row]
+        best = np.argsort(-scores)[:k]
+        distances[row, :len(best)] = scores[best]
+        indices[row, :len(best)] = ids[best]
+    return distances, indices
+
+
+def search_subset(index, queries, k, ids, vectors=None):
+    """
+    Exact top-k search restricted to a subset of ids.
+
+    With full-precision vectors available (ANN and compressed indexes keep
+    them in vectors.npy) only the subset rows are scored, so the cost is
+    proportional to the subset. Otherwise the index is searched with an
+    IDSelector, which is exact for flat indexes.
+
+    Returns:
+        (distances, indices) shaped (nq, k), padded with -inf / -1
+    """
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    nq = len(queries)
+
+    if vectors is None:
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+        return index.search(queries, k, params=params)
+
+    distances = np.full((nq, k), -np.inf, dtype=np.float32)
+    indices = np.full((nq, k), -1, dtype=np.int64)
+    if len(ids) == 0:
+        return distances, indices
+
+    scores = queries @ np.asarray(vectors[ids]).T
+    n_best = min(k, len(ids))
+    for row in range(nq):
+        best = np.argpartition(-scores[row], n_best - 1)[:n_best]
+        best = best[np.argsort(-scores[row][best])]
+        distances[row, :n_best] = scores[row][best]
+        indices[row, :n_best] = ids[best]
+    return distances, indices
+
+
+def ivfdata_path(index_path) -> str:
+    """Path of the on-disk inverted lists that belong to an index file"""
+    return os.path.splitext(str(index_path))[0] + ".ivfdata"
+
+
+def read_index(index_path, mmap: bool = False):
+    """
+    Load a FAISS index, optionally mapping it read-only instead of copying it
+    into the process heap.
+
+    Args:
+        index_path: Path written by write_index
+        mmap: Map the index from disk so workers share the page cache
+    """
+    index_path = str(index_path)
+    if not mmap:
+        return faiss.read_index(index_path)
+
+    if os.path.exists(ivfdata_path(index_path)):
+        # OnDiskInvertedLists always mmap their .ivfdata file
+        flags = faiss.IO_FLAG_ONDISK_SAME_DIR | faiss.IO_FLAG_READ_ONLY
+    elif MMAP_IFC_FLAG:
+        flags = MMAP_IFC_FLAG | faiss.IO_FLAG_READ_ONLY
+    else:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(index_path, flags)
+
+
+def _move_invlists_on_disk(index, index_path):
+    """Move the inverted lists of an IVF index into a sibling .ivfdata file"""
+    index_ivf = faiss.extract_index_ivf(index)
+    data_path = ivfdata_path(index_path)
+    if os.path.exists(data_path):
+        # Unlink rather than overwrite: running workers keep their mapping
+        os.remove(data_path)
+    invlists = faiss.OnDiskInvertedLists(index_ivf.nlist, index_ivf.code_size, data_path)
+    ivf_vector = faiss.InvertedListsPtrVector()
+    ivf_vector.push_back(index_ivf.invlists)
+    invlists.merge_from_multiple(ivf_vector.data(), ivf_vector.size(), False)
+    index_ivf.replace_invlists(invlists, True)
+    invlists.this.disown()
+
+
+def write_index(index, index_path):
+    """
+    Write a FAISS index in a layout that read_index(..., mmap=True) can map.
+
+    The file is written next to the target and renamed into place, so a
+    worker that still maps the previous file keeps a consistent view of it.
+    On faiss builds without zero-copy mapping, IVF inverted lists are moved
+    to an .ivfdata file, which is the layout IO_FLAG_MMAP understands.
+    """
+    index_path = str(index_path)
+    tmp_path = index_path + ".tmp"
+
+    if not MMAP_IFC_FLAG:
+        try:
+            faiss.extract_index_ivf(index)
+            is_ivf = True
+        except RuntimeError:
+            is_ivf = False
+        if is_ivf:
+            _move_invlists_on_disk(index, index_path)
+
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+    return index_path
@@ -0,0 +1,72 @@
+"""
+Neo4j full-text indexes over node names, paper titles and outcome descriptions.
+
+setup_constraints.py creates them; search queries look nodes up through
+db.index.fulltext.queryNodes instead of scanning every node with
+toLower(...) CONTAINS toLower(...).
+"""
+import re
+from typing import Iterable, Union
+
+ENTITY_NAME_INDEX = "entity_names"
+PAPER_TITLE_INDEX = "paper_titles"
+OUTCOME_DESCRIPTION_INDEX = "outcome_descriptions"
+
+# Labels whose nodes are identified by name (load_to_neo4j.py writes Experiment)
+ENTITY_LABELS = ["Organism", "ExperimentType", "Experiment", "Assay", "Outcome", "Mission", "Gene"]
+
+# (index name, labels, properties)
+FULLTEXT_INDEXES = [
+    (ENTITY_NAME_INDEX, ENTITY_LABELS, ["name"]),
+    (PAPER_TITLE_INDEX, ["Paper"], ["title"]),
+    (OUTCOME_DESCRIPTION_INDEX, ["Outcome"], ["description"]),
+]
+
+# /search: named nodes matching the query, most relevant first
+NODE_SEARCH_QUERY = """
+CALL db.index.fulltext.queryNodes($index, $search) YIELD node, score
+RETURN node AS n, score LIMIT 20
+"""
+
+# /graph?query=: relationships of the best matching nodes, most relevant first
+GRAPH_SEARCH_QUERY = """
+CALL db.index.fulltext.queryNodes($index, $search_query) YIELD node, score
+WITH node, score
+ORDER BY score DESC
+LIMIT 50
+MATCH (node)-[r]-()
+WITH startNode(r) AS n, r, endNode(r) AS m, max(score) AS score
+RETURN n, r, m
+ORDER BY score DESC
+LIMIT 100
+"""
+
+CREATE_FULLTEXT_TEMPLATE = "CREATE FULLTEXT INDEX {name} IF NOT EXISTS FOR (n:{labels}) ON EACH [{props}]"
+
+
+def create_fulltext_statements():
+    """CREATE FULLTEXT INDEX statements for FULLTEXT_INDEXES"""
+    return [
+        CREATE_FULLTEXT_TEMPLATE.format(
+            name=name, labels="|".join(labels), props=", ".join(f"n.{prop}" for prop in props)
+        )
+        for name, labels, props in FULLTEXT_INDEXES
+    ]
+
+
+def fulltext_query(texts: Union[str, Iterable[str]]) -> str:
+    """
+    Lucene query matching nodes that contain every word of any of the texts.
+
+    Words match as prefixes ("microgravit" finds "microgravity"), exact words
+    score higher. Only word characters are kept, so no Lucene syntax from user
+    input reaches the index. Returns "" when there is nothing to search for.
+    """
+    if isinstance(texts, str):
+        texts = [texts]
+    clauses = []
+    for text in texts:
+        words = re.findall(r"\w+", text.lower())
+        if words:
+            clauses.append("(" + " AND ".join(f"({word}^2 OR {word}*)" for word in words) + ")")
+    return " OR ".join(dict.fromkeys(clauses))
@@ -1,6 +1,6 @@
 # backend/app/graph_api.py
 from fastapi import APIRouter, Query
-from neo4j_client import get_driver
+from neo4j_access import get_graph_db
 
 router = APIRouter()
 
@@ -23,22 +23,21 @@ def root():
 
 @router.get("/graph")
 def get_graph(name: str = Query(..., description="node name"), hops: int = Query(1, ge=1, le=4)):
-    driver = get_driver()
-    with driver.session() as session:
-        rec = session.run(GRAPH_QUERY, name=name, hops=hops).single()
-        if not rec:
-            return {"elements": {"nodes": [], "edges": []}}
-        nodes = rec["nodes"]
-        rels = rec["rels"]
-
-        cy_nodes = []
-        for n in nodes:
-            props = n.get("props", {}) or {}
-            cy_nodes.append({"data": {"id": str(n["id"]), "label": n.get("name"), "type": (n.get("labels") or [None])[0], **props}})
-
-        cy_edges = []
-        for r in rels:
-            props = r.get("props", {}) or {}
-            cy_edges.append({"data": {"id": str(r["id"]), "source": str(r["source"]), "target": str(r["target"]), "type": r.get("type"), **props}})
-
-        return {"elements": {"nodes": cy_nodes[:CYTOSCAPE_LIMIT], "edges": cy_edges[:CYTOSCAPE_LIMIT]}}
+    records = get_graph_db().execute_read(GRAPH_QUERY, {"name": name, "hops": hops}, name="graph_neighbourhood")
+    if not records:
+        return {"elements": {"nodes": [], "edges": []}}
+    rec = records[0]
+    nodes = rec["nodes"]
+    rels = rec["rels"]
+
+    cy_nodes = []
+    for n in nodes:
+        props = n.get("props", {}) or {}
+        cy_nodes.append({"data": {"id": str(n["id"]), "label": n.get("name"), "type": (n.get("labels") or [None])[0], **props}})
+
+    cy_edges = []
+    for r in rels:
+        props = r.get("props", {}) or {}
+        cy_edges.append({"data": {"id": str(r["id"]), "source": str(r["source"]), "target": str(r["target"]), "type": r.get("type"), **props}})
+
+    return {"elements": {"nodes": cy_nodes[:CYTOSCAPE_LIMIT], "edges": cy_edges[:CYTOSCAPE_LIMIT]}}
@@ -0,0 +1,152 @@
+"""
+In-memory paper-entity incidence matrix used for related-paper expansion.
+
+RELATED_PAPERS_QUERY walks (p:Paper)-[r]-(e)-[r2]-(p2:Paper) and counts the
+entities p2 shares with the given papers on every request. That is a sparse
+matrix product, so the incidence of papers and their (named, non-Paper)
+neighbours is exported from Neo4j once into a SciPy CSR matrix
+
+    incidence[paper, entity] = 1
+
+and related papers are computed in-process:
+
+    shared = incidence[papers].max(axis=0)     # entities of the given papers
+    counts = incidence @ shared                # shared entities per paper
+
+Neo4j stays the source of truth; RAGService exports a new snapshot whenever
+the graph version stamp changes (see graph_version).
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+# Paper-entity edges; Documents (no name) and Paper-Paper edges are skipped,
+# the same entities RELATED_PAPERS_QUERY can collect shared names from
+EXPORT_INCIDENCE_QUERY = """
+MATCH (p:Paper)-[r]-(e)
+WHERE p.paper_id IS NOT NULL AND e.name IS NOT NULL AND NOT e:Paper
+RETURN p.paper_id AS paper_id, p.title AS title, elementId(e) AS entity_id,
+    e.name AS name, type(r) AS rel_type
+"""
+
+
+class GraphSnapshot:
+    """
+    Immutable paper-entity incidence exported at one graph version.
+
+    Rows are papers, columns entity nodes. rel_types holds, with the same
+    sparsity, a bitmask of the relationship types (bit i = relationship_types[i])
+    between each paper and entity.
+    """
+
+    def __init__(self, version: Optional[int], paper_ids: List[str], titles: List[Optional[str]],
+                 entity_names: List[str], relationship_types: List[str],
+                 incidence: sparse.csr_matrix, rel_types: sparse.csr_matrix):
+        self.version = version
+        self.paper_ids = paper_ids
+        self.titles = titles
+        self.entity_names = np.asarray(entity_names, dtype=object)
+        self.relationship_types = relationship_types
+        self.incidence = incidence
+        self.rel_types = rel_types
+        self.paper_rows = {paper_id: row for row, paper_id in enumerate(paper_ids)}
+        self.loaded_at = time.time()
+
+    @classmethod
+    def from_edges(cls, version: Optional[int], edges) -> "GraphSnapshot":
+        """Build from (paper_id, title, entity_id, name, rel_type) tuples"""
+        paper_rows: Dict[str, int] = {}
+        titles: List[Optional[str]] = []
+        entity_cols: Dict[Any, int] = {}
+        entity_names: List[str] = []
+        type_bits: Dict[str, int] = {}
+        masks: Dict[tuple, int] = {}
+
+        for paper_id, title, entity_id, name, rel_type in edges:
+            paper_id = str(paper_id)
+            row = paper_rows.get(paper_id)
+            if row is None:
+                row = paper_rows[paper_id] = len(titles)
+                titles.append(title)
+            col = entity_cols.get(entity_id)
+            if col is None:
+                col = entity_cols[entity_id] = len(entity_names)
+                entity_names.append(name)
+            bit = type_bits.setdefault(rel_type, len(type_bits))
+            if bit >= 63:
+                raise ValueError("More than 63 relationship types between papers and entities")
+            masks[(row, col)] = masks.get((row, col), 0) | (1 << bit)
+
+        shape = (len(titles), len(entity_names))
+        if masks:
+            rows, cols = np.array(list(masks.keys()), dtype=np.int64).T
+            values = np.fromiter(masks.values(), dtype=np.int64, count=len(masks))
+        else:
+            rows = cols = values = np.zeros(0, dtype=np.int64)
+        rel_types = sparse.csr_matrix((values, (rows, cols)), shape=shape)
+        rel_types.sort_indices()
+        incidence = sparse.csr_matrix(
+            (np.ones(rel_types.nnz, dtype=np.int32), rel_types.indices, rel_types.indptr), shape=shape
+        )
+        return cls(version, list(paper_rows), titles, entity_names, list(type_bits), incidence, rel_types)
+
+    @classmethod
+    def export(cls, graph_db, version: Optional[int]) -> "GraphSnapshot":
+        """Export the paper-entity incidence from Neo4j through the access layer (neo4j_access)"""
+        records = graph_db.execute_read(EXPORT_INCIDENCE_QUERY, name="graph_snapshot_export")
+        return cls.from_edges(version, (
+            (record["paper_id"], record["title"], record["entity_id"], record["name"], record["rel_type"])
+            for record in records
+        ))
+
+    def related_papers(self, paper_ids: List[str], limit: int = 15) -> List[Dict[str, Any]]:
+        """
+        Papers sharing entities with the given papers, most shared entities first
+        (same result format as RELATED_PAPERS_QUERY; the given papers are left out).
+        """
+        rows = sorted({self.paper_rows[p] for p in map(str, paper_ids) if p in self.paper_rows})
+        if not rows:
+            return []
+
+        # Entities of the given papers, and the relationship types linking them
+        given = self.rel_types[rows].tocoo()
+        entity_types = np.zeros(self.incidence.shape[1], dtype=np.int64)
+        np.bitwise_or.at(entity_types, given.col, given.data)
+        shared = (entity_types != 0).astype(np.int32)
+
+        counts = self.incidence @ shared
+        counts[rows] = 0
+        candidates = np.flatnonzero(counts)
+        if not len(candidates):
+            return []
+        # Most shared entities first, ties in paper order
+        order = candidates[np.argsort(-counts[candidates], kind="stable")][:limit]
+
+        results = []
+        for row in order:
+            entities = self.incidence.indices[self.incidence.indptr[row]:self.incidence.indptr[row + 1]]
+            entities = entities[shared[entities] != 0]
+            mask = int(np.bitwise_or.reduce(entity_types[entities]))
+            names = list(dict.fromkeys(self.entity_names[entities]))
+            results.append({
+                "paper_id": self.paper_ids[row],
+                "title": self.titles[row],
+                "shared_entities": names,
+                "relationship_types": [t for bit, t in enumerate(self.relationship_types) if mask >> bit & 1],
+                "shared_entity_count": len(names),
+                "source": "neo4j_related"
+            })
+        return results
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "papers": self.incidence.shape[0],
+            "entities": self.incidence.shape[1],
+            "edges": int(self.incidence.nnz),
+            "memory_bytes": int(self.incidence.data.nbytes + self.incidence.indices.nbytes
+                                + self.incidence.indptr.nbytes + self.rel_types.data.nbytes),
+            "loaded_at": self.loaded_at,
+        }
@@ -0,0 +1,147 @@
+"""
+Graph version stamp.
+
+A single (:GraphVersion {key: "graph"}) node holds a counter that every
+ingestion run (and every API call that adds relationships) increments.
+Caches of graph query results store the version they were computed at and
+are invalid once the stamp moves on.
+"""
+
+import threading
+import time
+from typing import Optional
+
+GRAPH_VERSION_KEY = "graph"
+
+BUMP_GRAPH_VERSION_QUERY = """
+MERGE (v:GraphVersion {key: $key})
+SET v.version = coalesce(v.version, 0) + 1, v.updated_at = timestamp()
+RETURN v.version AS version
+"""
+
+READ_GRAPH_VERSION_QUERY = """
+MATCH (v:GraphVersion {key: $key})
+RETURN v.version AS version
+"""
+
+
+def bump_graph_version(tx) -> int:
+    """Increment the graph version; tx is a session or transaction. Returns the new version."""
+    record = tx.run(BUMP_GRAPH_VERSION_QUERY, key=GRAPH_VERSION_KEY).single()
+    return record["version"]
+
+
+def read_graph_version(tx) -> int:
+    """Current graph version (0 if the graph was never stamped)"""
+    record = tx.run(READ_GRAPH_VERSION_QUERY, key=GRAPH_VERSION_KEY).single()
+    return record["version"] if record else 0
+
+
+class GraphVersionTracker:
+    """
+    Last known graph version, re-read from Neo4j at most every refresh_seconds.
+
+    Reads raise when Neo4j is unreachable so that callers can fall back to
+    stale cache entries.
+    """
+
+    def __init__(self, refresh_seconds: float = 30.0):
+        self.refresh_seconds = refresh_seconds
+        self.version: Optional[int] = None
+        self.checked_at = 0.0
+        self.changes = 0
+        self._lock = threading.Lock()
+
+    def _due(self) -> bool:
+        return self.version is None or time.monotonic() - self.checked_at >= self.refresh_seconds
+
+    def _update(self, version: int) -> int:
+        with self._lock:
+            if self.version is not None and version != self.version:
+                self.changes += 1
+                print(f"SUCCESS: Graph version changed {self.version} -> {version}, graph cache invalidated")
+            self.version = version
+            self.checked_at = time.monotonic()
+            return version
+
+    def current(self, graph_db) -> int:
+        """Graph version, read through the access layer (neo4j_access) when the last check is too old"""
+        if not self._due():
+            return self.version
+        return self._update(graph_db.read_transaction(read_graph_version, name="graph_version"))
+
+    async def acurrent(self, graph_db) -> int:
+        """current() on the async driver"""
+        if not self._due():
+            return self.version
+        records = await graph_db.aexecute_read(READ_GRAPH_VERSION_QUERY, {"key": GRAPH_VERSION_KEY}, name="graph_version")
+        return self._update(records[0]["version"] if records else 0)
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "refresh_seconds": self.refresh_seconds,
+            "seconds_since_check": round(time.monotonic() - self.checked_at, 1) if self.version is not None else None,
+            "changes": self.changes,
+        }
+
+
+class GraphDerived:
+    """
+    A value computed from the whole graph (an exported matrix, a compiled
+    automaton) that is rebuilt in the background when the graph version changes.
+
+    build(version) returns the new value, which must carry a `version`
+    attribute. Until the first build finishes get() returns None; afterwards
+    the previous value keeps serving while a rebuild runs or when it fails.
+    """
+
+    def __init__(self, name: str, build, retry_seconds: float = 30.0):
+        """
+        Args:
+            name: Name used in log messages and the background thread
+            build: Callable taking the graph version (None = read it) and returning the value
+            retry_seconds: Minimum time between two build attempts started by get()
+        """
+        self.name = name
+        self.build = build
+        self.retry_seconds = retry_seconds
+        self.value = None
+        self.build_ms = None
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._attempted = float("-inf")
+
+    def refresh(self, version: Optional[int] = None):
+        """Build the value and swap it in; skipped while another build runs"""
+        if not self._lock.acquire(blocking=False):
+            return self.value
+        self._attempted = time.monotonic()
+        try:
+            start = time.perf_counter()
+            self.value = self.build(version)
+            self.build_ms = (time.perf_counter() - start) * 1000.0
+            return self.value
+        except Exception as e:
+            self.failures += 1
+            print(f"WARNING: {self.name} build failed: {e}")
+            return self.value
+        finally:
+            self._lock.release()
+
+    def get(self, version: Optional[int]):
+        """
+        Current value (None before the first build). Starts a background
+        rebuild when there is none yet or it was built at another version.
+        """
+        value = self.value
+        outdated = value is None or (version is not None and value.version != version)
+        retry_due = time.monotonic() - self._attempted >= self.retry_seconds
+        if outdated and retry_due and not self._lock.locked():
+            threading.Thread(target=self.refresh, args=(version,), name=f"rag-{self.name.replace(' ', '-')}",
+                             daemon=True).start()
+        return value
+
+    def stats(self):
+        info = self.value.info() if self.value is not None else None
+        return {"ready": self.value is not None, "build_ms": self.build_ms, "failures": self.failures, **(info or {})}
@@ -0,0 +1,335 @@
+"""
+Versioned index directories and the immutable snapshot RAGService serves from.
+
+BatchEmbeddingCreator writes every build into its own directory
+
+    data/embeddings/versions/<version>/
+        faiss_index.idx, vectors.npy, chunk_store/, chunks_fts.db,
+        index_stats.json, chunk_metadata.json, paper_index_mapping.json
+
+and then publishes it by atomically rewriting data/embeddings/CURRENT with the
+version name. A directory is never modified after it is published, so a
+snapshot loaded from it stays consistent for as long as requests use it.
+Builds that predate versioning (files directly in data/embeddings) are served
+as the "legacy" version.
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .faiss_utils import read_index, apply_search_params, rerank_exact, search_subset
+    from .lexical_search import FTSSearcher
+    from .chunk_store import ChunkStore
+except ImportError:
+    from faiss_utils import read_index, apply_search_params, rerank_exact, search_subset
+    from lexical_search import FTSSearcher
+    from chunk_store import ChunkStore
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+LEGACY_VERSION = "legacy"
+
+# Published versions kept on disk (the current one is never removed)
+KEEP_VERSIONS = int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "3"))
+
+
+class IndexValidationError(ValueError):
+    """A version directory whose index and chunk metadata do not match"""
+
+
+class UnknownVersionError(ValueError):
+    """A version name that is not a published version directory"""
+
+
+def new_version_name() -> str:
+    """Sortable, unique name for a new version directory"""
+    return time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}"
+
+
+def version_dir(base_dir, version: str) -> Path:
+    """Directory holding the files of a version"""
+    if version == LEGACY_VERSION:
+        return Path(base_dir)
+    if not version or version in (".", "..") or "/" in version or os.sep in version \
+            or (os.altsep and os.altsep in version):
+        raise UnknownVersionError(f"Invalid index version name: {version!r}")
+    return Path(base_dir) / VERSIONS_DIR / version
+
+
+def current_version(base_dir) -> Optional[str]:
+    """Version named by the CURRENT file, or None when nothing was published"""
+    current_path = Path(base_dir) / CURRENT_FILE
+    try:
+        version = current_path.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def resolve_index_dir(base_dir) -> Tuple[str, Path]:
+    """(version, directory) that should be served: CURRENT, else the legacy flat layout"""
+    version = current_version(base_dir) or LEGACY_VERSION
+    return version, version_dir(base_dir, version)
+
+
+def list_versions(base_dir) -> List[str]:
+    """Version directories on disk, oldest first"""
+    versions_path = Path(base_dir) / VERSIONS_DIR
+    if not versions_path.is_dir():
+        return []
+    return sorted(entry.name for entry in versions_path.iterdir() if entry.is_dir())
+
+
+def check_version(base_dir, version: str) -> str:
+    """version if it is the legacy layout or a directory listed by list_versions, else UnknownVersionError"""
+    if version != LEGACY_VERSION and version not in list_versions(base_dir):
+        raise UnknownVersionError(f"No published index version {version!r}")
+    return version
+
+
+def publish_version(base_dir, version: str, keep: int = KEEP_VERSIONS) -> Path:
+    """
+    Point CURRENT at a finished version directory (atomic rename), then remove
+    the oldest versions beyond keep. Processes that still serve a removed
+    version keep working on its open/mapped files.
+    """
+    directory = version_dir(base_dir, version)
+    if not directory.is_dir():
+        raise FileNotFoundError(f"No index version directory at {directory}")
+
+    current_path = Path(base_dir) / CURRENT_FILE
+    tmp_path = current_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, current_path)
+
+    if keep > 0:
+        older = [name for name in list_versions(base_dir) if name != version]
+        for name in older[:max(0, len(older) - (keep - 1))]:
+            shutil.rmtree(version_dir(base_dir, name), ignore_errors=True)
+    return directory
+
+
+def _load_stats(directory: Path) -> Dict[str, Any]:
+    stats_path = directory / "index_stats.json"
+    if not stats_path.exists():
+        return {}
+    with open(stats_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_full_vectors(directory: Path, stats: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Memory-map the full-precision vectors kept next to approximate indexes.
+    They re-rank compressed (PQ/SQ8) results and make paper-filtered
+    searches exact.
+    """
+    if stats.get("index_type", "flat") == "flat":
+        return None
+    vectors_path = directory / "vectors.npy"
+    if not vectors_path.exists():
+        print(f"WARNING: No full-precision vectors at {vectors_path}; results will not be re-ranked")
+        return None
+    try:
+        vectors = np.load(vectors_path, mmap_mode="r")
+        if vectors.shape[0] != stats.get("total_vectors", vectors.shape[0]):
+            print(f"WARNING: {vectors_path} has {vectors.shape[0]} vectors, index has {stats.get('total_vectors')}; ignoring it")
+            return None
+        print(f"SUCCESS: Mapped {vectors.shape[0]} full-precision vectors")
+        return vectors
+    except Exception as e:
+        print(f"ERROR: Failed to map full-precision vectors: {e}")
+        return None
+
+
+def _load_chunks(directory: Path) -> ChunkStore:
+    """
+    Map the columnar chunk store written by BatchEmbeddingCreator, falling
+    back to chunk_metadata.json of builds that predate it
+    """
+    chunk_store_path = directory / "chunk_store"
+    if chunk_store_path.exists():
+        try:
+            chunks = ChunkStore.open(chunk_store_path)
+            print(f"SUCCESS: Mapped chunk store with {len(chunks)} chunks from {chunks.paper_count} papers")
+            return chunks
+        except Exception as e:
+            print(f"ERROR: Failed to open chunk store: {e}")
+
+    metadata_path = directory / "chunk_metadata.json"
+    if metadata_path.exists():
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            chunks = ChunkStore.from_chunks(json.load(f))
+        print(f"SUCCESS: Loaded metadata for {len(chunks)} chunks (no chunk store, rebuild the index to create one)")
+        return chunks
+    print(f"WARNING: Chunk metadata not found at {metadata_path}")
+    return ChunkStore.from_chunks([])
+
+
+def _label_lookup(labels: Optional[np.ndarray]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """(sorted labels, row of each sorted label) for mapping FAISS ids back to rows"""
+    if labels is None:
+        return None
+    order = np.argsort(labels, kind="stable")
+    return np.asarray(labels)[order], order
+
+
+def _load_fts(directory: Path, chunk_count: int) -> Optional[FTSSearcher]:
+    """Open the FTS5 chunk database if it matches the chunk metadata"""
+    fts_path = directory / "chunks_fts.db"
+    if not fts_path.exists():
+        print(f"WARNING: FTS5 chunk index not found at {fts_path}; hybrid search disabled")
+        return None
+    try:
+        fts = FTSSearcher(str(fts_path))
+        fts_count = fts.count()
+        if fts_count != chunk_count:
+            print(f"WARNING: FTS5 index has {fts_count} rows but {chunk_count} chunks are loaded; hybrid search disabled")
+            return None
+        print(f"SUCCESS: FTS5 chunk index loaded with {fts_count} rows")
+        return fts
+    except Exception as e:
+        print(f"ERROR: Failed to open FTS5 chunk index: {e}")
+        return None
+
+
+class IndexSnapshot:
+    """
+    One version of the FAISS index together with the chunk metadata, FTS5
+    index, exact vectors and stats built alongside it.
+
+    A snapshot is never mutated after load(). RAGService swaps whole
+    snapshots, and a request reads the snapshot once and uses it for every
+    retrieval step, so it can never combine FAISS ids of one version with the
+    chunk metadata of another.
+
+    Indexes built by create_embeddings.py are ID-mapped: FAISS ids (and FTS5
+    rowids) are stable chunk labels stored in the chunk store, not rows. The
+    search methods translate them, so callers only ever see chunk store rows
+    (-1 for no result).
+    """
+
+    def __init__(self, version: str, directory: Optional[Path], index, stats: Dict[str, Any],
+                 full_vectors: Optional[np.ndarray], chunks: ChunkStore, fts: Optional[FTSSearcher],
+                 generation: int = 0):
+        self.version = version
+        self.directory = directory
+        self.index = index
+        self.stats = stats
+        self.full_vectors = full_vectors
+        self.chunks = chunks
+        self.fts = fts
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.labels = chunks.labels
+        self._label_lookup = _label_lookup(self.labels)
+
+    @classmethod
+    def empty(cls, version: Optional[str] = None, generation: int = 0) -> "IndexSnapshot":
+        """Snapshot without an index (nothing built yet, or the build failed to load)"""
+        return cls(version, None, None, {}, None, ChunkStore.from_chunks([]), None, generation)
+
+    @classmethod
+    def load(cls, directory, version: str, generation: int = 0, mmap: bool = False) -> "IndexSnapshot":
+        """
+        Read every file of a version directory and check that they belong
+        together.
+
+        Raises:
+            FileNotFoundError: the directory has no FAISS index
+            IndexValidationError: vector, chunk and stats counts disagree
+        """
+        directory = Path(directory)
+        index_path = directory / "faiss_index.idx"
+        if not index_path.exists():
+            raise FileNotFoundError(f"FAISS index not found at {index_path}")
+
+        stats = _load_stats(directory)
+        index = read_index(str(index_path), mmap=mmap)
+        apply_search_params(index, stats.get("search_params"))
+        mode = "memory-mapped" if mmap else "in-memory"
+        print(f"SUCCESS: FAISS index {version} loaded ({mode}, {stats.get('index_type', 'flat')}) with {index.ntotal} vectors")
+
+        chunks = _load_chunks(directory)
+        if index.ntotal != len(chunks):
+            raise IndexValidationError(
+                f"Index version {version} has {index.ntotal} vectors but {len(chunks)} chunks"
+            )
+        if "total_vectors" in stats and stats["total_vectors"] != index.ntotal:
+            raise IndexValidationError(
+                f"Index version {version} has {index.ntotal} vectors but index_stats.json records {stats['total_vectors']}"
+            )
+        if stats.get("id_map") and chunks.labels is None:
+            raise IndexValidationError(f"Index version {version} is ID-mapped but its chunk store has no labels")
+
+        full_vectors = _load_full_vectors(directory, stats)
+        fts = _load_fts(directory, len(chunks))
+        return cls(version, directory, index, stats, full_vectors, chunks, fts, generation)
+
+    def paper_filter_ids(self, paper_ids) -> np.ndarray:
+        """Rows of every chunk belonging to the given papers"""
+        return self.chunks.rows_for_papers(paper_ids)
+
+    def rows_for_labels(self, labels) -> np.ndarray:
+        """Chunk store rows of FAISS ids / FTS5 rowids (-1 stays -1, unknown ids become -1)"""
+        labels = np.asarray(labels, dtype=np.int64)
+        if self._label_lookup is None:
+            return labels
+        sorted_labels, order = self._label_lookup
+        if len(sorted_labels) == 0:
+            return np.full(labels.shape, -1, dtype=np.int64)
+        positions = np.clip(np.searchsorted(sorted_labels, labels), 0, len(sorted_labels) - 1)
+        found = (labels >= 0) & (sorted_labels[positions] == labels)
+        return np.where(found, order[positions], -1)
+
+    def labels_for_rows(self, rows) -> np.ndarray:
+        """FAISS ids of chunk store rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.labels is None:
+            return rows
+        return np.asarray(self.labels[rows], dtype=np.int64)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (scores, rows) for normalized queries. Compressed indexes
+        over-fetch candidates and score them exactly against vectors.npy.
+        """
+        rerank_factor = self.stats.get("rerank_factor")
+        if rerank_factor and self.full_vectors is not None:
+            _, candidates = self.index.search(queries, k * rerank_factor)
+            return rerank_exact(self.full_vectors, queries, self.rows_for_labels(candidates), k)
+        distances, labels = self.index.search(queries, k)
+        return distances, self.rows_for_labels(labels)
+
+    def search_subset(self, queries: np.ndarray, k: int, rows) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k (scores, rows) restricted to the given rows"""
+        if self.full_vectors is not None:
+            return search_subset(self.index, queries, k, rows, self.full_vectors)
+        distances, labels = search_subset(self.index, queries, k, self.labels_for_rows(rows))
+        return distances, self.rows_for_labels(labels)
+
+    def vectors_for_rows(self, rows) -> np.ndarray:
+        """Stored vectors of rows (vectors.npy, or reconstructed from the index)"""
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors[rows], dtype=np.float32)
+        return self.index.reconstruct_batch(self.labels_for_rows(rows))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "directory": str(self.directory) if self.directory else None,
+            "vectors": self.index.ntotal if self.index is not None else 0,
+            "chunks": len(self.chunks),
+            "index_type": self.stats.get("index_type", "flat"),
+            "id_map": self.labels is not None,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+        }
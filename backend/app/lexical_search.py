@@ -0,0 +1,62 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+# Terms such as "CDKN1a/p21" or "Bion-M1" are kept whole and matched as FTS5
+# phrases, so the tokenizer still splits them but requires the parts in order
+TERM_PATTERN = re.compile(r"\w[\w\-/.]*\w|\w")
+
+
+def build_match_query(query: str) -> str:
+    """Turn free text into an FTS5 MATCH expression (OR of quoted terms)"""
+    terms = TERM_PATTERN.findall(query)
+    return " OR ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+class FTSSearcher:
+    """
+    BM25 search over the FTS5 chunk database written by ingestion/create_fts.py.
+
+    Rowids are the stable chunk labels the FAISS index stores (chunk
+    positions only in builds without labels), not chunk store rows: translate
+    them with IndexSnapshot.rows_for_labels before indexing chunks, as dense
+    results are.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = os.path.abspath(db_path)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    def search(self, query: str, top_k: int = 10,
+               paper_ids: Optional[Sequence[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Return (rowid, bm25) pairs, best first. FTS5 bm25() is lower-is-better,
+        so the score is negated to make higher better.
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+
+        sql = "SELECT rowid, bm25(chunks) FROM chunks WHERE chunks MATCH ?"
+        params = [match]
+        if paper_ids:
+            sql += " AND paper_id IN ({})".format(",".join("?" * len(paper_ids)))
+            params.extend(str(paper_id) for paper_id in paper_ids)
+        sql += " ORDER BY bm25(chunks) LIMIT ?"
+        params.append(top_k)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        return [(rowid, -score) for rowid, score in rows]
@@ -1,10 +1,17 @@
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
-from .neo4j_client import driver
-from .rag_service import get_rag_service
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+from .neo4j_access import get_graph_db
+from .graph_version import bump_graph_version
+from .fulltext import ENTITY_NAME_INDEX, NODE_SEARCH_QUERY, GRAPH_SEARCH_QUERY, fulltext_query
 from pydantic import BaseModel
+from typing import List, Optional
 import sys
 import os
+import json
+import time
+import asyncio
 
 # Add backend directory to path for gemini imports
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,6 +21,40 @@ from gemini.gemini_utils import summarize, qa, safe_extract_kg
 
 app = FastAPI()
 
+# Load and warm up the RAG service in the background at startup instead of
+# on the first /search-rag request
+RAG_WARMUP = os.getenv("RAG_WARMUP", "true").lower() in ("1", "true", "yes")
+# "skipped" when warmup is disabled: the service then counts as ready once loaded
+warmup_status = {"state": "pending" if RAG_WARMUP else "skipped", "started": None, "finished": None, "timings_ms": None, "error": None}
+
+# Pooled Neo4j access: managed read/write transactions with retries and metrics
+graph_db = get_graph_db()
+
+# Shared secret for /admin endpoints, sent as X-Admin-Token (unset = no check)
+ADMIN_TOKEN = os.getenv("RAG_ADMIN_TOKEN", "")
+
+def get_rag_service():
+    """RAG service singleton; faiss and the embedding model are only imported on first use"""
+    from .rag_service import get_rag_service as _get_rag_service
+    return _get_rag_service()
+
+def warmup_rag_service():
+    warmup_status["state"] = "running"
+    warmup_status["started"] = time.time()
+    try:
+        warmup_status["timings_ms"] = get_rag_service().warmup()
+        warmup_status["state"] = "ready"
+    except Exception as e:
+        print(f"ERROR: RAG service warmup failed: {e}")
+        warmup_status["state"] = "failed"
+        warmup_status["error"] = str(e)
+    warmup_status["finished"] = time.time()
+
+@app.on_event("startup")
+async def start_warmup():
+    if RAG_WARMUP:
+        asyncio.get_running_loop().run_in_executor(None, warmup_rag_service)
+
 # Add CORS middleware for frontend integration
 app.add_middleware(
     CORSMiddleware,
@@ -30,137 +71,146 @@ app.add_middleware(
 def root():
     return {"message": "Backend is running"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the RAG service is loaded and warmed up, 503 before"""
+    # Only look at an already imported module, the probe must not trigger loading
+    rag_module = sys.modules.get(f"{__package__}.rag_service")
+    service = getattr(rag_module, "rag_service", None)
+    status = {"warmup": warmup_status, "ready": False, "components": None}
+    if service is not None:
+        status.update(service.readiness())
+        status["ready"] = status["ready"] and warmup_status["state"] in ("ready", "skipped")
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.get("/pingdb")
 def ping_db():
-    if driver is None:
+    if not graph_db.available:
         return {"error": "Neo4j driver not initialized. Check environment variables."}
     try:
-        with driver.session() as session:
-            result = session.run("RETURN 'pong' AS msg")
-            return {"status": result.single()["msg"]}
+        records = graph_db.execute_read("RETURN 'pong' AS msg", name="pingdb")
+        return {"status": records[0]["msg"]}
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/db-stats")
+def db_stats():
+    """Neo4j pool configuration and utilization, and per-query latency, retry and error counts"""
+    return graph_db.stats()
+
 # -------------------------
 # NODE ENDPOINTS
 # -------------------------
+# Every write bumps the graph version in the same transaction: relationships
+# change the graph lookups cached by the RAG service, and new nodes add names
+# the entity linker must rebuild to recognize
+def _merge_and_bump(tx, query, parameters):
+    tx.run(query, parameters)
+    bump_graph_version(tx)
+
 @app.post("/organisms/{name}")
 def add_organism(name: str):
-    with driver.session() as session:
-        session.run("MERGE (o:Organism {name: $name})", name=name)
+    graph_db.write_transaction(_merge_and_bump, "MERGE (o:Organism {name: $name})", {"name": name}, name="add_organism")
     return {"message": f"Organism '{name}' added."}
 
 @app.get("/organisms")
 def list_organisms():
-    with driver.session() as session:
-        result = session.run("MATCH (o:Organism) RETURN o.name AS name")
-        organisms = [record["name"] for record in result]
+    records = graph_db.execute_read("MATCH (o:Organism) RETURN o.name AS name", name="list_organisms")
+    organisms = [record["name"] for record in records]
     return {"organisms": organisms}
 
 @app.post("/papers/{title}")
 def add_paper(title: str):
-    with driver.session() as session:
-        session.run("MERGE (p:Paper {title: $title})", title=title)
+    graph_db.write_transaction(_merge_and_bump, "MERGE (p:Paper {title: $title})", {"title": title}, name="add_paper")
     return {"message": f"Paper '{title}' added."}
 
 @app.get("/papers")
 def list_papers():
-    with driver.session() as session:
-        result = session.run("MATCH (p:Paper) RETURN p.title AS title")
-        papers = [record["title"] for record in result]
+    records = graph_db.execute_read("MATCH (p:Paper) RETURN p.title AS title", name="list_papers")
+    papers = [record["title"] for record in records]
     return {"papers": papers}
 
 @app.post("/genes/{name}")
 def add_gene(name: str):
-    with driver.session() as session:
-        session.run("MERGE (g:Gene {name: $name})", name=name)
+    graph_db.write_transaction(_merge_and_bump, "MERGE (g:Gene {name: $name})", {"name": name}, name="add_gene")
     return {"message": f"Gene '{name}' added."}
 
 @app.post("/missions/{name}")
 def add_mission(name: str):
-    with driver.session() as session:
-        session.run("MERGE (m:Mission {name: $name})", name=name)
+    graph_db.write_transaction(_merge_and_bump, "MERGE (m:Mission {name: $name})", {"name": name}, name="add_mission")
     return {"message": f"Mission '{name}' added."}
 
 @app.post("/experimenttypes/{name}")
 def add_experiment_type(name: str):
-    with driver.session() as session:
-        session.run("MERGE (e:ExperimentType {name: $name})", name=name)
+    graph_db.write_transaction(_merge_and_bump, "MERGE (e:ExperimentType {name: $name})", {"name": name}, name="add_experiment_type")
     return {"message": f"ExperimentType '{name}' added."}
 
 @app.post("/outcomes/{name}")
 def add_outcome(name: str):
-    with driver.session() as session:
-        session.run("MERGE (o:Outcome {name: $name})", name=name)
+    graph_db.write_transaction(_merge_and_bump, "MERGE (o:Outcome {name: $name})", {"name": name}, name="add_outcome")
     return {"message": f"Outcome '{name}' added."}
 
 @app.post("/assays/{name}")
 def add_assay(name: str):
-    with driver.session() as session:
-        session.run("MERGE (a:Assay {name: $name})", name=name)
+    graph_db.write_transaction(_merge_and_bump, "MERGE (a:Assay {name: $name})", {"name": name}, name="add_assay")
     return {"message": f"Assay '{name}' added."}
 
 # -------------------------
 # RELATIONSHIP ENDPOINTS
 # -------------------------
+
 @app.post("/papers/{paper_title}/studies/{organism_name}")
 def link_paper_to_organism(paper_title: str, organism_name: str):
-    with driver.session() as session:
-        session.run("""
+    graph_db.write_transaction(_merge_and_bump, """
             MATCH (p:Paper {title: $paper_title})
             MATCH (o:Organism {name: $organism_name})
             MERGE (p)-[:STUDIES]->(o)
-        """, paper_title=paper_title, organism_name=organism_name)
+        """, {"paper_title": paper_title, "organism_name": organism_name}, name="link_paper_to_organism")
     return {"message": f"Linked Paper '{paper_title}' to Organism '{organism_name}'"}
 
 @app.post("/papers/{paper_title}/reports/{outcome_name}")
 def link_paper_to_outcome(paper_title: str, outcome_name: str):
-    with driver.session() as session:
-        session.run("""
+    graph_db.write_transaction(_merge_and_bump, """
             MATCH (p:Paper {title: $paper_title})
             MATCH (o:Outcome {name: $outcome_name})
             MERGE (p)-[:REPORTS]->(o)
-        """, paper_title=paper_title, outcome_name=outcome_name)
+        """, {"paper_title": paper_title, "outcome_name": outcome_name}, name="link_paper_to_outcome")
     return {"message": f"Linked Paper '{paper_title}' to Outcome '{outcome_name}'"}
 
 @app.post("/papers/{paper_title}/uses/{assay_name}")
 def link_paper_to_assay(paper_title: str, assay_name: str):
-    with driver.session() as session:
-        session.run("""
+    graph_db.write_transaction(_merge_and_bump, """
             MATCH (p:Paper {title: $paper_title})
             MATCH (a:Assay {name: $assay_name})
             MERGE (p)-[:USES]->(a)
-        """, paper_title=paper_title, assay_name=assay_name)
+        """, {"paper_title": paper_title, "assay_name": assay_name}, name="link_paper_to_assay")
     return {"message": f"Linked Paper '{paper_title}' to Assay '{assay_name}'"}
 
 @app.post("/papers/{paper_title}/performed_on/{experiment_type_name}")
 def link_paper_to_experiment_type(paper_title: str, experiment_type_name: str):
-    with driver.session() as session:
-        session.run("""
+    graph_db.write_transaction(_merge_and_bump, """
             MATCH (p:Paper {title: $paper_title})
             MATCH (e:ExperimentType {name: $experiment_type_name})
             MERGE (p)-[:PERFORMED_ON]->(e)
-        """, paper_title=paper_title, experiment_type_name=experiment_type_name)
+        """, {"paper_title": paper_title, "experiment_type_name": experiment_type_name}, name="link_paper_to_experiment_type")
     return {"message": f"Linked Paper '{paper_title}' to ExperimentType '{experiment_type_name}'"}
 
 @app.post("/papers/{paper_title}/conducted_in/{mission_name}")
 def link_paper_to_mission(paper_title: str, mission_name: str):
-    with driver.session() as session:
-        session.run("""
+    graph_db.write_transaction(_merge_and_bump, """
             MATCH (p:Paper {title: $paper_title})
             MATCH (m:Mission {name: $mission_name})
             MERGE (p)-[:CONDUCTED_IN]->(m)
-        """, paper_title=paper_title, mission_name=mission_name)
+        """, {"paper_title": paper_title, "mission_name": mission_name}, name="link_paper_to_mission")
     return {"message": f"Linked Paper '{paper_title}' to Mission '{mission_name}'"}
 
 @app.post("/genes/{gene_name}/studied_in/{paper_title}")
 def link_gene_to_paper(gene_name: str, paper_title: str):
-    with driver.session() as session:
-        session.run("""
+    graph_db.write_transaction(_merge_and_bump, """
             MATCH (g:Gene {name: $gene_name})
             MATCH (p:Paper {title: $paper_title})
             MERGE (g)-[:STUDIED_IN]->(p)
-        """, gene_name=gene_name, paper_title=paper_title)
+        """, {"gene_name": gene_name, "paper_title": paper_title}, name="link_gene_to_paper")
     return {"message": f"Linked Gene '{gene_name}' to Paper '{paper_title}'"}
 
 # -------------------------
@@ -183,6 +233,11 @@ class KGRequest(BaseModel):
 class RAGRequest(BaseModel):
     query: str
     top_k: int = 5
+    use_cache: bool = True  # set False to bypass the semantic answer cache
+    hybrid: Optional[bool] = None  # fuse FTS5 BM25 with FAISS (default: RAG_HYBRID_SEARCH)
+    paper_ids: Optional[List[str]] = None  # restrict retrieval to these papers
+    rerank: Optional[bool] = None  # cross-encoder re-ranking (default: RAG_RERANK)
+    rerank_budget_ms: Optional[float] = None  # re-ranking latency budget (default: RAG_RERANK_BUDGET_MS)
 
 @app.post("/summarize")
 def summarize_paper(req: SummarizeRequest):
@@ -200,13 +255,17 @@ def extract_kg(req: KGRequest):
 # RAG ENDPOINT (MAIN SEARCH)
 # -------------------------
 @app.post("/search-rag")
-def search_rag(req: RAGRequest):
+async def search_rag(req: RAGRequest):
     """
     Main RAG endpoint: Enhanced FAISS + Neo4j search + Gemini answer generation
     """
     try:
-        rag_service = get_rag_service()
-        result = rag_service.process_query(req.query, req.top_k)
+        # The first call loads the index and model, keep it off the event loop
+        rag_service = await run_in_threadpool(get_rag_service)
+        result = await rag_service.aprocess_query(
+            req.query, req.top_k, use_cache=req.use_cache, hybrid=req.hybrid, paper_ids=req.paper_ids,
+            rerank=req.rerank, rerank_budget_ms=req.rerank_budget_ms
+        )
         return result
     except Exception as e:
         return {
@@ -216,6 +275,26 @@ def search_rag(req: RAGRequest):
             "chunks_used": 0
         }
 
+@app.post("/search-rag/stream")
+async def search_rag_stream(req: RAGRequest):
+    """
+    Streaming RAG endpoint (server-sent events): retrieval results first,
+    then answer tokens as Gemini generates them, then metrics
+    """
+    async def events():
+        try:
+            rag_service = await run_in_threadpool(get_rag_service)
+            async for event, data in rag_service.astream_query(
+                req.query, req.top_k, use_cache=req.use_cache, hybrid=req.hybrid, paper_ids=req.paper_ids,
+                rerank=req.rerank, rerank_budget_ms=req.rerank_budget_ms
+            ):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            error = {"query": req.query, "answer": f"Error processing query: {str(e)}"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\nevent: done\ndata: {{}}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/search-stats")
 def get_search_stats():
     """
@@ -223,44 +302,77 @@ def get_search_stats():
     """
     try:
         rag_service = get_rag_service()
+        snapshot = rag_service.snapshot
         stats = {
-            "faiss_index_size": rag_service.index.ntotal if rag_service.index else 0,
-            "chunks_loaded": len(rag_service.chunks),
-            "papers_available": len(rag_service.paper_chunks_map),
+            "index_version": snapshot.version,
+            "faiss_index_size": snapshot.index.ntotal if snapshot.index else 0,
+            "faiss_index_mmap": rag_service.index_mmap,
+            "faiss_index_type": snapshot.stats.get("index_type", "flat"),
+            "faiss_search_params": snapshot.stats.get("search_params", {}),
+            "exact_rerank": snapshot.full_vectors is not None,
+            "hybrid_search": rag_service.hybrid_search and snapshot.fts is not None,
+            "chunks_loaded": len(snapshot.chunks),
+            "papers_available": snapshot.chunks.paper_count,
             "neo4j_connected": rag_service.driver is not None,
-            "embedding_model": rag_service.model_name if rag_service.model else None
+            "embedding_model": rag_service.model_name if rag_service.model else None,
+            "embedding_backend": rag_service.embedding_backend,
+            "query_batching": rag_service.batcher.metrics() if rag_service.batcher else None,
+            "retrieval_cache": rag_service.retrieval_cache.stats(),
+            "answer_cache": rag_service.answer_cache.stats(),
+            "graph_cache": rag_service.graph_cache_stats(),
+            "rerank": {"enabled": rag_service.rerank, "budget_ms": rag_service.rerank_budget_ms, **rag_service.reranker.stats()}
         }
         return stats
     except Exception as e:
         return {"error": str(e)}
 
+class ReloadRequest(BaseModel):
+    version: Optional[str] = None  # version directory to load (default: the one named by CURRENT)
+
+@app.post("/admin/reload")
+async def reload_index(req: ReloadRequest = Body(default=ReloadRequest()),
+                       x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Load an index version in the background, validate it and swap it in.
+    Requests in flight finish on the previous version; on failure it stays active.
+    Only versions listed in data/embeddings/versions/ (or "legacy") are accepted.
+    """
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "Invalid admin token"})
+    rag_service = await run_in_threadpool(get_rag_service)
+    try:
+        result = await run_in_threadpool(rag_service.reload_index, req.version)
+    except ValueError as e:
+        # Unknown version or a name that is not a plain directory name
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    result["index"] = rag_service.snapshot.info()
+    return JSONResponse(status_code=200 if result["reloaded"] else 409, content=result)
+
 # QUERY / SEARCH / GRAPH ENDPOINTS
 # -------------------------
 @app.get("/search")
 def search_nodes(q: str):
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (n)
-            WHERE toLower(n.name) CONTAINS toLower($q)
-            RETURN n LIMIT 20
-        """, q=q)
-        nodes = [dict(record["n"]) for record in result]
-    return {"query": q, "results": nodes}
+    """Named nodes matching q in the entity_names full-text index, most relevant first"""
+    search = fulltext_query(q)
+    if not search:
+        return {"query": q, "results": [], "scores": []}
+    records = graph_db.execute_read(NODE_SEARCH_QUERY, {"index": ENTITY_NAME_INDEX, "search": search}, name="search_nodes")
+    return {"query": q, "results": [dict(record["n"]) for record in records],
+            "scores": [record["score"] for record in records]}
 
 @app.get("/paper/{paper_title}")
 def get_paper(paper_title: str):
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (p:Paper {title: $paper_title})-[r]->(n)
-            RETURN p, type(r) AS rel, n
-        """, paper_title=paper_title)
-        data = []
-        for record in result:
-            data.append({
-                "paper": dict(record["p"]),
-                "relationship": record["rel"],
-                "node": dict(record["n"])
-            })
+    records = graph_db.execute_read("""
+        MATCH (p:Paper {title: $paper_title})-[r]->(n)
+        RETURN p, type(r) AS rel, n
+    """, {"paper_title": paper_title}, name="get_paper")
+    data = []
+    for record in records:
+        data.append({
+            "paper": dict(record["p"]),
+            "relationship": record["rel"],
+            "node": dict(record["n"])
+        })
     return data
 
 @app.get("/graph")
@@ -269,74 +381,67 @@ def get_graph(filter_type: str = None, query: str = None):
     Get knowledge graph data for Cytoscape visualization
     If query is provided, find nodes related to the search query
     """
-    if driver is None:
+    if not graph_db.available:
         return {"nodes": [], "edges": [], "error": "Neo4j driver not initialized"}
     
-    with driver.session() as session:
-        if query:
-            # Search for nodes related to the query
-            cypher_query = """
-            MATCH (n)-[r]->(m)
-            WHERE (n.name IS NOT NULL AND toLower(n.name) CONTAINS toLower($search_query)) 
-               OR (m.name IS NOT NULL AND toLower(m.name) CONTAINS toLower($search_query))
-            RETURN n, r, m
-            LIMIT 100
-            """
-            try:
-                result = session.run(cypher_query, search_query=query)
-            except Exception as e:
-                print(f"Error with query search: {e}")
-                # Fallback to basic query
-                result = session.run("MATCH (n)-[r]->(m) RETURN n, r, m LIMIT 50")
-        elif filter_type:
-            cypher_query = f"MATCH (n:{filter_type})-[r]->(m) RETURN n, r, m LIMIT 50"
-            result = session.run(cypher_query)
-        else:
-            # Default: get a sample of all relationships
-            result = session.run("MATCH (n)-[r]->(m) RETURN n, r, m LIMIT 50")
-        
-        nodes = set()
-        edges = []
+    search = fulltext_query(query) if query else ""
+    if search:
+        try:
+            records = graph_db.execute_read(GRAPH_SEARCH_QUERY, {"index": ENTITY_NAME_INDEX, "search_query": search},
+                                            name="graph_search")
+        except Exception as e:
+            print(f"Error with query search: {e}")
+            # Fallback to basic query
+            records = graph_db.execute_read("MATCH (n)-[r]->(m) RETURN n, r, m LIMIT 50", name="graph_sample")
+    elif filter_type:
+        cypher_query = f"MATCH (n:{filter_type})-[r]->(m) RETURN n, r, m LIMIT 50"
+        records = graph_db.execute_read(cypher_query, name="graph_filter")
+    else:
+        # Default: get a sample of all relationships
+        records = graph_db.execute_read("MATCH (n)-[r]->(m) RETURN n, r, m LIMIT 50", name="graph_sample")
+    
+    nodes = set()
+    edges = []
+    
+    for record in records:
+        from_node = dict(record["n"])
+        to_node = dict(record["m"])
+        rel_type = record["r"].type
         
-        for record in result:
-            from_node = dict(record["n"])
-            to_node = dict(record["m"])
-            rel_type = record["r"].type
-            
-            # Add nodes to set (to avoid duplicates)
-            from_name = from_node.get("name", "unknown")
-            to_name = to_node.get("name", "unknown")
-            from_type = from_node.get("labels", ["Unknown"])[0] if "labels" in from_node else "Unknown"
-            to_type = to_node.get("labels", ["Unknown"])[0] if "labels" in to_node else "Unknown"
-            
-            nodes.add((from_name, from_type))
-            nodes.add((to_name, to_type))
-            
-            # Add edge
-            edges.append({
-                "data": {
-                    "id": f"{from_name}-{to_name}",
-                    "source": from_name,
-                    "target": to_name,
-                    "label": rel_type
-                }
-            })
+        # Add nodes to set (to avoid duplicates)
+        from_name = from_node.get("name", "unknown")
+        to_name = to_node.get("name", "unknown")
+        from_type = from_node.get("labels", ["Unknown"])[0] if "labels" in from_node else "Unknown"
+        to_type = to_node.get("labels", ["Unknown"])[0] if "labels" in to_node else "Unknown"
         
-        # Convert nodes set to list
-        nodes_list = []
-        for node_name, node_type in nodes:
-            nodes_list.append({
-                "data": {
-                    "id": node_name,
-                    "label": node_name,
-                    "type": node_type
-                }
-            })
+        nodes.add((from_name, from_type))
+        nodes.add((to_name, to_type))
         
-        return {
-            "nodes": nodes_list,
-            "edges": edges,
-            "query": query,
-            "total_nodes": len(nodes_list),
-            "total_edges": len(edges)
-        }
+        # Add edge
+        edges.append({
+            "data": {
+                "id": f"{from_name}-{to_name}",
+                "source": from_name,
+                "target": to_name,
+                "label": rel_type
+            }
+        })
+    
+    # Convert nodes set to list
+    nodes_list = []
+    for node_name, node_type in nodes:
+        nodes_list.append({
+            "data": {
+                "id": node_name,
+                "label": node_name,
+                "type": node_type
+            }
+        })
+    
+    return {
+        "nodes": nodes_list,
+        "edges": edges,
+        "query": query,
+        "total_nodes": len(nodes_list),
+        "total_edges": len(edges)
+    }
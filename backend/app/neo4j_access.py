@@ -0,0 +1,219 @@
+"""
+Shared Neo4j access layer.
+
+Every query of the API goes through GraphDB: reads run as managed read
+transactions (routed to read replicas in a cluster), writes as managed write
+transactions. The driver retries both on transient errors (leader switches,
+dropped connections, deadlocks) for up to NEO4J_MAX_RETRY_TIME seconds.
+Each call records its latency, retries and errors under a query name, and
+stats() reports them together with connection pool utilization.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from .neo4j_client import driver, get_async_driver, NEO4J_DATABASE, DRIVER_CONFIG
+except ImportError:
+    from neo4j_client import driver, get_async_driver, NEO4J_DATABASE, DRIVER_CONFIG
+
+READ = "read"
+WRITE = "write"
+
+
+class Neo4jUnavailable(RuntimeError):
+    """Raised when a query is run without a configured Neo4j driver"""
+
+
+def _collect(tx, query: str, parameters: Dict[str, Any]) -> list:
+    """Run a query in a transaction and fetch all records before it closes"""
+    return list(tx.run(query, parameters))
+
+
+def pool_usage(neo4j_driver) -> Optional[Dict[str, Any]]:
+    """
+    Open and in-use connections per server address.
+
+    The driver has no public pool API, so this reads its internals and
+    returns None if they change.
+    """
+    if neo4j_driver is None:
+        return None
+    try:
+        pool = neo4j_driver._pool
+        max_size = pool.pool_config.max_connection_pool_size
+        servers = {}
+        for address, connections in list(pool.connections.items()):
+            connections = list(connections)
+            in_use = sum(1 for connection in connections if connection.in_use)
+            servers[str(address)] = {"open": len(connections), "in_use": in_use,
+                                     "utilization": in_use / max_size if max_size else None}
+        return {"max_size_per_server": max_size, "servers": servers}
+    except Exception:
+        return None
+
+
+class QueryMetrics:
+    """
+    Thread-safe latency, retry and error counters per query name, plus the
+    number of transactions in flight.
+    """
+
+    def __init__(self, window: int = 1000):
+        """
+        Args:
+            window: Latest latencies kept per query name for percentiles
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._queries: Dict[str, Dict[str, Any]] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def end(self, name: str, access: str, seconds: float, attempts: int, error: Optional[Exception]):
+        with self._lock:
+            self.in_flight -= 1
+            entry = self._queries.get(name)
+            if entry is None:
+                entry = self._queries[name] = {"access": access, "count": 0, "errors": 0, "retries": 0,
+                                               "last_error": None, "latencies": deque(maxlen=self.window)}
+            entry["count"] += 1
+            entry["retries"] += max(0, attempts - 1)
+            entry["latencies"].append(seconds * 1000.0)
+            if error is not None:
+                entry["errors"] += 1
+                entry["last_error"] = f"{type(error).__name__}: {error}"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = {}
+            for name, entry in self._queries.items():
+                latencies = sorted(entry["latencies"])
+                queries[name] = {
+                    "access": entry["access"],
+                    "count": entry["count"],
+                    "errors": entry["errors"],
+                    "retries": entry["retries"],
+                    "last_error": entry["last_error"],
+                    "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+                    "p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+                    "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+                    "max_ms": latencies[-1] if latencies else 0.0,
+                }
+            return {"in_flight": self.in_flight, "peak_in_flight": self.peak_in_flight, "queries": queries}
+
+
+class GraphDB:
+    """
+    Managed-transaction access to Neo4j through the shared, pooled drivers.
+    """
+
+    def __init__(self, sync_driver, async_driver_factory: Optional[Callable] = None,
+                 database: Optional[str] = None):
+        """
+        Args:
+            sync_driver: Neo4j driver (None when Neo4j is not configured)
+            async_driver_factory: Returns the async driver; called inside the event loop
+            database: Database name (None = the server's default)
+        """
+        self.driver = sync_driver
+        self._async_driver_factory = async_driver_factory
+        self._async_driver = None
+        self.database = database
+        self.metrics = QueryMetrics()
+
+    @property
+    def available(self) -> bool:
+        return self.driver is not None
+
+    @property
+    def async_driver(self):
+        """Async driver, created on first use inside the running event loop"""
+        if self._async_driver is None and self.driver is not None and self._async_driver_factory:
+            self._async_driver = self._async_driver_factory()
+        return self._async_driver
+
+    def _transaction(self, access: str, work: Callable, args: tuple, name: str):
+        if self.driver is None:
+            raise Neo4jUnavailable("Neo4j driver not initialized. Check environment variables.")
+        attempts = [0]
+
+        def counted(tx, *work_args):
+            attempts[0] += 1
+            return work(tx, *work_args)
+
+        error = None
+        start = time.perf_counter()
+        self.metrics.begin()
+        try:
+            with self.driver.session(database=self.database) as session:
+                run = session.execute_read if access == READ else session.execute_write
+                return run(counted, *args)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.metrics.end(name, access, time.perf_counter() - start, attempts[0], error)
+
+    def read_transaction(self, work: Callable, *args, name: Optional[str] = None):
+        """Run work(tx, *args) in a managed read transaction and return its result"""
+        return self._transaction(READ, work, args, name or work.__name__)
+
+    def write_transaction(self, work: Callable, *args, name: Optional[str] = None):
+        """Run work(tx, *args) in a managed write transaction and return its result"""
+        return self._transaction(WRITE, work, args, name or work.__name__)
+
+    def execute_read(self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "query") -> list:
+        """Records of a read query"""
+        return self.read_transaction(_collect, query, parameters or {}, name=name)
+
+    def execute_write(self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "query") -> list:
+        """Records of a write query"""
+        return self.write_transaction(_collect, query, parameters or {}, name=name)
+
+    async def aexecute_read(self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "query") -> list:
+        """execute_read on the async driver"""
+        async_driver = self.async_driver
+        if async_driver is None:
+            raise Neo4jUnavailable("Async Neo4j driver not initialized")
+        attempts = [0]
+
+        async def work(tx):
+            attempts[0] += 1
+            result = await tx.run(query, parameters or {})
+            return [record async for record in result]
+
+        error = None
+        start = time.perf_counter()
+        self.metrics.begin()
+        try:
+            async with async_driver.session(database=self.database) as session:
+                return await session.execute_read(work)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.metrics.end(name, READ, time.perf_counter() - start, attempts[0], error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "database": self.database,
+            "config": DRIVER_CONFIG,
+            "pool": {"sync": pool_usage(self.driver), "async": pool_usage(self._async_driver)},
+            **self.metrics.stats(),
+        }
+
+
+graph_db = GraphDB(driver, get_async_driver, NEO4J_DATABASE)
+
+
+def get_graph_db() -> GraphDB:
+    """The shared access layer over the module-level drivers"""
+    return graph_db
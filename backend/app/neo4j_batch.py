@@ -0,0 +1,182 @@
+"""
+Batched UNWIND writes for the Neo4j loaders.
+
+Instead of one MERGE per node or relationship, rows are sent as a list
+parameter and written by one query per batch:
+
+    UNWIND $rows AS row
+    MERGE (n:Organism {name: row.name})
+
+Each batch runs in its own managed write transaction, which the driver
+retries on transient errors (lock timeouts, deadlocks, leader changes).
+WriteStats counts rows, retries and the nodes and relationships Neo4j
+reports as created, for a throughput summary.
+
+run_workers() writes partitions of rows from a thread pool, one session per
+worker. Callers partition so that no two workers merge the same node or
+relationship (see load_to_neo4j.py); what contention remains on shared end
+nodes is resolved by the retries.
+"""
+import heapq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Rows per UNWIND transaction
+BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "1000"))
+
+
+def batches(rows: Iterable[Any], size: int = BATCH_SIZE) -> Iterator[List[Any]]:
+    """Consecutive lists of up to size rows; rows may be a generator"""
+    if size < 1:
+        raise ValueError("Batch size must be at least 1")
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def merge_nodes_query(label: str, key: str, properties: Sequence[str] = ()) -> str:
+    """UNWIND query merging one node per row on row[key] and setting row[p] for p in properties"""
+    query = f"UNWIND $rows AS row\nMERGE (n:{label} {{{key}: row.{key}}})"
+    if properties:
+        query += "\nSET " + ", ".join(f"n.{prop} = row.{prop}" for prop in properties)
+    return query
+
+
+def merge_relationships_query(source_label: str, source_key: str, rel_type: str,
+                              target_label: str, target_key: str) -> str:
+    """UNWIND query merging (source)-[:rel_type]->(target) per row of {source, target} keys"""
+    return (
+        "UNWIND $rows AS row\n"
+        f"MATCH (a:{source_label} {{{source_key}: row.source}})\n"
+        f"MATCH (b:{target_label} {{{target_key}: row.target}})\n"
+        f"MERGE (a)-[:{rel_type}]->(b)"
+    )
+
+
+def _write_batch(tx, query: str, rows: List[Any]):
+    return tx.run(query, rows=rows).consume().counters
+
+
+class WriteStats:
+    """Rows, created nodes/relationships and write time of one writer"""
+
+    def __init__(self, name: str = "loader"):
+        self.name = name
+        self.rows: Dict[str, int] = {}
+        self.nodes_created = 0
+        self.relationships_created = 0
+        self.batches = 0
+        self.retries = 0
+        self.seconds = 0.0
+
+    def add(self, kind: str, rows: int, counters, seconds: float, attempts: int = 1):
+        self.rows[kind] = self.rows.get(kind, 0) + rows
+        self.nodes_created += counters.nodes_created
+        self.relationships_created += counters.relationships_created
+        self.batches += 1
+        self.retries += max(0, attempts - 1)
+        self.seconds += seconds
+
+    def merge(self, other: "WriteStats"):
+        for kind, rows in other.rows.items():
+            self.rows[kind] = self.rows.get(kind, 0) + rows
+        self.nodes_created += other.nodes_created
+        self.relationships_created += other.relationships_created
+        self.batches += other.batches
+        self.retries += other.retries
+        self.seconds += other.seconds
+
+    def rate(self, kind: str, seconds: Optional[float] = None) -> float:
+        """Rows of kind written per second (of write time, or of the given wall time)"""
+        seconds = self.seconds if seconds is None else seconds
+        return self.rows.get(kind, 0) / seconds if seconds > 0 else 0.0
+
+    def summary(self, seconds: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "rows": dict(self.rows),
+            "rows_per_second": {kind: round(self.rate(kind, seconds), 1) for kind in self.rows},
+            "nodes_created": self.nodes_created,
+            "relationships_created": self.relationships_created,
+            "batches": self.batches,
+            "retries": self.retries,
+            "seconds": round(self.seconds if seconds is None else seconds, 3),
+        }
+
+    def report(self, seconds: Optional[float] = None) -> str:
+        s = self.summary(seconds)
+        rows = ", ".join(f"{count:,} {kind} rows ({s['rows_per_second'][kind]:,.0f}/s)"
+                         for kind, count in s["rows"].items() if count)
+        return (f"{s['name']}: {rows or 'no rows'}; {s['nodes_created']:,} nodes and "
+                f"{s['relationships_created']:,} relationships created in {s['batches']} batches "
+                f"({s['retries']} retried), {s['seconds']:.2f}s")
+
+
+class BatchWriter:
+    """Writes rows through a session in UNWIND batches of batch_size"""
+
+    def __init__(self, session, batch_size: int = BATCH_SIZE, stats: Optional[WriteStats] = None):
+        self.session = session
+        self.batch_size = batch_size
+        self.stats = stats or WriteStats()
+
+    def write(self, query: str, rows: Iterable[Any], kind: str = "nodes") -> int:
+        """Write all rows with query ($rows = one batch); returns the number of rows"""
+        written = 0
+        for batch in batches(rows, self.batch_size):
+            attempts = [0]
+
+            def counted(tx, *args):
+                attempts[0] += 1
+                return _write_batch(tx, *args)
+
+            start = time.perf_counter()
+            counters = self.session.execute_write(counted, query, batch)
+            self.stats.add(kind, len(batch), counters, time.perf_counter() - start, attempts[0])
+            written += len(batch)
+        return written
+
+
+# A unit of work for run_workers: (query, rows, kind)
+WriteTask = Tuple[str, List[Any], str]
+
+
+def partition_groups(groups: Dict[Hashable, List[Any]], workers: int) -> List[List[Any]]:
+    """
+    Assign whole groups of rows to workers, largest group first to the least
+    loaded worker. Returns the group keys of each worker.
+    """
+    loads = [(0, worker) for worker in range(workers)]
+    assigned: List[List[Any]] = [[] for _ in range(workers)]
+    for key in sorted(groups, key=lambda k: (-len(groups[k]), str(k))):
+        load, worker = heapq.heappop(loads)
+        assigned[worker].append(key)
+        heapq.heappush(loads, (load + len(groups[key]), worker))
+    return assigned
+
+
+def run_workers(driver, partitions: List[List[WriteTask]], batch_size: int = BATCH_SIZE,
+                name: str = "worker") -> List[WriteStats]:
+    """
+    Write each partition of tasks on its own thread and session. Returns the
+    WriteStats of every worker; the first failure is raised after all finish.
+    """
+    def work(index: int, tasks: List[WriteTask]) -> WriteStats:
+        stats = WriteStats(f"{name}-{index}")
+        with driver.session() as session:
+            writer = BatchWriter(session, batch_size, stats)
+            for query, rows, kind in tasks:
+                writer.write(query, rows, kind)
+        return stats
+
+    if not partitions:
+        return []
+    with ThreadPoolExecutor(max_workers=len(partitions), thread_name_prefix=name) as pool:
+        futures = [pool.submit(work, index, tasks) for index, tasks in enumerate(partitions)]
+    return [future.result() for future in futures]
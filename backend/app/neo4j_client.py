@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, AsyncGraphDatabase
 
 # Load environment variables
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,11 +11,32 @@ load_dotenv(env_path)
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None  # None = the server's default database
+
+# Connection pool and retry settings shared by the sync and async drivers
+# (driver defaults: 100 connections, 3600 s lifetime, 60 s acquisition
+# timeout, 30 s connect timeout, 30 s transaction retry time)
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_CONNECTION_LIFETIME = float(os.getenv("NEO4J_CONNECTION_LIFETIME", "1800"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "10"))
+NEO4J_CONNECTION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "10"))
+NEO4J_MAX_RETRY_TIME = float(os.getenv("NEO4J_MAX_RETRY_TIME", "15"))
+# Connections idle for longer than this are checked before use (Aura drops idle connections)
+NEO4J_LIVENESS_CHECK = float(os.getenv("NEO4J_LIVENESS_CHECK", "60"))
+
+DRIVER_CONFIG = {
+    "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+    "max_connection_lifetime": NEO4J_CONNECTION_LIFETIME,
+    "connection_acquisition_timeout": NEO4J_ACQUISITION_TIMEOUT,
+    "connection_timeout": NEO4J_CONNECTION_TIMEOUT,
+    "max_transaction_retry_time": NEO4J_MAX_RETRY_TIME,
+    "liveness_check_timeout": NEO4J_LIVENESS_CHECK,
+}
 
 # Initialize driver only if URI is provided
 if NEO4J_URI and NEO4J_PASSWORD:
     try:
-        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), **DRIVER_CONFIG)
         print(f"SUCCESS: Neo4j driver initialized successfully")
     except Exception as e:
         print(f"ERROR: Failed to initialize Neo4j driver: {e}")
@@ -24,6 +45,21 @@ else:
     print("WARNING: Neo4j environment variables not set. Graph features will be disabled.")
     driver = None
 
+# The async driver binds to the event loop it is first used on, so it is
+# created lazily from inside the running loop
+async_driver = None
+
 def get_driver():
     """Get the Neo4j driver instance"""
     return driver
+
+def get_async_driver():
+    """Get the async Neo4j driver instance (call from within the event loop)"""
+    global async_driver
+    if async_driver is None and NEO4J_URI and NEO4J_PASSWORD:
+        try:
+            async_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), **DRIVER_CONFIG)
+            print(f"SUCCESS: Async Neo4j driver initialized successfully")
+        except Exception as e:
+            print(f"ERROR: Failed to initialize async Neo4j driver: {e}")
+    return async_driver
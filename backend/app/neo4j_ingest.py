@@ -1,12 +1,49 @@
 import csv
 import json
+import time
 #from neo4j_client import get_driver
 
+try:
+    from .neo4j_batch import BATCH_SIZE, BatchWriter, WriteStats, merge_nodes_query
+    from .chunk_store import assign_chunk_ids
+except ImportError:
+    from neo4j_batch import BATCH_SIZE, BatchWriter, WriteStats, merge_nodes_query
+    from chunk_store import assign_chunk_ids
+
 ALLOWED_LABELS = {"Organism","ExperimentType","Assay","Outcome","Mission","Gene","Paper","Document"}
 
-def ingest_from_metadata_and_chunks(metadata_path, chunks_path):
+PAPERS_QUERY = merge_nodes_query("Paper", "paper_id", ["title"])
+
+# Documents are keyed by chunk ID (the Document.id constraint) and linked to
+# their paper in the same batch
+DOCUMENTS_QUERY = merge_nodes_query("Document", "id", ["text", "paper_id", "source"]) + """
+WITH n, row
+MATCH (p:Paper {paper_id: row.paper_id})
+MERGE (p)-[:HAS_CHUNK]->(n)
+"""
+
+
+def stream_document_rows(chunks_path):
+    """
+    Document rows read one line at a time from the chunks JSONL file. IDs are
+    the chunk IDs the FAISS index and chunk store use (chunk_store.assign_chunk_ids).
+    """
+    with open(chunks_path, 'r', encoding='utf-8') as f:
+        chunks = (json.loads(line) for line in f if line.strip())
+        for chunk in assign_chunk_ids(chunks):
+            yield {
+                "id": chunk['chunk_id'],
+                "text": chunk['text'],
+                "paper_id": chunk['paper_id'],
+                "source": chunk.get('source', 'unknown'),
+            }
+
+
+def ingest_from_metadata_and_chunks(metadata_path, chunks_path, batch_size=BATCH_SIZE):
     from neo4j_client import driver
+    from graph_version import bump_graph_version
 
+    start = time.perf_counter()
 
     # 1️⃣ Load metadata
     papers = {}
@@ -15,42 +52,25 @@ def ingest_from_metadata_and_chunks(metadata_path, chunks_path):
         for row in reader:
             papers[row['paper_id']] = row
 
-    # 2️⃣ Load chunks
-    chunks = []
-    with open(chunks_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            chunks.append(json.loads(line))
-
     with driver.session() as session:
-        # 3️⃣ Insert Paper nodes
-        for paper_id, paper in papers.items():
-            session.run(
-                "MERGE (p:Paper {paper_id: $pid, title: $title})",
-                pid=paper_id, title=paper['title']
-            )
-
-        # 4️⃣ Insert Chunk nodes (as Document nodes)
-        for chunk in chunks:
-            session.run(
-                """
-                MERGE (d:Document {text: $text, paper_id: $pid, source: $source})
-                """,
-                text=chunk['text'], pid=chunk['paper_id'], source=chunk.get('source','unknown')
-            )
-
-        # OPTIONAL: create Paper->Document relationship
-        for chunk in chunks:
-            session.run(
-                """
-                MATCH (p:Paper {paper_id: $pid})
-                MATCH (d:Document {text: $text, paper_id: $pid})
-                MERGE (p)-[:HAS_CHUNK]->(d)
-                """,
-                pid=chunk['paper_id'], text=chunk['text']
-            )
+        writer = BatchWriter(session, batch_size, WriteStats("neo4j_ingest"))
+
+        # 2️⃣ Insert Paper nodes
+        writer.write(PAPERS_QUERY, ({"paper_id": paper_id, "title": paper['title']}
+                                    for paper_id, paper in papers.items()), kind="papers")
+
+        # 3️⃣ Stream chunks into Document nodes and Paper->Document relationships
+        writer.write(DOCUMENTS_QUERY, stream_document_rows(chunks_path), kind="documents")
+
+        # Invalidate graph lookups cached by the RAG service
+        version = session.execute_write(bump_graph_version)
+        print(f"Graph version bumped to {version}")
+
+    print(writer.stats.report(time.perf_counter() - start))
+    return writer.stats
 
 if __name__ == "__main__":
     metadata_path = "data/metadata2.csv"
     chunks_path = "data/chunks.jsonl"
     ingest_from_metadata_and_chunks(metadata_path, chunks_path)
-    print(f"Ingest finished for metadata: {metadata_path} and chunks: {chunks_path}")
\ No newline at end of file
+    print(f"Ingest finished for metadata: {metadata_path} and chunks: {chunks_path}")
@@ -0,0 +1,134 @@
+import threading
+import time
+import queue
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+
+class QueryBatcher:
+    """
+    Collects queries submitted from concurrent request threads and runs them
+    through one batched call.
+
+    The worker thread waits up to max_wait_ms after the first pending query
+    for more to arrive (or until max_batch_size is reached), then calls
+    batch_fn once with every collected item and hands each caller its own
+    entry of the returned list.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, metrics_window: int = 1000,
+                 timeout_seconds: Optional[float] = 60.0):
+        """
+        Args:
+            batch_fn: Called with a list of submitted items, returns one result per item
+            max_batch_size: Largest number of items handed to batch_fn at once
+            max_wait_ms: How long to hold a batch open for more items
+            metrics_window: Number of recent batches kept for the metrics
+            timeout_seconds: How long submit() waits for its result (None = no limit)
+        """
+        self.batch_fn = batch_fn
+        self.timeout_seconds = timeout_seconds
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+        self._batch_sizes = deque(maxlen=metrics_window)
+        self._queue_waits_ms = deque(maxlen=metrics_window)
+        self._total_batches = 0
+        self._total_items = 0
+
+    def submit(self, item: Any) -> Any:
+        """
+        Queue an item, block until its batch has run and return its result.
+        Raises concurrent.futures.TimeoutError after timeout_seconds.
+        """
+        return self.submit_future(item).result(timeout=self.timeout_seconds)
+
+    def submit_future(self, item: Any) -> Future:
+        """
+        Queue an item without waiting; the returned Future resolves to its
+        result once its batch has run. Event-loop callers await it through
+        asyncio.wrap_future. A future cancelled before its batch starts is
+        left out of the batch.
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(pending)
+
+    def _run_batch(self, pending):
+        # Marks the futures running, so they can no longer be cancelled
+        pending = [entry for entry in pending if entry[1].set_running_or_notify_cancel()]
+        if not pending:
+            return
+        started = time.perf_counter()
+        items = [item for item, _, _ in pending]
+        try:
+            results = list(self.batch_fn(items))
+            if len(results) != len(pending):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(pending)} items")
+            for (_, future, _), result in zip(pending, results):
+                future.set_result(result)
+        except Exception as e:
+            # No caller may be left waiting on an unresolved future
+            for _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(e)
+
+        with self._lock:
+            self._batch_sizes.append(len(pending))
+            self._queue_waits_ms.extend((started - enqueued) * 1000.0 for _, _, enqueued in pending)
+            self._total_batches += 1
+            self._total_items += len(pending)
+
+    @staticmethod
+    def _percentile(values: List[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        rank = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[rank]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Batch-size and queue-wait statistics over the recent window"""
+        with self._lock:
+            sizes = list(self._batch_sizes)
+            waits = list(self._queue_waits_ms)
+            total_batches = self._total_batches
+            total_items = self._total_items
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "total_batches": total_batches,
+            "total_queries": total_items,
+            "batch_size_mean": sum(sizes) / len(sizes) if sizes else 0.0,
+            "batch_size_max": max(sizes) if sizes else 0,
+            "queue_wait_ms_p50": self._percentile(waits, 50),
+            "queue_wait_ms_p99": self._percentile(waits, 99),
+            "queue_wait_ms_max": max(waits) if waits else 0.0,
+        }
@@ -1,256 +1,972 @@
 import faiss
 import json
 import os
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any, Set, Tuple
+import numpy as np
+from typing import List, Dict, Any, Optional, Set, Tuple
 import sys
 import re
+import time
+import asyncio
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the backend directory to Python path
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(backend_dir)
 
-# Import Neo4j client
+# Import Neo4j access layer
 try:
-    from .neo4j_client import get_driver
+    from .neo4j_access import get_graph_db
 except ImportError:
     try:
-        from neo4j_client import get_driver
+        from neo4j_access import get_graph_db
     except ImportError:
         print("WARNING: Neo4j client not available")
-        get_driver = None
+        get_graph_db = None
 
-from gemini.gemini_utils import qa
+try:
+    from .query_batcher import QueryBatcher
+    from .caches import LRUCache, AnswerCache, GraphCache, chunk_fingerprint, normalize_query
+    from .reranker import CrossEncoderReranker
+    from .diversity import mmr_select
+    from .embedding_backends import load_embedding_model, EMBEDDING_BACKEND
+    from .index_snapshot import IndexSnapshot, check_version, current_version, resolve_index_dir, version_dir
+    from .graph_version import GraphVersionTracker, GraphDerived
+    from .graph_snapshot import GraphSnapshot
+    from .entity_linker import EntityLinker
+    from .fulltext import ENTITY_NAME_INDEX, PAPER_TITLE_INDEX, fulltext_query
+except ImportError:
+    from query_batcher import QueryBatcher
+    from caches import LRUCache, AnswerCache, GraphCache, chunk_fingerprint, normalize_query
+    from reranker import CrossEncoderReranker
+    from diversity import mmr_select
+    from embedding_backends import load_embedding_model, EMBEDDING_BACKEND
+    from index_snapshot import IndexSnapshot, check_version, current_version, resolve_index_dir, version_dir
+    from graph_version import GraphVersionTracker, GraphDerived
+    from graph_snapshot import GraphSnapshot
+    from entity_linker import EntityLinker
+    from fulltext import ENTITY_NAME_INDEX, PAPER_TITLE_INDEX, fulltext_query
+
+from gemini.gemini_utils import qa, qa_stream, is_configured as gemini_configured
+
+# Map the FAISS index read-only from disk instead of reading it into the heap,
+# so uvicorn workers share one copy through the page cache
+INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "false").lower() in ("1", "true", "yes")
+
+# Poll data/embeddings/CURRENT every N seconds and hot-reload newly published
+# index versions (0 = only reload through POST /admin/reload)
+INDEX_WATCH_SECONDS = float(os.getenv("RAG_INDEX_WATCH_SECONDS", "0"))
+
+# Micro-batching of query encoding + FAISS search across concurrent requests.
+# A max batch size of 1 turns batching off.
+BATCH_MAX_SIZE = int(os.getenv("RAG_BATCH_MAX_SIZE", "32"))
+BATCH_WAIT_MS = float(os.getenv("RAG_BATCH_WAIT_MS", "5"))
+
+# Cache of query vectors + FAISS hits keyed by (normalized query, top_k)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RAG_RETRIEVAL_CACHE_TTL", "3600"))
+
+# Semantic cache of Gemini answers keyed by retrieved chunk set + query embedding.
+# Set RAG_ANSWER_CACHE_DB to a file path to keep the cache across restarts.
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_DB = os.getenv("RAG_ANSWER_CACHE_DB", "")
+
+# Cache of Neo4j entity/related-paper lookups keyed by the sorted entity list or
+# paper-ID set. Entries are tied to the graph version stamp bumped by ingestion,
+# which is re-read at most every RAG_GRAPH_VERSION_CHECK_SECONDS; when Neo4j is
+# unreachable the last cached results are served instead.
+GRAPH_CACHE_SIZE = int(os.getenv("RAG_GRAPH_CACHE_SIZE", "4096"))
+GRAPH_CACHE_TTL = float(os.getenv("RAG_GRAPH_CACHE_TTL", "3600"))
+GRAPH_VERSION_CHECK_SECONDS = float(os.getenv("RAG_GRAPH_VERSION_CHECK_SECONDS", "30"))
+
+# Compute related papers in-process from a SciPy CSR paper-entity matrix
+# exported from Neo4j at warmup and again whenever the graph version changes
+# (the Cypher query is used until the first export finishes)
+GRAPH_SNAPSHOT = os.getenv("RAG_GRAPH_SNAPSHOT", "true").lower() in ("1", "true", "yes")
+
+# Hybrid retrieval: FTS5 BM25 and FAISS run in parallel and are merged with
+# reciprocal rank fusion (used only when chunks_fts.db is present)
+HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+SEARCH_WORKERS = int(os.getenv("RAG_SEARCH_WORKERS", "8"))
+
+# Optional cross-encoder re-ranking of the merged FAISS/FTS5/Neo4j candidates.
+# RAG_RERANK sets the default, requests can turn it on or off individually.
+RERANK = os.getenv("RAG_RERANK", "false").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.getenv("RAG_RERANK_TOP_N", "30"))
+RERANK_BATCH_SIZE = int(os.getenv("RAG_RERANK_BATCH_SIZE", "16"))
+RERANK_BUDGET_MS = float(os.getenv("RAG_RERANK_BUDGET_MS", "200"))
+RERANK_CACHE_SIZE = int(os.getenv("RAG_RERANK_CACHE_SIZE", "8192"))
+
+# Maximal Marginal Relevance over FAISS hits plus the best chunks of papers
+# found through Neo4j (candidate pool of at most RAG_MMR_POOL chunks)
+MMR = os.getenv("RAG_MMR", "true").lower() in ("1", "true", "yes")
+MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+MMR_MAX_PER_PAPER = int(os.getenv("RAG_MMR_MAX_PER_PAPER", "3"))
+MMR_POOL = int(os.getenv("RAG_MMR_POOL", "200"))
+
+# Papers reachable from entities mentioned in the query: nodes whose name or
+# title matches in the full-text indexes are the seeds, papers on a
+# (p:Paper)-(e1)-(e2)-(p2:Paper) path through a seed are ranked by the summed
+# relevance of their seeds. The pattern is undirected, so paths with the seed
+# at p or e1 cover the other two positions when both endpoints are returned.
+ENTITY_PAPERS_QUERY = """
+CALL {
+    CALL db.index.fulltext.queryNodes($entity_index, $search) YIELD node, score
+    RETURN node, score
+    UNION ALL
+    CALL db.index.fulltext.queryNodes($paper_index, $search) YIELD node, score
+    RETURN node, score
+}
+WITH node AS seed, score
+ORDER BY score DESC
+LIMIT $seed_limit
+CALL {
+    WITH seed
+    MATCH (p:Paper)-[r1]-(seed)-[r2]-(e2)-[r3]-(p2:Paper)
+    RETURN p, seed AS e1, e2, p2, r1, r2, r3
+    UNION
+    WITH seed
+    MATCH (seed:Paper)-[r1]-(e1)-[r2]-(e2)-[r3]-(p2:Paper)
+    RETURN seed AS p, e1, e2, p2, r1, r2, r3
+}
+UNWIND [p, p2] AS paper
+WITH paper, seed, max(score) AS score,
+    collect(DISTINCT e1.name) + collect(DISTINCT e2.name) AS names,
+    collect(DISTINCT type(r1)) + collect(DISTINCT type(r2)) + collect(DISTINCT type(r3)) AS rel_types
+WITH paper, sum(score) AS score,
+    reduce(acc = [], l IN collect(names) | acc + l) AS names,
+    reduce(acc = [], l IN collect(rel_types) | acc + l) AS rel_types
+WITH paper, score,
+    reduce(acc = [], name IN names | CASE WHEN name IN acc THEN acc ELSE acc + name END) AS all_entities,
+    reduce(acc = [], t IN rel_types | CASE WHEN t IN acc THEN acc ELSE acc + t END) AS all_relationships
+RETURN paper.paper_id AS paper_id,
+    paper.title AS title,
+    all_entities,
+    all_relationships,
+    size(all_entities) AS entity_count,
+    score
+ORDER BY score DESC, entity_count DESC
+LIMIT 20
+"""
+
+# Full-text matches used as seeds of ENTITY_PAPERS_QUERY
+ENTITY_SEED_LIMIT = 25
+
+# Papers sharing entities with the given papers
+RELATED_PAPERS_QUERY = """
+MATCH (p:Paper)-[r]-(e)-[r2]-(p2:Paper)
+WHERE p.paper_id IN $paper_ids
+WITH DISTINCT p2, 
+    collect(DISTINCT e.name) as shared_entities,
+    collect(DISTINCT type(r)) as relationship_types
+RETURN p2.paper_id as paper_id,
+    p2.title as title,
+    shared_entities,
+    relationship_types,
+    size(shared_entities) as shared_entity_count
+ORDER BY shared_entity_count DESC
+LIMIT 15
+"""
 
 class RAGService:
     def __init__(self):
         """Initialize the RAG service with FAISS index and embedding model"""
-        # Use absolute paths
+        # Versioned index directories under data/embeddings (see index_snapshot)
         backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.index_path = os.path.join(backend_dir, "data", "embeddings", "faiss_index.idx")
-        self.metadata_path = os.path.join(backend_dir, "data", "embeddings", "chunk_metadata.json")
+        self.index_base_dir = os.path.join(backend_dir, "data", "embeddings")
+        self.hybrid_search = HYBRID_SEARCH
         self.model_name = "sentence-transformers/all-MiniLM-L6-v2"
+        self.embedding_backend = EMBEDDING_BACKEND
+        self.index_mmap = INDEX_MMAP
         
-        # Load FAISS index
-        if os.path.exists(self.index_path):
-            try:
-                self.index = faiss.read_index(self.index_path)
-                print(f"SUCCESS: FAISS index loaded with {self.index.ntotal} vectors")
-            except Exception as e:
-                print(f"ERROR: Failed to load FAISS index: {e}")
-                self.index = None
-        else:
-            print(f"WARNING: FAISS index not found at {self.index_path}")
-            self.index = None
+        self.retrieval_cache = LRUCache(max_size=RETRIEVAL_CACHE_SIZE, ttl_seconds=RETRIEVAL_CACHE_TTL)
+        self.answer_cache = AnswerCache(
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl_seconds=ANSWER_CACHE_TTL,
+            similarity_threshold=ANSWER_CACHE_THRESHOLD,
+            db_path=ANSWER_CACHE_DB or None
+        )
+        self.graph_version = GraphVersionTracker(refresh_seconds=GRAPH_VERSION_CHECK_SECONDS)
+        self.entity_graph_cache = GraphCache(max_size=GRAPH_CACHE_SIZE, ttl_seconds=GRAPH_CACHE_TTL or None)
+        self.related_graph_cache = GraphCache(max_size=GRAPH_CACHE_SIZE, ttl_seconds=GRAPH_CACHE_TTL or None)
+        self.graph_snapshot_enabled = GRAPH_SNAPSHOT
+        self._graph_snapshot = GraphDerived("graph snapshot", self._export_graph_snapshot,
+                                            retry_seconds=GRAPH_VERSION_CHECK_SECONDS)
         
-        # Load chunk metadata
-        if os.path.exists(self.metadata_path):
-            try:
-                with open(self.metadata_path, "r", encoding="utf-8") as f:
-                    self.chunks = json.load(f)
-                print(f"SUCCESS: Loaded metadata for {len(self.chunks)} chunks")
-            except Exception as e:
-                print(f"ERROR: Failed to load chunk metadata: {e}")
-                self.chunks = []
-        else:
-            print(f"WARNING: Chunk metadata not found at {self.metadata_path}")
-            self.chunks = []
+        # Query entity linking against every entity name in the graph (or the
+        # extraction files while Neo4j is not available)
+        self.entities_dir = os.path.join(backend_dir, "data", "entities")
+        self._entity_linker = GraphDerived("entity linker", self._build_entity_linker,
+                                           retry_seconds=GRAPH_VERSION_CHECK_SECONDS)
+        
+        # Load the current index version: FAISS index (with the search
+        # parameters it was built with), chunk metadata, FTS5 index and stats.
+        # Requests read self.snapshot once; reload_index swaps it atomically.
+        self._reload_lock = threading.Lock()
+        self._generation = 0
+        self.snapshot = self._load_current_snapshot()
         
         # Load embedding model
         try:
-            self.model = SentenceTransformer(self.model_name)
-            print("SUCCESS: Embedding model loaded")
+            self.model = load_embedding_model(self.model_name, self.embedding_backend)
+            print(f"SUCCESS: Embedding model loaded ({self.embedding_backend} backend)")
         except Exception as e:
             print(f"ERROR: Failed to load embedding model: {e}")
             self.model = None
         
-        # Initialize Neo4j driver
-        self.driver = None
-        if get_driver:
+        # Neo4j access layer (pooled drivers shared with the API endpoints)
+        self.graph_db = None
+        if get_graph_db:
             try:
-                self.driver = get_driver()
-                print("SUCCESS: Neo4j driver initialized")
+                self.graph_db = get_graph_db()
+                if self.graph_db.available:
+                    print("SUCCESS: Neo4j driver initialized")
             except Exception as e:
                 print(f"WARNING: Failed to initialize Neo4j driver: {e}")
         
-        # Create paper ID to chunks mapping for faster lookup
-        self.paper_chunks_map = self._build_paper_chunks_map()
-    
-    def _build_paper_chunks_map(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Build a mapping from paper_id to list of chunks for faster lookup"""
-        paper_map = defaultdict(list)
-        for i, chunk in enumerate(self.chunks):
-            paper_id = chunk.get("paper_id", f"unknown_{i}")
-            paper_map[paper_id].append({
-                "chunk_id": chunk.get("chunk_id", i),
-                "text": chunk.get("text", ""),
-                "page_num": chunk.get("page_num", 1),
-                "index": i
-            })
-        return dict(paper_map)
+        # Pool that runs the retrieval legs in parallel
+        self.executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="rag-search")
+        
+        # Batch concurrent queries into one encode + one multi-row search
+        self.batcher = None
+        if BATCH_MAX_SIZE > 1:
+            self.batcher = QueryBatcher(self._embed_and_search, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_WAIT_MS)
+        
+        # Diversity selection over the merged candidates
+        self.mmr = MMR
+        self.mmr_lambda = MMR_LAMBDA
+        self.mmr_max_per_paper = MMR_MAX_PER_PAPER
+        
+        # Cross-encoder re-ranking (the model is loaded on first use)
+        self.rerank = RERANK
+        self.rerank_budget_ms = RERANK_BUDGET_MS
+        self.reranker = CrossEncoderReranker(
+            model_name=RERANK_MODEL,
+            batch_size=RERANK_BATCH_SIZE,
+            top_n=RERANK_TOP_N,
+            cache_size=RERANK_CACHE_SIZE,
+            cache_ttl_seconds=RETRIEVAL_CACHE_TTL
+        )
+    
+    def _load_current_snapshot(self) -> IndexSnapshot:
+        """Load the version named by CURRENT (or the legacy flat layout) at startup"""
+        version, directory = resolve_index_dir(self.index_base_dir)
+        try:
+            return IndexSnapshot.load(directory, version, self._generation, mmap=self.index_mmap)
+        except Exception as e:
+            print(f"ERROR: Failed to load FAISS index version {version}: {e}")
+            return IndexSnapshot.empty(version, self._generation)
+    
+    # Read-only views of the current snapshot, for status endpoints. Request
+    # paths take the snapshot once instead, so a reload cannot change the
+    # index or metadata halfway through a request.
+    @property
+    def index(self):
+        return self.snapshot.index
+    
+    @property
+    def index_stats(self) -> Dict[str, Any]:
+        return self.snapshot.stats
+    
+    @property
+    def full_vectors(self) -> Optional[np.ndarray]:
+        return self.snapshot.full_vectors
+    
+    @property
+    def chunks(self):
+        return self.snapshot.chunks
+    
+    @property
+    def fts(self):
+        return self.snapshot.fts
+    
+    @property
+    def index_generation(self) -> int:
+        return self.snapshot.generation
+    
+    def reload_index(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Load an index version (default: the one named by CURRENT), validate it
+        and swap it in.
+        
+        The new snapshot is loaded and checked (vector count == chunk count)
+        while requests keep running on the old one; the swap is a single
+        reference assignment, so in-flight requests finish on the snapshot
+        they started with. On failure the old snapshot stays in place.
+        
+        Returns:
+            {"reloaded", "version", "previous_version", "error", "load_ms"}
+        
+        Raises:
+            UnknownVersionError: version is not a published version directory
+        """
+        if version is not None:
+            check_version(self.index_base_dir, version)
+        with self._reload_lock:
+            previous = self.snapshot
+            if version is None:
+                version, directory = resolve_index_dir(self.index_base_dir)
+            else:
+                directory = version_dir(self.index_base_dir, version)
+            
+            start = time.perf_counter()
+            try:
+                snapshot = IndexSnapshot.load(directory, version, self._generation + 1, mmap=self.index_mmap)
+            except Exception as e:
+                print(f"ERROR: Index version {version} not loaded, still serving {previous.version}: {e}")
+                return {"reloaded": False, "version": previous.version, "previous_version": previous.version,
+                        "error": str(e), "load_ms": (time.perf_counter() - start) * 1000.0}
+            
+            self._generation += 1
+            self.snapshot = snapshot
+            # Cache keys carry the generation, so results of searches still
+            # running on the old snapshot are never served after the clear
+            self.retrieval_cache.clear()
+            # Answers and re-rank scores are keyed by chunk text as well, but
+            # entries for replaced text would only take up space until expiry
+            self.answer_cache.clear()
+            self.reranker.score_cache.clear()
+            load_ms = (time.perf_counter() - start) * 1000.0
+            print(f"SUCCESS: Swapped index version {previous.version} -> {snapshot.version} ({load_ms:.0f} ms)")
+            return {"reloaded": True, "version": snapshot.version, "previous_version": previous.version,
+                    "error": None, "load_ms": load_ms}
+    
+    def start_index_watcher(self, interval_seconds: float = INDEX_WATCH_SECONDS) -> Optional[threading.Thread]:
+        """Poll CURRENT in a daemon thread and reload when it names a new version"""
+        if interval_seconds <= 0 or getattr(self, "_watcher", None) is not None:
+            return None
+        
+        def watch():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    version = current_version(self.index_base_dir)
+                    if version and version != self.snapshot.version:
+                        print(f"Index version {version} published, reloading")
+                        self.reload_index(version)
+                except Exception as e:
+                    print(f"WARNING: Index watcher error: {e}")
+        
+        self._watcher = threading.Thread(target=watch, name="rag-index-watcher", daemon=True)
+        self._watcher.start()
+        print(f"SUCCESS: Watching {self.index_base_dir} for new index versions every {interval_seconds:g}s")
+        return self._watcher
+    
+    def _link_query_entities(self, query: str) -> List[Dict[str, Any]]:
+        """Entities named in the query, with canonical node IDs (see entity_linker)"""
+        # The last known graph version: linking must not wait on Neo4j, a
+        # changed version only starts a rebuild in the background
+        linker = self._entity_linker.get(self.graph_version.version)
+        if linker is None:
+            return []
+        return linker.link(query)
     
     def _extract_entities_from_query(self, query: str) -> List[str]:
-        """Extract potential entity names from the query for Neo4j search"""
-        # Simple entity extraction - look for capitalized words and common scientific terms
-        words = re.findall(r'\b[A-Z][a-zA-Z]*\b', query)
-        # Add common scientific terms that might be entities
-        scientific_terms = re.findall(r'\b(?:gene|protein|cell|DNA|RNA|mitochondria|immune|microgravity|space|mission|experiment|assay|organism|outcome)\b', query.lower())
-        return list(set(words + scientific_terms))
+        """Names of the entities linked in the query, for the Neo4j entity search"""
+        matches = self._link_query_entities(query)
+        print(f"Linked entities: {[match['id'] for match in matches]}")
+        return list(dict.fromkeys(match["name"] for match in matches))
+    
+    def warmup(self) -> Dict[str, float]:
+        """Run a dummy encode + search through every retrieval leg so the first request does not pay for it"""
+        timings = {}
+        snap = self.snapshot
+        if self.model is not None and snap.index is not None:
+            self._timed(timings, "encode_search_ms", self._embed_and_search, [(snap, "warmup query", 1)])
+        if snap.fts is not None:
+            self._timed(timings, "fts_ms", snap.fts.search, "warmup query", 1)
+        if self.graph_snapshot_enabled and self.driver:
+            self._timed(timings, "graph_snapshot_ms", self.refresh_graph_snapshot)
+        self._timed(timings, "entity_linker_ms", self.refresh_entity_linker)
+        if self.rerank:
+            # The cross-encoder otherwise loads inside the first request's re-rank budget
+            self._timed(timings, "reranker_ms", self.reranker.warmup)
+        print(f"SUCCESS: RAG service warmed up ({', '.join(f'{leg}={ms:.1f}' for leg, ms in timings.items())})")
+        return timings
+    
+    def readiness(self) -> Dict[str, Any]:
+        """State of each component; the service is ready when the required ones loaded"""
+        snap = self.snapshot
+        components = {
+            "embedding_model": {"ready": self.model is not None, "required": True, "backend": self.embedding_backend},
+            "faiss_index": {"ready": snap.index is not None, "required": True, "version": snap.version,
+                            "vectors": snap.index.ntotal if snap.index is not None else 0},
+            "chunk_metadata": {"ready": bool(snap.chunks), "required": True, "chunks": len(snap.chunks)},
+            "lexical_index": {"ready": snap.fts is not None, "required": False},
+            "neo4j": {"ready": self.driver is not None, "required": False},
+            "graph_snapshot": {"ready": self.graph_snapshot is not None, "required": False,
+                               "graph_version": self.graph_snapshot.version if self.graph_snapshot else None},
+            "entity_linker": {"ready": self.entity_linker is not None, "required": False,
+                              "source": self.entity_linker.source if self.entity_linker else None},
+            "reranker": {"ready": self.reranker.stats()["loaded"], "required": False, "enabled": self.rerank},
+            "gemini": {"ready": gemini_configured(), "required": False},
+        }
+        return {
+            "ready": all(c["ready"] for c in components.values() if c["required"]),
+            "components": components
+        }
+    
+    @property
+    def driver(self):
+        """Sync Neo4j driver of the access layer (None when Neo4j is not configured)"""
+        return self.graph_db.driver if self.graph_db is not None else None
+    
+    @property
+    def async_driver(self):
+        """Async Neo4j driver, created on first use inside the running event loop"""
+        return self.graph_db.async_driver if self.graph_db is not None else None
+    
+    @staticmethod
+    def _entity_paper_result(record) -> Dict[str, Any]:
+        return {
+            "paper_id": record["paper_id"],
+            "title": record["title"],
+            "entities": record["all_entities"],
+            "relationships": record["all_relationships"],
+            "entity_count": record["entity_count"],
+            "score": record["score"],
+            "source": "neo4j"
+        }
+    
+    @staticmethod
+    def _related_paper_result(record) -> Dict[str, Any]:
+        return {
+            "paper_id": record["paper_id"],
+            "title": record["title"],
+            "shared_entities": record["shared_entities"],
+            "relationship_types": record["relationship_types"],
+            "shared_entity_count": record["shared_entity_count"],
+            "source": "neo4j_related"
+        }
+    
+    def _graph_cache_key(self, items: List[str]) -> Tuple[str, ...]:
+        """Order-independent cache key of an entity list or paper-ID set"""
+        return tuple(sorted(set(items)))
+    
+    def _stale_graph_results(self, cache: GraphCache, key: Tuple[str, ...], what: str, error: Exception) -> List[Dict[str, Any]]:
+        """Last cached results for key while Neo4j cannot be queried, or nothing"""
+        stale = cache.get_stale(key)
+        if stale is not None:
+            print(f"WARNING: Neo4j {what} search failed, serving cached results: {error}")
+            return stale
+        print(f"ERROR: Neo4j {what} search error: {error}")
+        return []
+    
+    def _cached_graph_query(self, cache: GraphCache, what: str, cypher: str, items: List[str],
+                            to_params, to_result) -> List[Dict[str, Any]]:
+        key = self._graph_cache_key(items)
+        try:
+            version = self.graph_version.current(self.graph_db)
+            cached = cache.get(key, version)
+            if cached is not None:
+                return cached
+            records = self.graph_db.execute_read(cypher, to_params(list(key)), name=f"{what.replace(' ', '_')}_search")
+            results = [to_result(record) for record in records]
+        except Exception as e:
+            return self._stale_graph_results(cache, key, what, e)
+        cache.put(key, results, version)
+        return results
+    
+    async def _acached_graph_query(self, cache: GraphCache, what: str, cypher: str, items: List[str],
+                                   to_params, to_result) -> List[Dict[str, Any]]:
+        key = self._graph_cache_key(items)
+        try:
+            version = await self.graph_version.acurrent(self.graph_db)
+            cached = cache.get(key, version)
+            if cached is not None:
+                return cached
+            records = await self.graph_db.aexecute_read(cypher, to_params(list(key)), name=f"{what.replace(' ', '_')}_search")
+            results = [to_result(record) for record in records]
+        except Exception as e:
+            return self._stale_graph_results(cache, key, what, e)
+        cache.put(key, results, version)
+        return results
+    
+    @staticmethod
+    def _entity_query_params(entities: List[str]) -> Dict[str, Any]:
+        return {
+            "entity_index": ENTITY_NAME_INDEX,
+            "paper_index": PAPER_TITLE_INDEX,
+            "search": fulltext_query(entities),
+            "seed_limit": ENTITY_SEED_LIMIT,
+        }
+    
+    @staticmethod
+    def _related_query_params(paper_ids: List[str]) -> Dict[str, Any]:
+        return {"paper_ids": paper_ids}
     
     def _search_neo4j_entities(self, query: str, entities: List[str]) -> List[Dict[str, Any]]:
-        """Search Neo4j for entities and related papers"""
-        if not self.driver:
+        """Search Neo4j for entities and related papers (cached per entity set and graph version)"""
+        if not self.driver or not fulltext_query(entities):
             return []
+        return self._cached_graph_query(self.entity_graph_cache, "entity", ENTITY_PAPERS_QUERY,
+                                        entities, self._entity_query_params, self._entity_paper_result)
+    
+    @property
+    def graph_snapshot(self) -> Optional[GraphSnapshot]:
+        return self._graph_snapshot.value
+    
+    @property
+    def entity_linker(self) -> Optional[EntityLinker]:
+        return self._entity_linker.value
+    
+    def _export_graph_snapshot(self, version: Optional[int]) -> GraphSnapshot:
+        if version is None:
+            version = self.graph_version.current(self.graph_db)
+        snapshot = GraphSnapshot.export(self.graph_db, version)
+        info = snapshot.info()
+        print(f"SUCCESS: Graph snapshot v{version} loaded: {info['papers']} papers, {info['entities']} entities, "
+              f"{info['edges']} edges")
+        return snapshot
+    
+    def _build_entity_linker(self, version: Optional[int]) -> EntityLinker:
+        linker = None
+        if self.driver:
+            try:
+                if version is None:
+                    version = self.graph_version.current(self.graph_db)
+                linker = EntityLinker.from_graph(self.graph_db, version)
+            except Exception as e:
+                if self.entity_linker is not None:
+                    raise
+                print(f"WARNING: Entity names not loaded from Neo4j ({e}), using {self.entities_dir}")
+        if linker is None:
+            linker = EntityLinker.from_entity_files(self.entities_dir)
+        info = linker.info()
+        print(f"SUCCESS: Entity linker built from {info['source']}: {info['names']} names, "
+              f"{info['entities']} entities ({info['automaton']} automaton, {info['build_ms']:.0f} ms)")
+        return linker
+    
+    def refresh_graph_snapshot(self, version: Optional[int] = None) -> Optional[GraphSnapshot]:
+        """
+        Export the paper-entity matrix at the current graph version and swap it in.
         
+        Skipped while another export is running; on failure the previous
+        snapshot stays in place.
+        """
+        return self._graph_snapshot.refresh(version)
+    
+    def refresh_entity_linker(self, version: Optional[int] = None) -> Optional[EntityLinker]:
+        """Rebuild the entity name automaton and swap it in (previous one kept on failure)"""
+        return self._entity_linker.refresh(version)
+    
+    def _current_graph_snapshot(self, version: Optional[int]) -> Optional[GraphSnapshot]:
+        """
+        Snapshot to answer related-paper lookups from, or None to query Neo4j.
+        
+        When the graph version moved on, a new export starts in the background
+        and the previous snapshot keeps serving until it is swapped in.
+        """
+        return self._graph_snapshot.get(version)
+    
+    def _graph_version_or_none(self) -> Optional[int]:
         try:
-            with self.driver.session() as session:
-                # Build a comprehensive query to find papers through multiple paths
-                cypher_query = """
-                MATCH (p:Paper)-[r1]-(e1)-[r2]-(e2)-[r3]-(p2:Paper)
-                WHERE ANY(entity IN $entities WHERE 
-                    toLower(e1.name) CONTAINS toLower(entity) OR 
-                    toLower(e2.name) CONTAINS toLower(entity) OR
-                    toLower(p.title) CONTAINS toLower(entity) OR
-                    toLower(p2.title) CONTAINS toLower(entity)
-                )
-                WITH DISTINCT p, p2, 
-                    collect(DISTINCT e1.name) as entities1,
-                    collect(DISTINCT e2.name) as entities2,
-                    collect(DISTINCT type(r1)) as rel_types1,
-                    collect(DISTINCT type(r2)) as rel_types2,
-                    collect(DISTINCT type(r3)) as rel_types3
-                RETURN DISTINCT p.paper_id as paper_id, 
-                    p.title as title,
-                    entities1 + entities2 as all_entities,
-                    rel_types1 + rel_types2 + rel_types3 as all_relationships,
-                    size(entities1 + entities2) as entity_count
-                ORDER BY entity_count DESC
-                LIMIT 20
-                """
-                
-                result = session.run(cypher_query, entities=entities)
-                papers = []
-                for record in result:
-                    papers.append({
-                        "paper_id": record["paper_id"],
-                        "title": record["title"],
-                        "entities": record["all_entities"],
-                        "relationships": record["all_relationships"],
-                        "entity_count": record["entity_count"],
-                        "source": "neo4j"
-                    })
-                return papers
-        except Exception as e:
-            print(f"ERROR: Neo4j search error: {e}")
-            return []
+            return self.graph_version.current(self.graph_db)
+        except Exception:
+            # Neo4j unreachable: the snapshot still answers
+            return None
     
     def _get_related_papers_from_neo4j(self, paper_ids: List[str]) -> List[Dict[str, Any]]:
-        """Get papers related to the given paper IDs through Neo4j relationships"""
+        """Get papers related to the given paper IDs through Neo4j relationships (cached per paper-ID set)"""
         if not self.driver or not paper_ids:
             return []
-        
-        try:
-            with self.driver.session() as session:
-                cypher_query = """
-                MATCH (p:Paper)-[r]-(e)-[r2]-(p2:Paper)
-                WHERE p.paper_id IN $paper_ids
-                WITH DISTINCT p2, 
-                    collect(DISTINCT e.name) as shared_entities,
-                    collect(DISTINCT type(r)) as relationship_types
-                RETURN p2.paper_id as paper_id,
-                    p2.title as title,
-                    shared_entities,
-                    relationship_types,
-                    size(shared_entities) as shared_entity_count
-                ORDER BY shared_entity_count DESC
-                LIMIT 15
-                """
-                
-                result = session.run(cypher_query, paper_ids=paper_ids)
-                related_papers = []
-                for record in result:
-                    related_papers.append({
-                        "paper_id": record["paper_id"],
-                        "title": record["title"],
-                        "shared_entities": record["shared_entities"],
-                        "relationship_types": record["relationship_types"],
-                        "shared_entity_count": record["shared_entity_count"],
-                        "source": "neo4j_related"
-                    })
-                return related_papers
-        except Exception as e:
-            print(f"ERROR: Neo4j related papers search error: {e}")
+        if self.graph_snapshot_enabled:
+            snapshot = self._current_graph_snapshot(self._graph_version_or_none())
+            if snapshot is not None:
+                return snapshot.related_papers(paper_ids)
+        return self._cached_graph_query(self.related_graph_cache, "related papers", RELATED_PAPERS_QUERY,
+                                        paper_ids, self._related_query_params, self._related_paper_result)
+    
+    async def _asearch_neo4j_entities(self, query: str, entities: List[str]) -> List[Dict[str, Any]]:
+        """_search_neo4j_entities on the async Neo4j driver"""
+        if not self.async_driver or not fulltext_query(entities):
             return []
+        return await self._acached_graph_query(self.entity_graph_cache, "entity", ENTITY_PAPERS_QUERY,
+                                               entities, self._entity_query_params, self._entity_paper_result)
     
-    def search_chunks(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    async def _aget_related_papers_from_neo4j(self, paper_ids: List[str]) -> List[Dict[str, Any]]:
+        """_get_related_papers_from_neo4j on the async Neo4j driver"""
+        if not self.async_driver or not paper_ids:
+            return []
+        if self.graph_snapshot_enabled:
+            try:
+                version = await self.graph_version.acurrent(self.graph_db)
+            except Exception:
+                version = None
+            snapshot = self._current_graph_snapshot(version)
+            if snapshot is not None:
+                return snapshot.related_papers(paper_ids)
+        return await self._acached_graph_query(self.related_graph_cache, "related papers", RELATED_PAPERS_QUERY,
+                                               paper_ids, self._related_query_params, self._related_paper_result)
+    
+    def graph_cache_stats(self) -> Dict[str, Any]:
+        return {
+            "graph_version": self.graph_version.stats(),
+            "entities": self.entity_graph_cache.stats(),
+            "related_papers": self.related_graph_cache.stats(),
+            "snapshot": self._graph_snapshot.stats(),
+            "entity_linker": self._entity_linker.stats(),
+        }
+    
+    def search_chunks(self, query: str, top_k: int = 5, paper_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Search for relevant chunks using FAISS
         
         Args:
             query: Search query text
             top_k: Number of top results to return
+            paper_ids: Optional papers to restrict the search to (exact pre-filtering)
             
         Returns:
             List of chunk dictionaries with metadata
         """
-        if not self.index or not self.model or not self.chunks:
-            return []
+        return self._search_chunks_with_vector(self.snapshot, query, top_k, paper_ids)[0]
+    
+    def _search_chunks_with_vector(self, snap: IndexSnapshot, query: str, top_k: int,
+                                   paper_ids: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray]]:
+        """search_chunks on a given snapshot that also returns the normalized query embedding"""
+        if not snap.index or not self.model or not snap.chunks:
+            return [], None
         
         try:
-            # Encode query
-            query_embedding = self.model.encode([query], convert_to_numpy=True)
-            faiss.normalize_L2(query_embedding)
-            
-            # Search FAISS index
-            distances, indices = self.index.search(query_embedding, top_k)
-            
-            results = []
-            for idx, score in zip(indices[0], distances[0]):
-                if idx < len(self.chunks):
-                    chunk_info = self.chunks[idx]
-                    results.append({
-                        "score": float(score),
-                        "paper_id": chunk_info.get("paper_id", "unknown"),
-                        "chunk_id": chunk_info.get("chunk_id", idx),
-                        "text": chunk_info.get("text", ""),
-                        "page_num": chunk_info.get("page_num", 1)
-                    })
-            
-            return results
+            return self._vector_results(snap, self._retrieve(snap, query, top_k, paper_ids))
         except Exception as e:
             print(f"Error in search_chunks: {e}")
+            return [], None
+    
+    async def _asearch_chunks_with_vector(self, snap: IndexSnapshot, query: str, top_k: int,
+                                          paper_ids: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray]]:
+        """_search_chunks_with_vector for the event loop (see _aretrieve)"""
+        if not snap.index or not self.model or not snap.chunks:
+            return [], None
+        
+        try:
+            return self._vector_results(snap, await self._aretrieve(snap, query, top_k, paper_ids))
+        except Exception as e:
+            print(f"Error in search_chunks: {e}")
+            return [], None
+    
+    def _vector_results(self, snap: IndexSnapshot, hits: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """(chunk results, query vector) for the (query vector, scores, FAISS ids) of a retrieval"""
+        query_vector, distances, indices = hits
+        results = [
+            self._chunk_result(snap, idx, score)
+            for idx, score in zip(indices, distances)
+            if 0 <= idx < len(snap.chunks)
+        ]
+        return results, query_vector
+    
+    @staticmethod
+    def _chunk_result(snap: IndexSnapshot, idx: int, score: float) -> Dict[str, Any]:
+        """Result dictionary for the chunk at FAISS row idx of a snapshot"""
+        chunk_info = snap.chunks[idx]
+        return {
+            "score": float(score),
+            "paper_id": chunk_info.get("paper_id", "unknown"),
+            "chunk_id": chunk_info.get("chunk_id", int(idx)),
+            "text": chunk_info.get("text", ""),
+            "page_num": chunk_info.get("page_num", 1),
+            "index": int(idx)
+        }
+    
+    def _search_lexical(self, snap: IndexSnapshot, query: str, top_k: int,
+                        paper_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """BM25 search over the FTS5 chunk index of a snapshot (score = negated bm25)"""
+        try:
+            hits = snap.fts.search(query, top_k, paper_ids)
+            # FTS5 rowids are chunk labels, not chunk store rows
+            rows = snap.rows_for_labels([rowid for rowid, _ in hits])
+            return [
+                self._chunk_result(snap, row, score)
+                for row, (_, score) in zip(rows, hits)
+                if 0 <= row < len(snap.chunks)
+            ]
+        except Exception as e:
+            print(f"Error in lexical search: {e}")
             return []
     
-    def enhanced_search_chunks(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _fuse_rrf(dense_results: List[Dict[str, Any]], lexical_results: List[Dict[str, Any]],
+                  limit: int) -> List[Dict[str, Any]]:
+        """
+        Merge dense and lexical rankings with reciprocal rank fusion.
+        
+        The fused score is sum(1 / (RRF_K + rank)) scaled so that a chunk
+        ranked first by both legs scores 1.0.
+        """
+        fused = {}
+        for source, results in (("faiss", dense_results), ("fts", lexical_results)):
+            for rank, result in enumerate(results, start=1):
+                entry = fused.get(result["chunk_id"])
+                if entry is None:
+                    entry = dict(result, source=source, rrf=0.0)
+                    fused[result["chunk_id"]] = entry
+                elif entry["source"] != source:
+                    entry["source"] = "faiss+fts"
+                entry["rrf"] += 1.0 / (RRF_K + rank)
+                entry[f"{source}_score"] = result["score"]
+        
+        max_rrf = 2.0 / (RRF_K + 1)
+        merged = sorted(fused.values(), key=lambda entry: entry["rrf"], reverse=True)[:limit]
+        for entry in merged:
+            entry["score"] = entry.pop("rrf") / max_rrf
+        return merged
+    
+    def _retrieve(self, snap: IndexSnapshot, query: str, top_k: int,
+                  paper_ids: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (query vector, scores, FAISS ids) for one query, batched with concurrent callers"""
+        cache_key = self._retrieval_key(snap, query, top_k, paper_ids)
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        paper_filter = cache_key[3]
+        if paper_filter:
+            hits = self._embed_and_search_subset(snap, query, top_k, snap.paper_filter_ids(paper_filter))
+        elif self.batcher:
+            hits = self.batcher.submit((snap, query, top_k))
+        else:
+            hits = self._embed_and_search([(snap, query, top_k)])[0]
+        self.retrieval_cache.put(cache_key, hits)
+        return hits
+    
+    async def _aretrieve(self, snap: IndexSnapshot, query: str, top_k: int,
+                         paper_ids: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        _retrieve for the event loop. A batched query awaits its batcher
+        future instead of blocking a search thread, so concurrent async
+        requests can fill a batch beyond the size of the thread pool.
+        """
+        cache_key = self._retrieval_key(snap, query, top_k, paper_ids)
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if cache_key[3] or not self.batcher:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._retrieve, snap, query, top_k, paper_ids)
+        future = self.batcher.submit_future((snap, query, top_k))
+        hits = await asyncio.wait_for(asyncio.wrap_future(future), self.batcher.timeout_seconds)
+        self.retrieval_cache.put(cache_key, hits)
+        return hits
+    
+    @staticmethod
+    def _retrieval_key(snap: IndexSnapshot, query: str, top_k: int,
+                       paper_ids: Optional[List[str]] = None) -> Tuple[Any, ...]:
+        """Retrieval cache key: (snapshot generation, normalized query, top_k, sorted paper filter or None)"""
+        paper_filter = tuple(sorted(set(str(paper_id) for paper_id in paper_ids))) if paper_ids else None
+        return (snap.generation, normalize_query(query), top_k, paper_filter)
+    
+    def _embed_and_search_subset(self, snap: IndexSnapshot, query: str, top_k: int,
+                                 ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Encode one query and search only the given FAISS ids (exact)"""
+        query_embedding = self.model.encode([query], convert_to_numpy=True)
+        faiss.normalize_L2(query_embedding)
+        distances, indices = snap.search_subset(query_embedding, top_k, ids)
+        return query_embedding[0], distances[0], indices[0]
+    
+    def _embed_and_search(self, items: List[Tuple[IndexSnapshot, str, int]]) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Encode a batch of (snapshot, query, top_k) items and run one
+        multi-row FAISS search per snapshot (a batch spans two snapshots only
+        while an index reload is being swapped in)
+        """
+        queries = [query for _, query, _ in items]
+        query_embeddings = self.model.encode(queries, convert_to_numpy=True, batch_size=len(queries))
+        faiss.normalize_L2(query_embeddings)
+        
+        rows_by_snapshot = defaultdict(list)
+        for row, (snap, _, _) in enumerate(items):
+            rows_by_snapshot[id(snap)].append(row)
+        
+        results = [None] * len(items)
+        for rows in rows_by_snapshot.values():
+            snap = items[rows[0]][0]
+            embeddings = query_embeddings[rows]
+            k = max(items[row][2] for row in rows)
+            
+            distances, indices = snap.search(embeddings, k)
+            for position, row in enumerate(rows):
+                top_k = items[row][2]
+                results[row] = (query_embeddings[row], distances[position, :top_k], indices[position, :top_k])
+        return results
+    
+    def enhanced_search_chunks(self, query: str, top_k: int = 10, hybrid: Optional[bool] = None,
+                               paper_ids: Optional[List[str]] = None, rerank: Optional[bool] = None,
+                               rerank_budget_ms: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         Enhanced search that prioritizes relevance over diversity
         
         Args:
             query: Search query text
             top_k: Number of top results to return
+            hybrid: Fuse FTS5 BM25 with FAISS (default: RAG_HYBRID_SEARCH, when the FTS index is loaded)
+            paper_ids: Optional papers to restrict every retrieval leg to
+            rerank: Re-rank candidates with the cross-encoder (default: RAG_RERANK)
+            rerank_budget_ms: Latency budget of the re-ranking stage (default: RAG_RERANK_BUDGET_MS)
             
         Returns:
             List of chunk dictionaries with enhanced metadata
         """
+        return self._enhanced_search(query, top_k, hybrid, paper_ids, rerank, rerank_budget_ms)["chunks"]
+    
+    def _timed(self, timings: Dict[str, float], leg: str, fn, *args):
+        """Run fn(*args) and record its latency in milliseconds under timings[leg]"""
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[leg] = (time.perf_counter() - start) * 1000.0
+    
+    async def _atimed(self, timings: Dict[str, float], leg: str, coro):
+        """Await coro and record its latency in milliseconds under timings[leg]"""
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[leg] = (time.perf_counter() - start) * 1000.0
+    
+    def _enhanced_search(self, query: str, top_k: int, hybrid: Optional[bool] = None,
+                         paper_ids: Optional[List[str]] = None, rerank: Optional[bool] = None,
+                         rerank_budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """enhanced_search_chunks returning {"chunks", "query_vector", "timings_ms", "search_method"}"""
         print(f"Enhanced search for: '{query}'")
+        start = time.perf_counter()
+        timings = {}
+        if hybrid is None:
+            hybrid = self.hybrid_search
+        # Every step of this request uses the same index version
+        snap = self.snapshot
+        hybrid = hybrid and snap.fts is not None
         
-        # Step 1: Get FAISS semantic results (prioritize relevance)
-        faiss_results = self.search_chunks(query, top_k=top_k * 2)  # Get more results for better selection
-        print(f"FAISS found {len(faiss_results)} chunks")
+        # Step 1: Get FAISS semantic results (prioritize relevance), fused with
+        # BM25 results from the FTS5 index in hybrid mode
+        candidates = top_k * 2  # Get more results for better selection
+        if hybrid:
+            dense_future = self.executor.submit(self._timed, timings, "faiss_ms", self._search_chunks_with_vector, snap, query, candidates, paper_ids)
+            lexical_future = self.executor.submit(self._timed, timings, "fts_ms", self._search_lexical, snap, query, candidates, paper_ids)
+            dense_results, query_vector = dense_future.result()
+            lexical_results = lexical_future.result()
+            faiss_results = self._fuse_rrf(dense_results, lexical_results, candidates)
+            print(f"FAISS found {len(dense_results)} chunks, FTS5 found {len(lexical_results)}, fused to {len(faiss_results)}")
+        else:
+            faiss_results, query_vector = self._timed(timings, "faiss_ms", self._search_chunks_with_vector, snap, query, candidates, paper_ids)
+            print(f"FAISS found {len(faiss_results)} chunks")
         
         # Step 2: Extract entities and search Neo4j
         entities = self._extract_entities_from_query(query)
-        print(f"Extracted entities: {entities}")
         
-        neo4j_papers = self._search_neo4j_entities(query, entities)
+        neo4j_papers = self._timed(timings, "neo4j_entities_ms", self._search_neo4j_entities, query, entities)
         print(f"Neo4j found {len(neo4j_papers)} papers")
         
         # Step 3: Get related papers from Neo4j based on FAISS results
         faiss_paper_ids = [r["paper_id"] for r in faiss_results]
-        related_papers = self._get_related_papers_from_neo4j(faiss_paper_ids)
+        related_papers = self._timed(timings, "neo4j_related_ms", self._get_related_papers_from_neo4j, faiss_paper_ids)
         print(f"Neo4j found {len(related_papers)} related papers")
         
+        rerank = self.rerank if rerank is None else rerank
+        merged = self._merge_results(snap, faiss_results, neo4j_papers, related_papers, top_k, paper_ids,
+                                     limit=self.reranker.top_n if rerank else None, query_vector=query_vector)
+        final_results, rerank_info = self._rerank_results(query, merged, top_k, rerank, rerank_budget_ms, timings)
+        return self._search_response(final_results, query_vector, timings, start, hybrid, rerank_info)
+    
+    async def aenhanced_search(self, query: str, top_k: int = 10, hybrid: Optional[bool] = None,
+                               paper_ids: Optional[List[str]] = None, rerank: Optional[bool] = None,
+                               rerank_budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        _enhanced_search with the retrieval legs running concurrently.
+        
+        The Neo4j entity search starts right away on the async driver while
+        FAISS waits on the query batcher (FTS5 in hybrid mode runs on the
+        search thread pool). The related-paper expansion starts as soon as
+        the fused FAISS/FTS5 paper IDs are known, so the latency is roughly
+        that of the slowest chain instead of the sum of all legs.
+        """
+        print(f"Enhanced search for: '{query}'")
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        timings = {}
+        if hybrid is None:
+            hybrid = self.hybrid_search
+        # Every step of this request uses the same index version
+        snap = self.snapshot
+        hybrid = hybrid and snap.fts is not None
+        
+        entities = self._extract_entities_from_query(query)
+        entity_task = asyncio.ensure_future(
+            self._atimed(timings, "neo4j_entities_ms", self._asearch_neo4j_entities(query, entities))
+        )
+        
+        candidates = top_k * 2  # Get more results for better selection
+        dense_future = asyncio.ensure_future(
+            self._atimed(timings, "faiss_ms", self._asearch_chunks_with_vector(snap, query, candidates, paper_ids))
+        )
+        lexical_future = None
+        if hybrid:
+            lexical_future = loop.run_in_executor(self.executor, self._timed, timings, "fts_ms", self._search_lexical, snap, query, candidates, paper_ids)
+        
+        try:
+            dense_results, query_vector = await dense_future
+            if lexical_future is not None:
+                lexical_results = await lexical_future
+                faiss_results = self._fuse_rrf(dense_results, lexical_results, candidates)
+                print(f"FAISS found {len(dense_results)} chunks, FTS5 found {len(lexical_results)}, fused to {len(faiss_results)}")
+            else:
+                faiss_results = dense_results
+                print(f"FAISS found {len(faiss_results)} chunks")
+        except BaseException:
+            entity_task.cancel()
+            raise
+        
+        # Expand from the fused results, as _enhanced_search does
+        related_task = asyncio.ensure_future(
+            self._atimed(timings, "neo4j_related_ms", self._aget_related_papers_from_neo4j([r["paper_id"] for r in faiss_results]))
+        )
+        try:
+            neo4j_papers, related_papers = await asyncio.gather(entity_task, related_task)
+        except BaseException:
+            entity_task.cancel()
+            related_task.cancel()
+            raise
+        print(f"Neo4j found {len(neo4j_papers)} papers and {len(related_papers)} related papers")
+        
+        rerank = self.rerank if rerank is None else rerank
+        merged = self._merge_results(snap, faiss_results, neo4j_papers, related_papers, top_k, paper_ids,
+                                     limit=self.reranker.top_n if rerank else None, query_vector=query_vector)
+        final_results, rerank_info = await loop.run_in_executor(
+            self.executor, self._rerank_results, query, merged, top_k, rerank, rerank_budget_ms, timings
+        )
+        return self._search_response(final_results, query_vector, timings, start, hybrid, rerank_info)
+    
+    def _merge_results(self, snap: IndexSnapshot, faiss_results: List[Dict[str, Any]], neo4j_papers: List[Dict[str, Any]],
+                       related_papers: List[Dict[str, Any]], top_k: int,
+                       paper_ids: Optional[List[str]] = None, limit: Optional[int] = None,
+                       query_vector: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Combine FAISS results with chunks from Neo4j papers.
+        
+        Keeps the top_k by score, or with a limit (used for re-ranking) up to
+        limit candidates so graph-sourced chunks can be scored on merit. With
+        MMR enabled the candidates are picked by maximal marginal relevance.
+        """
+        faiss_paper_ids = [r["paper_id"] for r in faiss_results]
+        
+        # Papers found through the graph, in the order Neo4j ranked them,
+        # respecting the paper filter
+        graph_paper_ids = list(dict.fromkeys(paper["paper_id"] for paper in neo4j_papers + related_papers))
+        if paper_ids:
+            allowed = set(str(paper_id) for paper_id in paper_ids)
+            graph_paper_ids = [paper_id for paper_id in graph_paper_ids if paper_id in allowed]
+        
+        if self.mmr and query_vector is not None:
+            selected = self._select_mmr(snap, faiss_results, graph_paper_ids, query_vector, limit or top_k)
+            if selected is not None:
+                return selected
+        
         # Step 4: Prioritize FAISS results (most relevant) and add Neo4j diversity
         enhanced_results = []
         
@@ -262,22 +978,21 @@ class RAGService:
                 "chunk_id": result["chunk_id"],
                 "text": result["text"],
                 "page_num": result["page_num"],
-                "source": "faiss",
+                "source": result.get("source", "faiss"),
                 "neo4j_boost": 0,
                 "paper_rank": 1
             })
         
         # Then add some diversity from Neo4j if we have space
-        neo4j_paper_ids = set(paper["paper_id"] for paper in neo4j_papers + related_papers)
         faiss_paper_ids_set = set(faiss_paper_ids)
         
         # Add chunks from Neo4j papers that aren't already in FAISS results
-        for paper_id in neo4j_paper_ids:
-            if paper_id not in faiss_paper_ids_set and paper_id in self.paper_chunks_map:
-                chunks = self.paper_chunks_map[paper_id]
+        for paper_id in graph_paper_ids:
+            if paper_id not in faiss_paper_ids_set and snap.chunks.has_paper(paper_id):
                 # Take top 1-2 chunks from each Neo4j paper for diversity
-                for i, chunk in enumerate(chunks[:2]):
-                    if len(enhanced_results) < top_k * 1.5:  # Don't add too many
+                for i, row in enumerate(snap.chunks.paper_rows(paper_id)[:2]):
+                    chunk = snap.chunks[row]
+                    if len(enhanced_results) < max(top_k * 1.5, limit or 0):  # Don't add too many
                         enhanced_results.append({
                             "score": 0.5,  # Lower score for Neo4j diversity
                             "paper_id": paper_id,
@@ -291,23 +1006,102 @@ class RAGService:
         
         # Sort by score and limit results
         enhanced_results.sort(key=lambda x: x["score"], reverse=True)
-        final_results = enhanced_results[:top_k]
-        
-        print(f"SUCCESS: Enhanced search returning {len(final_results)} chunks from {len(set(r['paper_id'] for r in final_results))} papers")
-        return final_results
+        return enhanced_results[:limit or top_k]
     
-    def generate_answer(self, query: str, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @staticmethod
+    def _candidate_vectors(snap: IndexSnapshot, rows: np.ndarray) -> Optional[np.ndarray]:
+        """Stored vectors for chunk rows (vectors.npy, or reconstructed from the index)"""
+        try:
+            return snap.vectors_for_rows(rows)
+        except Exception as e:
+            print(f"WARNING: Cannot reconstruct vectors from the FAISS index: {e}")
+            return None
+    
+    def _select_mmr(self, snap: IndexSnapshot, faiss_results: List[Dict[str, Any]], graph_paper_ids: List[str],
+                    query_vector: np.ndarray, k: int) -> Optional[List[Dict[str, Any]]]:
         """
-        Generate answer using Gemini based on retrieved chunks
+        Pick k chunks by maximal marginal relevance from the FAISS results plus
+        the chunks of graph-found papers closest to the query.
         
-        Args:
-            query: User query
-            chunks: Retrieved chunks from FAISS search
-            
-        Returns:
-            Dictionary with answer and citations
+        Returns None when candidate vectors are not available.
         """
-        # Format chunks for Gemini
+        rows = [result["index"] for result in faiss_results if "index" in result]
+        if len(rows) != len(faiss_results):
+            return None
+        
+        # Best chunks of the graph papers by exact similarity to the query
+        graph_rows = np.setdiff1d(snap.paper_filter_ids(graph_paper_ids), np.asarray(rows, dtype=np.int64))
+        room = MMR_POOL - len(rows)
+        graph_scores = {}
+        if len(graph_rows) and room > 0:
+            distances, indices = snap.search_subset(query_vector.reshape(1, -1), room, graph_rows)
+            graph_scores = {int(idx): float(score) for idx, score in zip(indices[0], distances[0]) if 0 <= idx < len(snap.chunks)}
+        
+        candidate_rows = np.asarray(rows + list(graph_scores), dtype=np.int64)
+        vectors = self._candidate_vectors(snap, candidate_rows)
+        if vectors is None:
+            return None
+        
+        candidates = []
+        for result in faiss_results:
+            candidates.append({
+                "score": result["score"],
+                "paper_id": result["paper_id"],
+                "chunk_id": result["chunk_id"],
+                "text": result["text"],
+                "page_num": result["page_num"],
+                "source": result.get("source", "faiss"),
+                "neo4j_boost": 0
+            })
+        for idx, score in graph_scores.items():
+            candidate = self._chunk_result(snap, idx, score)
+            del candidate["index"]
+            candidates.append(dict(candidate, source="neo4j_diversity", neo4j_boost=1))
+        
+        selected = mmr_select(
+            query_vector, vectors, k,
+            lambda_mult=self.mmr_lambda,
+            groups=[candidate["paper_id"] for candidate in candidates],
+            max_per_group=self.mmr_max_per_paper
+        )
+        
+        results = []
+        paper_counts = defaultdict(int)
+        for position in selected:
+            candidate = candidates[position]
+            paper_counts[candidate["paper_id"]] += 1
+            results.append(dict(candidate, paper_rank=paper_counts[candidate["paper_id"]]))
+        return results
+    
+    def _rerank_results(self, query: str, candidates: List[Dict[str, Any]], top_k: int, rerank: bool,
+                        budget_ms: Optional[float], timings: Dict[str, float]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Re-rank merged candidates with the cross-encoder (when enabled) and keep the top_k"""
+        if not rerank or not candidates:
+            return candidates[:top_k], None
+        if budget_ms is None:
+            budget_ms = self.rerank_budget_ms
+        reranked, info = self._timed(timings, "rerank_ms", self.reranker.rerank, query, candidates, budget_ms)
+        print(f"Re-ranked {info['scored']}/{info['candidates']} candidates ({info['cached']} cached)"
+              + (", latency budget reached" if info["budget_exhausted"] else ""))
+        return reranked[:top_k], info
+    
+    def _search_response(self, final_results: List[Dict[str, Any]], query_vector: Optional[np.ndarray],
+                         timings: Dict[str, float], start: float, hybrid: bool,
+                         rerank_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        timings["total_ms"] = (time.perf_counter() - start) * 1000.0
+        print(f"SUCCESS: Enhanced search returning {len(final_results)} chunks from {len(set(r['paper_id'] for r in final_results))} papers")
+        print(f"Retrieval latency (ms): {', '.join(f'{leg}={ms:.1f}' for leg, ms in timings.items())}")
+        return {
+            "chunks": final_results,
+            "query_vector": query_vector,
+            "timings_ms": timings,
+            "search_method": "hybrid_faiss_fts_neo4j" if hybrid else "enhanced_faiss_neo4j",
+            "rerank": rerank_info
+        }
+    
+    @staticmethod
+    def _format_chunks(chunks: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Gemini snippets and citations for the retrieved chunks"""
         snippets = []
         citations = []
         
@@ -319,6 +1113,21 @@ class RAGService:
                 "page_num": chunk['page_num'],
                 "score": chunk['score']
             })
+        return snippets, citations
+    
+    def generate_answer(self, query: str, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Generate answer using Gemini based on retrieved chunks
+        
+        Args:
+            query: User query
+            chunks: Retrieved chunks from FAISS search
+            
+        Returns:
+            Dictionary with answer and citations
+        """
+        # Format chunks for Gemini
+        snippets, citations = self._format_chunks(chunks)
         
         # Generate answer using Gemini
         try:
@@ -326,7 +1135,12 @@ class RAGService:
             answer = gemini_response.get("answer", "Unable to generate answer")
         except Exception as e:
             print(f"Error generating answer with Gemini: {e}")
-            answer = "Error generating answer. Please try again."
+            return {
+                "answer": "Error generating answer. Please try again.",
+                "citations": citations,
+                "chunks_used": len(chunks),
+                "error": str(e)
+            }
         
         return {
             "answer": answer,
@@ -334,18 +1148,47 @@ class RAGService:
             "chunks_used": len(chunks)
         }
     
-    def process_query(self, query: str, top_k: int = 5) -> Dict[str, Any]:
+    def process_query(self, query: str, top_k: int = 5, use_cache: bool = True,
+                      hybrid: Optional[bool] = None, paper_ids: Optional[List[str]] = None,
+                      rerank: Optional[bool] = None, rerank_budget_ms: Optional[float] = None) -> Dict[str, Any]:
         """
         Complete RAG pipeline: enhanced search + generate answer
         
         Args:
             query: User query
             top_k: Number of chunks to retrieve
+            use_cache: Serve and store the answer through the semantic answer cache
+            hybrid: Fuse FTS5 BM25 with FAISS retrieval (default: RAG_HYBRID_SEARCH)
+            paper_ids: Optional papers to restrict retrieval to
+            rerank: Re-rank candidates with the cross-encoder (default: RAG_RERANK)
+            rerank_budget_ms: Latency budget of the re-ranking stage (default: RAG_RERANK_BUDGET_MS)
             
         Returns:
             Complete response with answer, citations, and metadata
         """
-        # Check if RAG components are available
+        missing = self._missing_components_response(query)
+        if missing:
+            return missing
+        
+        # Step 1: Use enhanced search that combines FAISS + Neo4j
+        search = self._enhanced_search(query, top_k, hybrid, paper_ids, rerank, rerank_budget_ms)
+        return self._build_response(query, search, use_cache)
+    
+    async def aprocess_query(self, query: str, top_k: int = 5, use_cache: bool = True,
+                             hybrid: Optional[bool] = None, paper_ids: Optional[List[str]] = None,
+                             rerank: Optional[bool] = None, rerank_budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """process_query on the event loop, using the concurrent aenhanced_search"""
+        missing = self._missing_components_response(query)
+        if missing:
+            return missing
+        
+        search = await self.aenhanced_search(query, top_k, hybrid, paper_ids, rerank, rerank_budget_ms)
+        # Answer generation blocks on Gemini, so it runs off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._build_response, query, search, use_cache)
+    
+    def _missing_components_response(self, query: str) -> Optional[Dict[str, Any]]:
+        """Error response when the FAISS index, model or metadata failed to load"""
         if not self.index or not self.model or not self.chunks:
             return {
                 "query": query,
@@ -355,8 +1198,12 @@ class RAGService:
                 "error": "Missing RAG components"
             }
         
-        # Step 1: Use enhanced search that combines FAISS + Neo4j
-        chunks = self.enhanced_search_chunks(query, top_k)
+        return None
+    
+    def _build_response(self, query: str, search: Dict[str, Any], use_cache: bool) -> Dict[str, Any]:
+        """Generate (or fetch the cached) answer for a finished search"""
+        chunks = search["chunks"]
+        query_vector = search["query_vector"]
         
         if not chunks:
             return {
@@ -366,32 +1213,133 @@ class RAGService:
                 "chunks_used": 0
             }
         
-        # Step 2: Generate answer using Gemini
-        answer_data = self.generate_answer(query, chunks)
+        # Step 2: Generate answer using Gemini, unless a near-identical query
+        # already produced an answer from the same chunk set
+        chunk_keys = [chunk_fingerprint(chunk) for chunk in chunks]
+        answer_data = None
+        use_cache = use_cache and query_vector is not None
+        if use_cache:
+            answer_data = self.answer_cache.get(chunk_keys, query_vector)
+        answer_cached = answer_data is not None
+        if not answer_cached:
+            answer_data = self.generate_answer(query, chunks)
+            if use_cache and "error" not in answer_data:
+                self.answer_cache.put(chunk_keys, query_vector, answer_data)
         
         # Step 3: Add diversity information to response
-        unique_papers = len(set(chunk["paper_id"] for chunk in chunks))
-        neo4j_boost_count = sum(1 for chunk in chunks if chunk.get("neo4j_boost", 0) > 0)
-        
         return {
             "query": query,
             "answer": answer_data["answer"],
             "citations": answer_data["citations"],
             "chunks_used": answer_data["chunks_used"],
+            "answer_cached": answer_cached,
             "retrieved_chunks": chunks,
-            "diversity_metrics": {
-                "unique_papers": unique_papers,
-                "neo4j_boosted_chunks": neo4j_boost_count,
-                "search_method": "enhanced_faiss_neo4j"
-            }
+            "diversity_metrics": self._diversity_metrics(search),
+            "rerank": search["rerank"],
+            "timings_ms": search["timings_ms"]
+        }
+    
+    @staticmethod
+    def _diversity_metrics(search: Dict[str, Any]) -> Dict[str, Any]:
+        chunks = search["chunks"]
+        return {
+            "unique_papers": len(set(chunk["paper_id"] for chunk in chunks)),
+            "neo4j_boosted_chunks": sum(1 for chunk in chunks if chunk.get("neo4j_boost", 0) > 0),
+            "search_method": search["search_method"]
+        }
+    
+    async def astream_query(self, query: str, top_k: int = 5, use_cache: bool = True,
+                            hybrid: Optional[bool] = None, paper_ids: Optional[List[str]] = None,
+                            rerank: Optional[bool] = None, rerank_budget_ms: Optional[float] = None):
+        """
+        Streaming variant of aprocess_query.
+        
+        Yields (event, data) pairs: "retrieval" with the chunks and citations as
+        soon as retrieval finishes, "token" for each piece of the answer as
+        Gemini produces it, "metrics" with the diversity metrics and timings,
+        then "done". Failures are reported as an "error" event.
+        """
+        start = time.perf_counter()
+        missing = self._missing_components_response(query)
+        if missing:
+            yield "error", {"query": query, "answer": missing["answer"], "error": missing["error"]}
+            yield "done", {}
+            return
+        
+        search = await self.aenhanced_search(query, top_k, hybrid, paper_ids, rerank, rerank_budget_ms)
+        chunks = search["chunks"]
+        query_vector = search["query_vector"]
+        snippets, citations = self._format_chunks(chunks)
+        yield "retrieval", {
+            "query": query,
+            "retrieved_chunks": chunks,
+            "citations": citations,
+            "chunks_used": len(chunks),
+            "search_method": search["search_method"],
+            "rerank": search["rerank"]
+        }
+        
+        timings = dict(search["timings_ms"])
+        answer_cached = False
+        if not chunks:
+            yield "token", {"text": "No relevant information found for your query."}
+        else:
+            chunk_keys = [chunk_fingerprint(chunk) for chunk in chunks]
+            use_cache = use_cache and query_vector is not None
+            answer_data = self.answer_cache.get(chunk_keys, query_vector) if use_cache else None
+            if answer_data is not None:
+                answer_cached = True
+                yield "token", {"text": answer_data["answer"]}
+            else:
+                # Gemini's stream is a blocking iterator, so each step runs off the event loop
+                loop = asyncio.get_running_loop()
+                answer_start = time.perf_counter()
+                pieces = []
+                try:
+                    stream = await loop.run_in_executor(None, qa_stream, query, snippets)
+                    while True:
+                        piece = await loop.run_in_executor(None, next, stream, None)
+                        if piece is None:
+                            break
+                        if not pieces:
+                            timings["first_token_ms"] = (time.perf_counter() - start) * 1000.0
+                        pieces.append(piece)
+                        yield "token", {"text": piece}
+                except Exception as e:
+                    print(f"Error streaming answer from Gemini: {e}")
+                    yield "error", {"answer": "Error generating answer. Please try again.", "error": str(e)}
+                    yield "done", {}
+                    return
+                timings["answer_ms"] = (time.perf_counter() - answer_start) * 1000.0
+                
+                # An empty stream is a failed generation, not an answer to reuse
+                answer = "".join(pieces).strip()
+                if use_cache and answer:
+                    self.answer_cache.put(chunk_keys, query_vector, {
+                        "answer": answer,
+                        "citations": citations,
+                        "chunks_used": len(chunks)
+                    })
+        
+        timings["total_ms"] = (time.perf_counter() - start) * 1000.0
+        yield "metrics", {
+            "answer_cached": answer_cached,
+            "diversity_metrics": self._diversity_metrics(search),
+            "timings_ms": timings
         }
+        yield "done", {}
 
 # Global RAG service instance
 rag_service = None
+_rag_service_lock = threading.Lock()
 
 def get_rag_service() -> RAGService:
     """Get or create RAG service instance"""
     global rag_service
     if rag_service is None:
-        rag_service = RAGService()
+        # The startup warmup and early requests may race to create it
+        with _rag_service_lock:
+            if rag_service is None:
+                rag_service = RAGService()
+                rag_service.start_index_watcher()
     return rag_service
@@ -0,0 +1,136 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .caches import LRUCache, chunk_fingerprint, normalize_query
+except ImportError:
+    from caches import LRUCache, chunk_fingerprint, normalize_query
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores retrieved chunks with a local cross-encoder.
+
+    Scores are cached per (normalized query, chunk_fingerprint), and candidates are
+    scored in batches until a per-request latency budget runs out. Chunks
+    that were not scored in time keep their retrieval order behind the
+    re-ranked ones.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size: int = 16,
+                 top_n: int = 30, cache_size: int = 8192, cache_ttl_seconds: Optional[float] = 3600.0):
+        """
+        Args:
+            model_name: sentence-transformers CrossEncoder model
+            batch_size: Query/chunk pairs scored per model call
+            top_n: Number of leading candidates considered for re-ranking
+            cache_size: Maximum number of cached (query, chunk) scores
+            cache_ttl_seconds: Lifetime of a cached score
+        """
+        self.model_name = model_name
+        self.batch_size = max(1, int(batch_size))
+        self.top_n = max(1, int(top_n))
+        self.score_cache = LRUCache(max_size=cache_size, ttl_seconds=cache_ttl_seconds)
+        self._model = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The CrossEncoder, loaded on first use"""
+        if self._model is None and not self._load_failed:
+            with self._lock:
+                if self._model is None and not self._load_failed:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                        self._model = CrossEncoder(self.model_name)
+                        print(f"SUCCESS: Cross-encoder loaded: {self.model_name}")
+                    except Exception as e:
+                        print(f"ERROR: Failed to load cross-encoder: {e}")
+                        self._load_failed = True
+        return self._model
+
+    def warmup(self) -> bool:
+        """
+        Load the model and score one pair, so that neither the load nor the
+        first predict call eats into a request's latency budget. Returns
+        whether the model is usable.
+        """
+        model = self.model
+        if model is None:
+            return False
+        model.predict([("warmup query", "warmup passage")], batch_size=1, show_progress_bar=False)
+        return True
+
+    def rerank(self, query: str, chunks: List[Dict[str, Any]],
+               budget_ms: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Re-rank the top_n leading chunks by cross-encoder score.
+
+        Args:
+            query: User query
+            chunks: Candidates in retrieval order
+            budget_ms: Stop scoring new batches once this much time is spent
+                (None scores every candidate)
+
+        Returns:
+            (chunks, info): re-ranked chunks carrying a "rerank_score", followed
+            by unscored candidates in their original order, and a summary of
+            what was scored
+        """
+        start = time.perf_counter()
+        candidates = chunks[:self.top_n]
+        query_key = normalize_query(query)
+
+        scores = {}
+        pending = []
+        for position, chunk in enumerate(candidates):
+            cached = self.score_cache.get((query_key, chunk_fingerprint(chunk)))
+            if cached is not None:
+                scores[position] = cached
+            else:
+                pending.append(position)
+        cached_count = len(scores)
+
+        budget_exhausted = False
+        model = self.model if pending else None
+        last_batch_ms = 0.0
+        for offset in range(0, len(pending) if model is not None else 0, self.batch_size):
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            # Skip the next batch if it would likely overrun the budget
+            if budget_ms is not None and elapsed_ms + last_batch_ms > budget_ms:
+                budget_exhausted = True
+                break
+            batch_start = time.perf_counter()
+            batch = pending[offset:offset + self.batch_size]
+            batch_scores = model.predict([(query, candidates[position]["text"]) for position in batch],
+                                         batch_size=self.batch_size, show_progress_bar=False)
+            for position, score in zip(batch, batch_scores):
+                scores[position] = float(score)
+                self.score_cache.put((query_key, chunk_fingerprint(candidates[position])), float(score))
+            last_batch_ms = (time.perf_counter() - batch_start) * 1000.0
+
+        reranked = [dict(candidates[position], rerank_score=score) for position, score in scores.items()]
+        reranked.sort(key=lambda x: x["rerank_score"], reverse=True)
+        unscored = [chunk for position, chunk in enumerate(candidates) if position not in scores]
+
+        info = {
+            "model": self.model_name,
+            "candidates": len(candidates),
+            "scored": len(scores),
+            "cached": cached_count,
+            "budget_ms": budget_ms,
+            "budget_exhausted": budget_exhausted,
+            "elapsed_ms": (time.perf_counter() - start) * 1000.0,
+        }
+        return reranked + unscored + chunks[self.top_n:], info
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "batch_size": self.batch_size,
+            "top_n": self.top_n,
+            "score_cache": self.score_cache.stats(),
+        }
@@ -1,5 +1,6 @@
 # backend/app/setup_constraints.py
 from neo4j_client import get_driver
+from fulltext import create_fulltext_statements
 
 CONSTRAINTS = [
     ("Organism", "name"),
@@ -10,6 +11,9 @@ CONSTRAINTS = [
     ("Gene", "name"),
     ("Paper", "paper_id"),
     ("Document", "id"),
+    # Keys of the nodes load_to_neo4j.py merges
+    ("Experiment", "name"),
+    ("Outcome", "description"),
 ]
 
 CREATE_TEMPLATE = "CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
@@ -21,7 +25,11 @@ def run():
             cypher = CREATE_TEMPLATE.format(label=label, prop=prop)
             session.run(cypher)
             print("Ensured constraint:", cypher)
+        # Full-text indexes used by /search, /graph?query= and the RAG entity lookup
+        for cypher in create_fulltext_statements():
+            session.run(cypher)
+            print("Ensured full-text index:", cypher)
 
 if __name__ == "__main__":
     run()
-    print("Constraints created.")
+    print("Constraints and full-text indexes created.")
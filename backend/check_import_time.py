@@ -0,0 +1,84 @@
+"""
+Measure how long `import app.main` takes and which heavy modules it pulls in.
+
+Startup should stay cheap: faiss, the embedding model (torch,
+sentence-transformers, onnxruntime) and the Gemini SDK are loaded by the
+background warmup, not at import. Exits with status 1 on a regression.
+
+    python check_import_time.py [--budget-ms 1500] [--runs 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that must not be imported by app.main itself
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "faiss", "onnxruntime",
+                 "google.generativeai", "app.rag_service")
+
+
+def import_profile(module: str):
+    """Run `python -X importtime -c "import <module>"` and parse its report"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit(f"❌ import {module} failed")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2]
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, self_us, cumulative_us))
+    return entries
+
+
+def wall_time_ms(module: str, runs: int) -> float:
+    """Best-of-runs wall time of a fresh interpreter importing module"""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=backend_dir,
+                       capture_output=True, check=True)
+        best = min(best, (time.perf_counter() - start) * 1000.0)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time of the API module")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Maximum cumulative import time")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters timed for the wall time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest direct imports shown")
+    args = parser.parse_args()
+
+    entries = import_profile(args.module)
+    top_level = [entry for entry in entries if entry[1] == 0]
+    total_ms = sum(cumulative for _, _, _, cumulative in top_level) / 1000.0
+    imported = set(name for name, _, _, _ in entries)
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+
+    print(f"📊 import {args.module}: {total_ms:.1f} ms cumulative, {wall_time_ms(args.module, args.runs):.1f} ms wall (interpreter included)")
+    print(f"Slowest imports made by {args.module}:")
+    direct = [entry for entry in entries if entry[1] == 1]
+    for name, _, _, cumulative in sorted(direct, key=lambda entry: entry[3], reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000.0:8.1f} ms  {name}")
+
+    failed = False
+    if heavy:
+        print(f"❌ Heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"❌ Import time {total_ms:.1f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+    print("✅ Import time within budget")
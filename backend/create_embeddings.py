@@ -1,40 +1,93 @@
+import hashlib
 import json
+import shutil
+import time
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from pathlib import Path
 from tqdm import tqdm
 
+from app.faiss_utils import write_index, apply_search_params, save_vectors, rerank_exact
+from app.embedding_backends import load_embedding_model, EMBEDDING_BACKEND
+from app.chunk_store import ChunkStore, write_chunk_store, chunk_labels, assign_chunk_ids
+from app.index_snapshot import (IndexSnapshot, LEGACY_VERSION, new_version_name, version_dir,
+                                publish_version, resolve_index_dir)
+from ingestion.create_fts import build_fts_db, update_fts_db
+
+# Chunk files that went into an index version, with their content hashes,
+# so incremental runs can tell which files are new, changed or removed
+MANIFEST_FILE = "file_manifest.json"
+
 class BatchEmbeddingCreator:
     """
     Creates embeddings for multiple PDF chunks and builds a unified FAISS index
     """
     
-    def __init__(self, chunks_directory, output_directory, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, chunks_directory, output_directory, model_name="sentence-transformers/all-MiniLM-L6-v2",
+                 embedding_backend=None):
         """
         Args:
             chunks_directory: Directory containing JSONL chunk files
-            output_directory: Directory to save FAISS index and metadata
+            output_directory: Base directory of the versioned FAISS indexes; each
+                run writes a new versions/<version> directory and publishes it
+                through the CURRENT file when complete
             model_name: HuggingFace model name for embeddings
+            embedding_backend: "torch", "onnx" or "onnx-int8" (default: RAG_EMBEDDING_BACKEND)
         """
         self.chunks_dir = Path(chunks_directory)
         self.output_dir = Path(output_directory)
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.version = new_version_name()
+        self.index_dir = version_dir(self.output_dir, self.version)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Set by build_faiss_index and written to index_stats.json so that
+        # RAGService applies the same search parameters when it loads the index
+        self.index_type = "flat"
+        self.search_params = {}
+        self.rerank_factor = None
+        self.index_options = {}
+        self.manifest = {}
         
         print(f"🤖 Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.embedding_backend = embedding_backend or EMBEDDING_BACKEND
+        self.model = load_embedding_model(model_name, self.embedding_backend)
         print(f"✅ Model loaded (dimension: {self.model.get_sentence_embedding_dimension()})")
     
-    def load_all_chunks(self, max_files=100):
-        """Load chunks from all JSONL files in the directory"""
+    def list_chunk_files(self, max_files=None):
+        """Chunk files in the directory, in a stable order"""
         chunk_files = sorted(list(self.chunks_dir.glob("*_chunks.jsonl")))[:max_files]
-        
         if not chunk_files:
             raise FileNotFoundError(f"No chunk files found in {self.chunks_dir}")
+        return chunk_files
+    
+    @staticmethod
+    def load_chunk_file(chunk_file):
+        """
+        Load the chunks of one JSONL file. Chunks without a chunk_id get
+        "<paper_id>_<n>" (chunk_store.assign_chunk_ids), which stays stable
+        as long as the file does.
+        """
+        with open(chunk_file, "r", encoding="utf-8") as f:
+            return list(assign_chunk_ids(json.loads(line) for line in f if line.strip()))
+    
+    @staticmethod
+    def file_digest(chunk_file):
+        """Content hash of a chunk file"""
+        digest = hashlib.sha1()
+        with open(chunk_file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def load_all_chunks(self, max_files=100):
+        """Load chunks from all JSONL files in the directory"""
+        chunk_files = self.list_chunk_files(max_files)
         
         print(f"\n📂 Found {len(chunk_files)} chunk files")
         
         all_chunks = []
+        self.manifest = {}
         stats = {
             'total_files': len(chunk_files),
             'total_chunks': 0,
@@ -43,10 +96,10 @@ class BatchEmbeddingCreator:
         
         for chunk_file in tqdm(chunk_files, desc="Loading chunks"):
             try:
-                with open(chunk_file, "r", encoding="utf-8") as f:
-                    file_chunks = [json.loads(line) for line in f]
-                    all_chunks.extend(file_chunks)
-                    stats['total_chunks'] += len(file_chunks)
+                file_chunks = self.load_chunk_file(chunk_file)
+                all_chunks.extend(file_chunks)
+                stats['total_chunks'] += len(file_chunks)
+                self.manifest[chunk_file.name] = self._manifest_entry(chunk_file, file_chunks)
             except Exception as e:
                 print(f"⚠️  Error loading {chunk_file.name}: {str(e)}")
                 stats['failed_files'] += 1
@@ -76,46 +129,255 @@ class BatchEmbeddingCreator:
         
         return embeddings
     
-    def build_faiss_index(self, embeddings):
-        """Build FAISS index with cosine similarity"""
-        print(f"\n🔨 Building FAISS index...")
+    # Index types that store compressed codes and are re-ranked against the
+    # full-precision vectors.npy side file at query time
+    COMPRESSED_INDEX_TYPES = ("ivfpq", "sq8")
+    
+    # Index types that store FAISS ids natively. The others are wrapped in an
+    # IndexIDMap2, whose removal assumes the wrapped index compacts its rows
+    # (true for flat and scalar-quantized storage, not for inverted lists)
+    IVF_INDEX_TYPES = ("ivf", "ivfpq")
+    
+    def build_faiss_index(self, embeddings, index_type="flat", ids=None, nlist=None, nprobe=16,
+                          hnsw_m=32, ef_construction=200, ef_search=64,
+                          pq_m=48, pq_nbits=8, rerank_factor=4):
+        """
+        Build FAISS index with cosine similarity
         
-        dimension = embeddings.shape[1]
+        Vectors are stored under stable chunk labels (see
+        app.chunk_store.chunk_labels), natively by IVF indexes and through an
+        IndexIDMap2 otherwise, so later incremental runs can add, replace and
+        remove them by id.
         
-        # Create index (Inner Product for cosine similarity)
-        index = faiss.IndexFlatIP(dimension)
+        Args:
+            embeddings: Float32 embedding matrix (normalized in place)
+            ids: FAISS id of each embedding (default: its row)
+            index_type: "flat" (exact), "ivf" (IVF-Flat), "hnsw",
+                "ivfpq" (IVF + product quantization) or "sq8" (8-bit scalar quantization)
+            nlist: Number of IVF cells (default: 4 * sqrt(n))
+            nprobe: IVF cells visited per query
+            hnsw_m: Neighbours per HNSW node
+            ef_construction: HNSW candidate list size while building
+            ef_search: HNSW candidate list size while searching
+            pq_m: PQ sub-quantizers (must divide the dimension)
+            pq_nbits: Bits per PQ sub-quantizer code
+            rerank_factor: Candidates over-fetched per result for exact re-ranking
+        """
+        print(f"\n🔨 Building FAISS index ({index_type})...")
+        
+        n, dimension = embeddings.shape
         
         # Normalize embeddings for cosine similarity
         faiss.normalize_L2(embeddings)
         
-        # Add to index
-        index.add(embeddings)
+        if index_type == "flat":
+            # Create index (Inner Product for cosine similarity)
+            index = faiss.IndexFlatIP(dimension)
+            search_params = {}
+        elif index_type == "ivf":
+            nlist = nlist or max(1, int(4 * np.sqrt(n)))
+            quantizer = faiss.IndexFlatIP(dimension)
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(self._training_sample(embeddings, nlist))
+            search_params = {"nprobe": min(nprobe, nlist)}
+        elif index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = ef_construction
+            search_params = {"efSearch": ef_search}
+        elif index_type == "ivfpq":
+            nlist = nlist or max(1, int(4 * np.sqrt(n)))
+            quantizer = faiss.IndexFlatIP(dimension)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+            index.train(self._training_sample(embeddings, max(nlist, 2 ** pq_nbits)))
+            search_params = {"nprobe": min(nprobe, nlist)}
+        elif index_type == "sq8":
+            index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+            search_params = {}
+        else:
+            raise ValueError(f"Unknown index type: {index_type}")
+        
+        # Add to index under the chunk labels
+        if index_type not in self.IVF_INDEX_TYPES:
+            index = faiss.IndexIDMap2(index)
+        if ids is None:
+            ids = np.arange(n, dtype=np.int64)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+        apply_search_params(index, search_params)
+        
+        self.index_type = index_type
+        self.search_params = search_params
+        self.rerank_factor = rerank_factor if index_type in self.COMPRESSED_INDEX_TYPES else None
+        self.index_options = {"nlist": nlist, "nprobe": nprobe, "hnsw_m": hnsw_m, "ef_construction": ef_construction,
+                              "ef_search": ef_search, "pq_m": pq_m, "pq_nbits": pq_nbits, "rerank_factor": rerank_factor}
         
-        print(f"✅ FAISS index built with {index.ntotal} vectors")
+        print(f"✅ FAISS index built with {index.ntotal} vectors (search params: {search_params or 'exact'})")
         
         return index
     
-    def save_index_and_metadata(self, index, chunks):
-        """Save FAISS index and chunk metadata"""
-        # Save FAISS index
-        index_path = self.output_dir / "faiss_index.idx"
-        faiss.write_index(index, str(index_path))
+    @staticmethod
+    def _training_sample(embeddings, nlist, points_per_centroid=256):
+        """Random subset large enough to train nlist centroids"""
+        n_train = min(len(embeddings), nlist * points_per_centroid)
+        if n_train == len(embeddings):
+            return embeddings
+        rows = np.random.default_rng(0).choice(len(embeddings), n_train, replace=False)
+        return embeddings[rows]
+    
+    def evaluate_recall(self, index, embeddings, k=10, n_queries=1000, ids=None):
+        """
+        Compare an approximate index against exact flat search
+        
+        A random sample of the (normalized) corpus vectors is used as queries;
+        the exact top-k from IndexFlatIP is the ground truth. ids are the
+        FAISS ids the embeddings were added under (default: their rows).
+        """
+        print(f"\n📏 Measuring recall@{k} against the flat index...")
+        
+        def to_rows(labels):
+            """Map FAISS ids back to rows, which is what the flat ground truth returns"""
+            if ids is None:
+                return labels
+            order = np.argsort(ids)
+            positions = np.clip(np.searchsorted(ids[order], labels), 0, len(ids) - 1)
+            return np.where(labels >= 0, order[positions], -1)
+        
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(embeddings), min(n_queries, len(embeddings)), replace=False)
+        queries = np.ascontiguousarray(embeddings[rows])
+        
+        flat = faiss.IndexFlatIP(embeddings.shape[1])
+        flat.add(embeddings)
+        
+        start = time.perf_counter()
+        _, truth = flat.search(queries, k)
+        flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        found = to_rows(found)
+        
+        recall_at_k = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        recall_at_1 = np.mean(found[:, 0] == truth[:, 0])
+        
+        report = {
+            "index_type": self.index_type,
+            "search_params": self.search_params,
+            "queries": len(queries),
+            "k": k,
+            f"recall@{k}": float(recall_at_k),
+            "recall@1": float(recall_at_1),
+            "flat_ms_per_query": flat_ms,
+            "index_ms_per_query": index_ms,
+            "flat_index_bytes": int(embeddings.nbytes),
+            "index_bytes": int(faiss.serialize_index(index).nbytes),
+        }
+        
+        if self.rerank_factor:
+            # Same pipeline as RAGService: over-fetch, then exact re-rank
+            start = time.perf_counter()
+            _, candidates = index.search(queries, k * self.rerank_factor)
+            _, reranked = rerank_exact(embeddings, queries, to_rows(candidates), k)
+            rerank_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            report.update({
+                "rerank_factor": self.rerank_factor,
+                f"reranked_recall@{k}": float(np.mean([len(set(f) & set(t)) / k for f, t in zip(reranked, truth)])),
+                "reranked_recall@1": float(np.mean(reranked[:, 0] == truth[:, 0])),
+                "reranked_ms_per_query": rerank_ms,
+            })
+        
+        report_path = self.index_dir / "recall_report.json"
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        
+        print(f"   🎯 recall@{k}: {recall_at_k:.4f} | recall@1: {recall_at_1:.4f}")
+        print(f"   ⏱️  {index_ms:.3f} ms/query vs {flat_ms:.3f} ms/query (flat)")
+        print(f"   🧮 index size: {report['index_bytes'] / 2**20:.1f} MiB vs {report['flat_index_bytes'] / 2**20:.1f} MiB (flat)")
+        if self.rerank_factor:
+            print(f"   🔁 re-ranked recall@{k}: {report[f'reranked_recall@{k}']:.4f} "
+                  f"({report['reranked_ms_per_query']:.3f} ms/query, {self.rerank_factor}x over-fetch)")
+        print(f"💾 Saved recall report to: {report_path}")
+        
+        return report
+    
+    def _manifest_entry(self, chunk_file, chunks, digest=None):
+        return {
+            "sha1": digest or self.file_digest(chunk_file),
+            "chunks": len(chunks),
+            "paper_ids": sorted(set(chunk["paper_id"] for chunk in chunks))
+        }
+    
+    def save_manifest(self):
+        """Save the chunk files (and their hashes) that went into this version"""
+        manifest_path = self.index_dir / MANIFEST_FILE
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.manifest}, f, indent=2)
+        print(f"💾 Saved file manifest to: {manifest_path}")
+        return manifest_path
+    
+    def save_index_and_metadata(self, index, chunks, embeddings=None, labels=None, fts_base=None, extra_stats=None):
+        """
+        Save FAISS index, chunk metadata and (for compressed indexes) full-precision vectors
+        
+        Args:
+            labels: FAISS id of each chunk (ID-mapped index), stored in the chunk store
+            fts_base: (previous chunks_fts.db, FAISS ids to delete, number of new chunks
+                at the end of chunks) to update a copy of the previous FTS5 index
+                instead of rebuilding it
+            extra_stats: Additional entries for index_stats.json
+        """
+        # Save FAISS index (in a layout RAGService can memory-map)
+        index_path = self.index_dir / "faiss_index.idx"
+        write_index(index, index_path)
         print(f"💾 Saved FAISS index to: {index_path}")
         
+        # Approximate indexes keep the exact vectors next to the index.
+        # RAGService memory-maps them to re-rank compressed indexes and to
+        # run exact paper-filtered searches
+        if self.index_type != "flat" and embeddings is not None:
+            vectors_path = self.index_dir / "vectors.npy"
+            save_vectors(embeddings, vectors_path)
+            print(f"💾 Saved full-precision vectors to: {vectors_path}")
+        
         # Save chunk metadata (maps FAISS ID → chunk data)
-        metadata_path = self.output_dir / "chunk_metadata.json"
+        metadata_path = self.index_dir / "chunk_metadata.json"
         with open(metadata_path, "w", encoding="utf-8") as f:
             json.dump(chunks, f, ensure_ascii=False, indent=2)
         print(f"💾 Saved metadata to: {metadata_path}")
         
+        # Save the columnar chunk store that RAGService maps read-only
+        # instead of loading chunk_metadata.json into Python objects
+        store_path = write_chunk_store(chunks, self.index_dir / "chunk_store", labels=labels)
+        print(f"💾 Saved chunk store to: {store_path}")
+        
+        # Save the FTS5 lexical index; rowids are FAISS ids so RAGService
+        # can fuse BM25 and dense hits
+        fts_path = self.index_dir / "chunks_fts.db"
+        if fts_base is not None:
+            base_fts_path, deleted_labels, added = fts_base
+            new_chunks = chunks[len(chunks) - added:]
+            update_fts_db(str(base_fts_path), str(fts_path), deleted_labels, new_chunks, labels[len(labels) - added:])
+        else:
+            build_fts_db(chunks, str(fts_path), rowids=labels)
+        print(f"💾 Saved FTS5 index to: {fts_path}")
+        
         # Save index statistics
-        stats_path = self.output_dir / "index_stats.json"
+        stats_path = self.index_dir / "index_stats.json"
         stats = {
             "total_vectors": index.ntotal,
             "dimension": index.d,
             "total_chunks": len(chunks),
             "unique_papers": len(set(chunk["paper_id"] for chunk in chunks)),
-            "model": self.model._model_card_vars.get("model_name", "unknown")
+            "model": self.model_name,
+            "embedding_backend": self.embedding_backend,
+            "index_type": self.index_type,
+            "search_params": self.search_params,
+            "rerank_factor": self.rerank_factor,
+            "index_options": self.index_options,
+            "id_map": labels is not None,
+            "index_bytes": int(index_path.stat().st_size),
+            **(extra_stats or {})
         }
         with open(stats_path, "w", encoding="utf-8") as f:
             json.dump(stats, f, indent=2)
@@ -132,15 +394,24 @@ class BatchEmbeddingCreator:
                 paper_mapping[paper_id] = []
             paper_mapping[paper_id].append(idx)
         
-        mapping_path = self.output_dir / "paper_index_mapping.json"
+        mapping_path = self.index_dir / "paper_index_mapping.json"
         with open(mapping_path, "w", encoding="utf-8") as f:
             json.dump(paper_mapping, f, indent=2)
         
         print(f"💾 Saved paper mapping to: {mapping_path}")
         return paper_mapping
     
-    def run_pipeline(self, max_files=100, batch_size=32):
-        """Run the complete embedding pipeline"""
+    def run_pipeline(self, max_files=100, batch_size=32, index_type="flat", **index_options):
+        """
+        Run the complete embedding pipeline
+        
+        Args:
+            max_files: Maximum number of chunk files to load
+            batch_size: Encoding batch size
+            index_type: "flat", "ivf", "hnsw", "ivfpq" or "sq8" (see build_faiss_index)
+            **index_options: nlist / nprobe / hnsw_m / ef_construction / ef_search /
+                pq_m / pq_nbits / rerank_factor
+        """
         print("="*70)
         print("🚀 BATCH EMBEDDING CREATION PIPELINE")
         print("="*70)
@@ -152,17 +423,32 @@ class BatchEmbeddingCreator:
             print("❌ No chunks to process!")
             return
         
+        # Stable FAISS ids, so later incremental runs can replace chunks by id
+        labels = chunk_labels(chunks)
+        
         # Step 2: Create embeddings
         embeddings = self.create_embeddings(chunks, batch_size=batch_size)
         
         # Step 3: Build FAISS index
-        index = self.build_faiss_index(embeddings)
+        index = self.build_faiss_index(embeddings, index_type=index_type, ids=labels, **index_options)
+        
+        # Approximate indexes: report how much recall they give up
+        recall_report = None
+        if index_type != "flat":
+            recall_report = self.evaluate_recall(index, embeddings, ids=labels)
         
         # Step 4: Save everything
-        index_path, metadata_path = self.save_index_and_metadata(index, chunks)
+        index_path, metadata_path = self.save_index_and_metadata(index, chunks, embeddings, labels=labels)
         
-        # Step 5: Create paper mapping (useful for filtering)
+        # Step 5: Create paper mapping (useful for filtering) and the file
+        # manifest that incremental runs compare against
         paper_mapping = self.create_paper_index_mapping(chunks)
+        self.save_manifest()
+        
+        # Step 6: Publish the version; RAGService picks it up through
+        # POST /admin/reload or RAG_INDEX_WATCH_SECONDS
+        publish_version(self.output_dir, self.version)
+        print(f"📌 Published index version {self.version}")
         
         # Final summary
         print("\n" + "="*70)
@@ -171,14 +457,172 @@ class BatchEmbeddingCreator:
         print(f"📊 Total Papers: {len(paper_mapping)}")
         print(f"📝 Total Chunks: {len(chunks)}")
         print(f"🔢 Embedding Dimension: {embeddings.shape[1]}")
-        print(f"📂 Output Directory: {self.output_dir}")
+        print(f"📂 Output Directory: {self.index_dir}")
         print("="*70)
         
         return {
             'index': index,
             'chunks': chunks,
             'embeddings': embeddings,
-            'paper_mapping': paper_mapping
+            'paper_mapping': paper_mapping,
+            'recall_report': recall_report,
+            'version': self.version
+        }
+
+
+    def run_incremental(self, batch_size=32, max_files=None):
+        """
+        Update the current index version with new, changed and removed chunk files
+        
+        Only the chunks of new or changed files are embedded. Their vectors
+        are added to the ID-mapped index of the current version under stable
+        chunk labels, replacing the vectors of the same papers, and the
+        vectors of papers whose files were removed are deleted. The chunk
+        store, FTS5 index, vectors.npy, paper mapping and manifest are updated
+        in step and written as a new version, which is then published.
+        
+        Falls back to run_pipeline when the current version has no ID-mapped
+        index or file manifest (builds made before incremental updates).
+        
+        Args:
+            batch_size: Encoding batch size
+            max_files: Maximum number of chunk files considered (default: all)
+        """
+        start = time.perf_counter()
+        print("="*70)
+        print("🚀 INCREMENTAL EMBEDDING UPDATE")
+        print("="*70)
+        
+        base_version, base_dir = resolve_index_dir(self.output_dir)
+        base_stats = {}
+        if (base_dir / "index_stats.json").exists():
+            with open(base_dir / "index_stats.json", "r", encoding="utf-8") as f:
+                base_stats = json.load(f)
+        manifest_path = base_dir / MANIFEST_FILE
+        if base_version == LEGACY_VERSION or not base_stats.get("id_map") or not manifest_path.exists():
+            print("⚠️  No ID-mapped index version with a file manifest yet, running a full build")
+            return self.run_pipeline(max_files=max_files, batch_size=batch_size,
+                                     index_type=base_stats.get("index_type", "flat"))
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            base_manifest = json.load(f)["files"]
+        
+        # Step 1: Compare the chunk files with the manifest of the current version
+        chunk_files = self.list_chunk_files(max_files)
+        digests = {chunk_file.name: self.file_digest(chunk_file) for chunk_file in chunk_files}
+        added = [chunk_file for chunk_file in chunk_files if chunk_file.name not in base_manifest]
+        changed = [chunk_file for chunk_file in chunk_files
+                   if chunk_file.name in base_manifest and digests[chunk_file.name] != base_manifest[chunk_file.name]["sha1"]]
+        removed = [name for name in base_manifest if name not in digests]
+        print(f"\n📂 {len(chunk_files)} chunk files: {len(added)} new, {len(changed)} changed, {len(removed)} removed")
+        
+        if not (added or changed or removed):
+            print(f"✅ Index version {base_version} is up to date")
+            shutil.rmtree(self.index_dir, ignore_errors=True)
+            return None
+        
+        # Step 2: Load the chunks of new and changed files
+        new_chunks = []
+        self.manifest = {name: entry for name, entry in base_manifest.items() if name in digests}
+        for chunk_file in tqdm(added + changed, desc="Loading chunks"):
+            file_chunks = self.load_chunk_file(chunk_file)
+            new_chunks.extend(file_chunks)
+            self.manifest[chunk_file.name] = self._manifest_entry(chunk_file, file_chunks, digests[chunk_file.name])
+        new_labels = chunk_labels(new_chunks)
+        
+        # Vectors of removed and changed files go, as do older vectors of any
+        # paper that is (re-)added, so each paper comes from one file only
+        replaced_papers = set(chunk["paper_id"] for chunk in new_chunks)
+        for name in removed + [chunk_file.name for chunk_file in changed]:
+            replaced_papers.update(base_manifest[name]["paper_ids"])
+        
+        # The loaded index is private to this process and is modified in place
+        base = IndexSnapshot.load(base_dir, base_version)
+        self.index_type = base_stats.get("index_type", "flat")
+        self.search_params = base_stats.get("search_params", {})
+        self.rerank_factor = base_stats.get("rerank_factor")
+        self.index_options = base_stats.get("index_options", {})
+        
+        drop_rows = base.paper_filter_ids(sorted(replaced_papers))
+        keep = np.ones(len(base.chunks), dtype=bool)
+        keep[drop_rows] = False
+        keep_rows = np.flatnonzero(keep)
+        drop_labels = base.labels_for_rows(drop_rows)
+        labels = np.concatenate([base.labels_for_rows(keep_rows), new_labels])
+        if len(np.unique(labels)) != len(labels):
+            raise ValueError("New chunks collide with chunk IDs of papers that are kept")
+        
+        # Step 3: Embed only the new chunks
+        if new_chunks:
+            embeddings = np.ascontiguousarray(self.create_embeddings(new_chunks, batch_size=batch_size), dtype=np.float32)
+        else:
+            embeddings = np.zeros((0, base.index.d), dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        
+        # Full-precision vectors of approximate indexes, in the new row order
+        vectors = None
+        if self.index_type != "flat":
+            if base.full_vectors is None:
+                raise FileNotFoundError(f"Index version {base_version} has no vectors.npy; run a full build")
+            vectors = np.vstack([np.asarray(base.full_vectors[keep_rows], dtype=np.float32), embeddings])
+        
+        # Step 4: Delete replaced vectors and add the new ones by label
+        print(f"\n🔨 Updating FAISS index: -{len(drop_labels)} +{len(new_labels)} vectors")
+        index = base.index
+        try:
+            if len(drop_labels):
+                index.remove_ids(faiss.IDSelectorBatch(drop_labels))
+            index.add_with_ids(embeddings, new_labels)
+        except RuntimeError:
+            # HNSW graphs cannot delete vectors: rebuild the graph from the
+            # stored vectors, which still skips re-embedding the corpus
+            print(f"⚠️  {self.index_type} index cannot remove vectors in place, rebuilding it from stored vectors")
+            if vectors is None:
+                vectors = np.vstack([base.vectors_for_rows(keep_rows), embeddings])
+            index = self.build_faiss_index(vectors.copy(), index_type=self.index_type, ids=labels, **self.index_options)
+        if index.ntotal != len(labels):
+            raise RuntimeError(f"Updated index has {index.ntotal} vectors for {len(labels)} chunks")
+        
+        # Step 5: Chunk metadata in the new row order: kept rows, then new chunks
+        base_metadata_path = base_dir / "chunk_metadata.json"
+        if base_metadata_path.exists():
+            with open(base_metadata_path, "r", encoding="utf-8") as f:
+                base_chunks = json.load(f)
+            chunks = [base_chunks[row] for row in keep_rows] + new_chunks
+        else:
+            chunks = [base.chunks[row] for row in keep_rows] + new_chunks
+        
+        fts_base = None
+        if base.fts is not None:
+            fts_base = (base_dir / "chunks_fts.db", drop_labels, len(new_chunks))
+        self.save_index_and_metadata(index, chunks, vectors, labels=labels, fts_base=fts_base, extra_stats={
+            "base_version": base_version,
+            "incremental": {"files_added": len(added), "files_changed": len(changed), "files_removed": len(removed),
+                            "vectors_added": len(new_labels), "vectors_removed": len(drop_labels)}
+        })
+        paper_mapping = self.create_paper_index_mapping(chunks)
+        self.save_manifest()
+        
+        # Step 6: Publish the version
+        publish_version(self.output_dir, self.version)
+        elapsed = time.perf_counter() - start
+        print(f"📌 Published index version {self.version}")
+        
+        print("\n" + "="*70)
+        print("🎉 INCREMENTAL UPDATE COMPLETE!")
+        print("="*70)
+        print(f"📊 Total Papers: {len(paper_mapping)}")
+        print(f"📝 Total Chunks: {len(chunks)} (+{len(new_labels)} / -{len(drop_labels)})")
+        print(f"⏱️  Elapsed: {elapsed:.1f}s")
+        print(f"📂 Output Directory: {self.index_dir}")
+        print("="*70)
+        
+        return {
+            'index': index,
+            'chunks': chunks,
+            'paper_mapping': paper_mapping,
+            'version': self.version,
+            'base_version': base_version,
+            'elapsed_seconds': elapsed
         }
 
 
@@ -187,17 +631,30 @@ class FAISSSearcher:
     Helper class for searching the FAISS index
     """
     
-    def __init__(self, index_path, metadata_path, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-        """Load FAISS index and metadata"""
+    def __init__(self, index_path, metadata_path, model_name="sentence-transformers/all-MiniLM-L6-v2",
+                 embedding_backend=None):
+        """Load FAISS index, metadata and the paper -> chunk row mapping"""
         print(f"📂 Loading FAISS index from: {index_path}")
-        self.index = faiss.read_index(str(index_path))
+        # The snapshot applies the stored search parameters, maps vectors.npy
+        # (exact filtered search) and translates FAISS ids to chunk rows
+        index_dir = Path(index_path).parent
+        self.snapshot = IndexSnapshot.load(index_dir, index_dir.name)
+        self.index = self.snapshot.index
+        self.vectors = self.snapshot.full_vectors
         
         print(f"📂 Loading metadata from: {metadata_path}")
         with open(metadata_path, "r", encoding="utf-8") as f:
             self.chunks = json.load(f)
         
+        # Written by BatchEmbeddingCreator.create_paper_index_mapping
+        mapping_path = Path(metadata_path).parent / "paper_index_mapping.json"
+        self.paper_mapping = {}
+        if mapping_path.exists():
+            with open(mapping_path, "r", encoding="utf-8") as f:
+                self.paper_mapping = json.load(f)
+        
         print(f"🤖 Loading model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        self.model = load_embedding_model(model_name, embedding_backend)
         
         print(f"✅ Loaded index with {self.index.ntotal} vectors")
     
@@ -208,7 +665,7 @@ class FAISSSearcher:
         Args:
             query: Search query text
             top_k: Number of results to return
-            filter_paper_id: Optional paper_id to filter results
+            filter_paper_id: Optional paper_id (or list of paper_ids) to restrict the search to
         """
         # Encode query
         query_embedding = self.model.encode([query], convert_to_numpy=True)
@@ -216,20 +673,14 @@ class FAISSSearcher:
         
         # Search
         if filter_paper_id:
-            # Filter by paper_id (simple post-filtering)
-            distances, indices = self.index.search(query_embedding, top_k * 10)
-            
-            filtered_results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if self.chunks[idx]["paper_id"] == filter_paper_id:
-                    filtered_results.append((dist, idx))
-                    if len(filtered_results) >= top_k:
-                        break
-            
-            return [(self.chunks[idx], float(dist)) for dist, idx in filtered_results]
+            # Pre-filter: only the chunks of the requested papers are scored
+            paper_ids = [filter_paper_id] if isinstance(filter_paper_id, str) else filter_paper_id
+            rows = [row for paper_id in paper_ids for row in self.paper_mapping.get(str(paper_id), [])]
+            distances, indices = self.snapshot.search_subset(query_embedding, top_k, rows)
         else:
-            distances, indices = self.index.search(query_embedding, top_k)
-            return [(self.chunks[idx], float(dist)) for idx, dist in zip(indices[0], distances[0])]
+            distances, indices = self.snapshot.search(query_embedding, top_k)
+        
+        return [(self.chunks[idx], float(dist)) for idx, dist in zip(indices[0], distances[0]) if idx >= 0]
 
 
 # ==================== USAGE ====================
@@ -238,8 +689,10 @@ if __name__ == "__main__":
     # Configuration
     CHUNKS_DIRECTORY = "data/chunks"
     OUTPUT_DIRECTORY = "data/embeddings"
-    MAX_FILES = 100  # Process first 100 PDFs
+    MAX_FILES = 100  # Process first 100 PDFs (full builds)
     BATCH_SIZE = 32  # Adjust based on your GPU/CPU memory
+    INDEX_TYPE = "flat"  # "flat" (exact), "ivf"/"hnsw" (ANN), "ivfpq"/"sq8" (compressed + re-ranked)
+    INCREMENTAL = False  # True: only embed new/changed chunk files and update the current version
     
     # Create embeddings
     creator = BatchEmbeddingCreator(
@@ -247,7 +700,11 @@ if __name__ == "__main__":
         output_directory=OUTPUT_DIRECTORY
     )
     
-    results = creator.run_pipeline(max_files=MAX_FILES, batch_size=BATCH_SIZE)
+    if INCREMENTAL:
+        results = creator.run_incremental(batch_size=BATCH_SIZE)
+    else:
+        results = creator.run_pipeline(max_files=MAX_FILES, batch_size=BATCH_SIZE, index_type=INDEX_TYPE)
+    _, index_dir = resolve_index_dir(OUTPUT_DIRECTORY)
     
     # Optional: Test the search functionality
     print("\n" + "="*70)
@@ -255,8 +712,8 @@ if __name__ == "__main__":
     print("="*70)
     
     searcher = FAISSSearcher(
-        index_path=OUTPUT_DIRECTORY + "/faiss_index.idx",
-        metadata_path=OUTPUT_DIRECTORY + "/chunk_metadata.json"
+        index_path=index_dir / "faiss_index.idx",
+        metadata_path=index_dir / "chunk_metadata.json"
     )
     
     # Example search
@@ -1,6 +1,6 @@
-import google.generativeai as genai
 import json
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load env variables from the correct location
@@ -11,12 +11,30 @@ print(f"Loading .env from: {env_path}")
 load_dotenv(env_path)
 
 api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError(f"⚠️ GEMINI_API_KEY not found in .env file at {env_path}")
 
-# Configure Gemini
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel("gemini-2.0-flash")
+# Gemini is configured on first use, so importing this module is cheap and
+# does not fail when the key is missing
+_model = None
+_model_lock = threading.Lock()
+
+
+def is_configured() -> bool:
+    """Whether an API key is available (does not contact Gemini)"""
+    return bool(api_key)
+
+
+def get_model():
+    """Configure Gemini and return the generative model"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if not api_key:
+                    raise ValueError(f"⚠️ GEMINI_API_KEY not found in .env file at {env_path}")
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                _model = genai.GenerativeModel("gemini-2.0-flash")
+    return _model
 
 
 # 1️⃣ Summarize function
@@ -31,18 +49,14 @@ Bullets must follow the format: Experiment → Result → Implication.
 Text:
 {text}
 """
-    response = model.generate_content(prompt)
+    response = get_model().generate_content(prompt)
     return {"summary": response.text.strip()}
 
 
 # 2️⃣ Question Answering (QA) function
-def qa(query: str, snippets: list) -> dict:
-    """
-    Answer a question using only the provided snippets.
-    Always include citations in [paper_id:page_num] format.
-    """
+def _qa_prompt(query: str, snippets: list) -> str:
     snippets_text = "\n".join(snippets)
-    prompt = f"""
+    return f"""
 Answer the question using ONLY the following snippets.
 Always cite sources using [paper_id:page_num].
 
@@ -50,10 +64,29 @@ Question: {query}
 Snippets:
 {snippets_text}
 """
-    response = model.generate_content(prompt)
+
+
+def qa(query: str, snippets: list) -> dict:
+    """
+    Answer a question using only the provided snippets.
+    Always include citations in [paper_id:page_num] format.
+    """
+    response = get_model().generate_content(_qa_prompt(query, snippets))
     return {"answer": response.text.strip()}
 
 
+def qa_stream(query: str, snippets: list):
+    """
+    Streaming variant of qa: yields pieces of the answer text as Gemini
+    generates them.
+    """
+    response = get_model().generate_content(_qa_prompt(query, snippets), stream=True)
+    for chunk in response:
+        text = chunk.text
+        if text:
+            yield text
+
+
 # 3️⃣ Knowledge Graph Extraction
 def extract_kg(text: str) -> dict:
     """
@@ -69,7 +102,7 @@ Return strictly in JSON with two keys: "entities", "relations".
 Text:
 {text}
 """
-    response = model.generate_content(prompt)
+    response = get_model().generate_content(prompt)
     return {"kg_json": response.text.strip()}
 
 
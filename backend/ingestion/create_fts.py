@@ -1,36 +1,102 @@
 import sqlite3
 import json
 import os
+import shutil
 
-# Paths
-jsonl_file = "chunks.jsonl"
-db_file = "chunks.db"
-
-# Remove old database if exists
-if os.path.exists(db_file):
-    os.remove(db_file)
-
-# Connect to SQLite
-conn = sqlite3.connect(db_file)
-c = conn.cursor()
-
-# Create FTS table
-c.execute("""
-CREATE VIRTUAL TABLE chunks USING fts5(
-    paper_id UNINDEXED,
-    text
-)
-""")
-
-# Insert data from chunks.jsonl
-with open(jsonl_file, "r", encoding="utf-8") as f:
-    for line in f:
-        chunk = json.loads(line)
-        c.execute("INSERT INTO chunks (paper_id, text) VALUES (?, ?)",
-                  (chunk["paper_id"], chunk["text"]))
-
-# Commit and close
-conn.commit()
-conn.close()
-
-print(f"{db_file} created with {jsonl_file} data!")
+# Index directory holding CURRENT and versions/ (see app/index_snapshot.py)
+embeddings_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "embeddings"))
+
+
+def _insert_chunks(cursor, chunks, rowids=None):
+    """Insert chunks keyed by their FAISS id (rowids, or the position in chunks)"""
+    if rowids is None:
+        rowids = range(len(chunks))
+    cursor.executemany(
+        "INSERT INTO chunks (rowid, paper_id, chunk_id, text) VALUES (?, ?, ?, ?)",
+        ((int(rowid), str(chunk["paper_id"]), str(chunk.get("chunk_id", row)), chunk["text"])
+         for row, (rowid, chunk) in enumerate(zip(rowids, chunks)))
+    )
+
+
+def build_fts_db(chunks, db_file, rowids=None):
+    """
+    Build an SQLite FTS5 table over chunk texts.
+
+    Each chunk is stored with rowid = its FAISS id: the given rowids for
+    ID-mapped indexes, otherwise its position in the list, so when `chunks`
+    is the FAISS-ordered chunk metadata, FTS rowids and FAISS ids share one
+    chunk-ID space.
+    """
+    tmp_file = db_file + ".tmp"
+
+    # Remove old temporary database if exists
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    # Connect to SQLite
+    conn = sqlite3.connect(tmp_file)
+    c = conn.cursor()
+
+    # Create FTS table
+    c.execute("""
+    CREATE VIRTUAL TABLE chunks USING fts5(
+        paper_id UNINDEXED,
+        chunk_id UNINDEXED,
+        text
+    )
+    """)
+
+    # Insert chunks, keyed by their FAISS id
+    _insert_chunks(c, chunks, rowids)
+
+    # Commit and close, then swap the finished database into place
+    conn.commit()
+    conn.close()
+    os.replace(tmp_file, db_file)
+
+
+def update_fts_db(base_db_file, db_file, delete_rowids, chunks, rowids):
+    """
+    Write db_file as a copy of base_db_file with the rows delete_rowids
+    removed and chunks inserted under rowids (incremental index updates).
+    """
+    tmp_file = db_file + ".tmp"
+    shutil.copyfile(base_db_file, tmp_file)
+
+    conn = sqlite3.connect(tmp_file)
+    c = conn.cursor()
+    c.executemany("DELETE FROM chunks WHERE rowid = ?", ((int(rowid),) for rowid in delete_rowids))
+    _insert_chunks(c, chunks, rowids)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_file, db_file)
+
+
+def rebuild_current_fts(base_dir=embeddings_dir):
+    """
+    Rebuild chunks_fts.db of the version CURRENT points at from its chunk
+    store, with the chunk labels as rowids so that lexical hits map to the
+    same chunks as FAISS ids. Builds without a chunk store (the legacy flat
+    layout) are rebuilt from chunk_metadata.json with positional rowids.
+    """
+    from app.index_snapshot import resolve_index_dir
+    from app.chunk_store import ChunkStore
+
+    version, directory = resolve_index_dir(base_dir)
+    chunk_store_path = directory / "chunk_store"
+    if chunk_store_path.exists():
+        store = ChunkStore.open(chunk_store_path)
+        chunks, rowids = list(store), store.labels
+    else:
+        with open(directory / "chunk_metadata.json", "r", encoding="utf-8") as f:
+            chunks, rowids = json.load(f), None
+
+    db_file = str(directory / "chunks_fts.db")
+    build_fts_db(chunks, db_file, rowids=rowids)
+    return version, db_file, len(chunks)
+
+
+if __name__ == "__main__":
+    # Run from backend/: python -m ingestion.create_fts
+    version, db_file, count = rebuild_current_fts()
+    print(f"{db_file} created with {count} chunks (index version {version})!")
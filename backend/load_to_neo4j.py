@@ -1,7 +1,33 @@
+"""
+Load the extracted entities (data/entities/*_entities.jsonl) into Neo4j.
+
+All files are read first and their values grouped by label, then nodes and
+relationships are written in UNWIND batches (see app/neo4j_batch.py).
+
+With --workers N the writes run in parallel, in two phases so that writers
+do not wait on each other's locks:
+
+  1. nodes: the deduplicated values of every label are split into batches
+     dealt out to the workers, so each node is merged by exactly one worker;
+  2. relationships: every distinct pair is assigned to the first paper it
+     occurs in, and whole papers are partitioned across the workers.
+
+Rows are sorted by key so that workers lock shared end nodes in the same
+order. Deadlocks and other transient errors are retried by the driver for up
+to --retry-time seconds. Throughput is reported per worker.
+
+    python load_to_neo4j.py [--entities-dir data/entities] [--batch-size 1000] [--workers 4]
+"""
 from neo4j import GraphDatabase
+import argparse
+import glob
 import json
 import os
+import time
 from dotenv import load_dotenv
+from app.graph_version import bump_graph_version
+from app.neo4j_batch import (BATCH_SIZE, BatchWriter, WriteStats, batches, merge_nodes_query,
+                             merge_relationships_query, partition_groups, run_workers)
 
 # Load .env
 load_dotenv()
@@ -10,49 +36,156 @@ URI = os.getenv("NEO4J_URI")
 USER = os.getenv("NEO4J_USER")
 PASSWORD = os.getenv("NEO4J_PASSWORD")
 
-driver = GraphDatabase.driver(URI, auth=(USER, PASSWORD))
+ENTITIES_DIR = "data/entities"
+
+# Extraction file key -> (node label, key property)
+ENTITY_NODES = {
+    "organism": ("Organism", "name"),
+    "assay": ("Assay", "name"),
+    "gene": ("Gene", "name"),
+    "mission": ("Mission", "name"),
+    "experimenttype": ("Experiment", "name"),
+    "outcome": ("Outcome", "description"),
+}
+
+# (source key, target key, type): the first values of both keys in a chunk are linked
+ENTITY_RELATIONSHIPS = [
+    ("organism", "mission", "INVOLVED_IN"),
+    ("assay", "outcome", "HAS_RESULT"),
+]
+
+
+def read_entities(entities_dir):
+    """
+    Distinct node values per file key and distinct (source, target) pairs
+    per relationship type over every *_entities.jsonl file. Each pair maps
+    to the paper it first occurs in.
+    """
+    nodes = {key: set() for key in ENTITY_NODES}
+    relationships = {rel_type: {} for _, _, rel_type in ENTITY_RELATIONSHIPS}
+    paths = sorted(glob.glob(os.path.join(entities_dir, "*_entities.jsonl")))
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                values = {key: [v for v in data.get(key) or [] if isinstance(v, str) and v]
+                          for key in ENTITY_NODES}
+                for key, key_values in values.items():
+                    nodes[key].update(key_values)
+                for source_key, target_key, rel_type in ENTITY_RELATIONSHIPS:
+                    if values[source_key] and values[target_key]:
+                        pair = (values[source_key][0], values[target_key][0])
+                        relationships[rel_type].setdefault(pair, str(data.get("paper_id")))
+    return paths, nodes, relationships
 
-def create_nodes_and_relationships(tx, data):
-    # Nodes
-    for org in data.get("organism", []):
-        tx.run("MERGE (o:Organism {name: $name})", name=org)
 
-    for assay in data.get("assay", []):
-        tx.run("MERGE (a:Assay {name: $name})", name=assay)
+def relationship_query(source_key, target_key, rel_type):
+    source_label, source_prop = ENTITY_NODES[source_key]
+    target_label, target_prop = ENTITY_NODES[target_key]
+    return merge_relationships_query(source_label, source_prop, rel_type, target_label, target_prop)
 
-    for gene in data.get("gene", []):
-        tx.run("MERGE (g:Gene {name: $name})", name=gene)
 
-    for mission in data.get("mission", []):
-        tx.run("MERGE (m:Mission {name: $name})", name=mission)
+def write_entities(session, nodes, relationships, batch_size=BATCH_SIZE):
+    """Write the output of read_entities in UNWIND batches; returns the WriteStats"""
+    writer = BatchWriter(session, batch_size, WriteStats("load_to_neo4j"))
+    for key, (label, prop) in ENTITY_NODES.items():
+        rows = [{prop: value} for value in sorted(nodes[key])]
+        writer.write(merge_nodes_query(label, prop), rows, kind="nodes")
+        print(f"  {label}: {len(rows):,} nodes")
 
-    for exp in data.get("experimenttype", []):
-        tx.run("MERGE (e:Experiment {name: $name})", name=exp)
+    for source_key, target_key, rel_type in ENTITY_RELATIONSHIPS:
+        rows = [{"source": source, "target": target} for source, target in sorted(relationships[rel_type])]
+        writer.write(relationship_query(source_key, target_key, rel_type), rows, kind="relationships")
+        print(f"  {rel_type}: {len(rows):,} relationships")
+    return writer.stats
 
-    for out in data.get("outcome", []):
-        tx.run("MERGE (o:Outcome {description: $desc})", desc=out)
 
-    # Relationships
-    if data.get("organism") and data.get("mission"):
-        tx.run("""
-            MATCH (o:Organism {name: $org}), (m:Mission {name: $mission})
-            MERGE (o)-[:INVOLVED_IN]->(m)
-        """, org=data["organism"][0], mission=data["mission"][0])
+def node_partitions(nodes, workers, batch_size=BATCH_SIZE):
+    """Phase 1 tasks per worker: node batches of every label, dealt out in turn"""
+    partitions = [[] for _ in range(workers)]
+    turn = 0
+    for key, (label, prop) in ENTITY_NODES.items():
+        query = merge_nodes_query(label, prop)
+        for batch in batches(({prop: value} for value in sorted(nodes[key])), batch_size):
+            partitions[turn % workers].append((query, batch, "nodes"))
+            turn += 1
+    return partitions
+
+
+def relationship_partitions(relationships, workers):
+    """Phase 2 tasks per worker: the relationships of the papers assigned to it"""
+    by_paper = {}
+    for rel_type, pairs in relationships.items():
+        for pair, paper_id in pairs.items():
+            by_paper.setdefault(paper_id, []).append((rel_type, pair))
+
+    partitions = []
+    for papers in partition_groups(by_paper, workers):
+        tasks = []
+        for source_key, target_key, rel_type in ENTITY_RELATIONSHIPS:
+            pairs = sorted(pair for paper_id in papers for pair_type, pair in by_paper[paper_id]
+                           if pair_type == rel_type)
+            if pairs:
+                rows = [{"source": source, "target": target} for source, target in pairs]
+                tasks.append((relationship_query(source_key, target_key, rel_type), rows, "relationships"))
+        partitions.append(tasks)
+    return partitions
+
+
+def write_entities_parallel(driver, nodes, relationships, workers, batch_size=BATCH_SIZE):
+    """write_entities on a pool of workers, nodes first; returns the merged WriteStats"""
+    total = WriteStats("load_to_neo4j")
+    phases = [
+        ("nodes", node_partitions(nodes, workers, batch_size)),
+        ("relationships", relationship_partitions(relationships, workers)),
+    ]
+    for phase, partitions in phases:
+        start = time.perf_counter()
+        worker_stats = run_workers(driver, partitions, batch_size, name=f"{phase}-worker")
+        elapsed = time.perf_counter() - start
+        for stats in worker_stats:
+            print(f"  {stats.report()}")
+            total.merge(stats)
+        rows = sum(stats.rows.get(phase, 0) for stats in worker_stats)
+        print(f"  {phase}: {rows:,} rows on {len(worker_stats)} workers in {elapsed:.2f}s "
+              f"({rows / elapsed if elapsed > 0 else 0:,.0f}/s)")
+    return total
 
-    if data.get("assay") and data.get("outcome"):
-        tx.run("""
-            MATCH (a:Assay {name: $assay}), (o:Outcome {description: $outcome})
-            MERGE (a)-[:HAS_RESULT]->(o)
-        """, assay=data["assay"][0], outcome=data["outcome"][0])
 
 def main():
-    with driver.session() as session:
-        with open("data/papers/1_entities.jsonl", "r", encoding="utf-8") as f:
-            for line in f:
-                data = json.loads(line)
-                session.execute_write(create_nodes_and_relationships, data)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities-dir", default=ENTITIES_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per UNWIND transaction")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel writers (1 = sequential)")
+    parser.add_argument("--retry-time", type=float, default=30.0,
+                        help="Seconds a batch is retried after deadlocks and other transient errors")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths, nodes, relationships = read_entities(args.entities_dir)
+    if not paths:
+        raise SystemExit(f"❌ No *_entities.jsonl files in {args.entities_dir}")
+    print(f"📄 Read {len(paths)} entity files in {time.perf_counter() - start:.2f}s")
+
+    driver_config = {"max_transaction_retry_time": args.retry_time,
+                     "max_connection_pool_size": max(100, args.workers + 1)}
+    with GraphDatabase.driver(URI, auth=(USER, PASSWORD), **driver_config) as driver:
+        write_start = time.perf_counter()
+        if args.workers > 1:
+            stats = write_entities_parallel(driver, nodes, relationships, args.workers, args.batch_size)
+        else:
+            with driver.session() as session:
+                stats = write_entities(session, nodes, relationships, args.batch_size)
+        write_seconds = time.perf_counter() - write_start
+
+        # Invalidate graph lookups cached by the RAG service
+        with driver.session() as session:
+            version = session.execute_write(bump_graph_version)
 
-    print("✅ Data loaded into Neo4j")
+    print(f"📊 {stats.report(write_seconds)}")
+    print(f"✅ Data loaded into Neo4j (graph version {version}) in {time.perf_counter() - start:.2f}s")
 
 if __name__ == "__main__":
     main()
@@ -4,6 +4,7 @@ from neo4j import GraphDatabase
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel
+from app.fulltext import ENTITY_NAME_INDEX, OUTCOME_DESCRIPTION_INDEX, fulltext_query
 
 load_dotenv()
 
@@ -27,19 +28,33 @@ class SearchRequest(BaseModel):
 
 def search_papers(query: str):
     """Search across Neo4j knowledge graph"""
+    search = fulltext_query(query)
+    if not search:
+        return []
     with driver.session() as session:
+        # Nodes matching by name or outcome description (full-text indexes),
+        # with their relationships
         result = session.run("""
+            CALL {
+                CALL db.index.fulltext.queryNodes($name_index, $search) YIELD node, score
+                RETURN node, score
+                UNION ALL
+                CALL db.index.fulltext.queryNodes($description_index, $search) YIELD node, score
+                RETURN node, score
+            }
+            WITH node AS m, max(score) AS score
+            ORDER BY score DESC
+            LIMIT 10
             MATCH (n)-[r]-(m)
-            WHERE n.name CONTAINS $query 
-               OR m.name CONTAINS $query 
-               OR m.description CONTAINS $query
             RETURN DISTINCT 
                 coalesce(n.name, m.name) as title,
                 coalesce(m.description, n.name) as summary,
                 labels(n)[0] + " -> " + type(r) + " -> " + labels(m)[0] as relationship,
-                randomUUID() as id
+                randomUUID() as id,
+                score
+            ORDER BY score DESC
             LIMIT 10
-        """, query=query)
+        """, name_index=ENTITY_NAME_INDEX, description_index=OUTCOME_DESCRIPTION_INDEX, search=search)
         
         papers = []
         for record in result:
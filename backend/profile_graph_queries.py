@@ -0,0 +1,107 @@
+"""
+Compare database hits of the graph search queries before and after the switch
+from toLower(...) CONTAINS toLower(...) scans to full-text index lookups.
+
+Each query is run with PROFILE and the dbHits of every operator in the plan
+are summed. Run app/setup_constraints.py first so the full-text indexes exist.
+
+    python profile_graph_queries.py [--terms microgravity "bone loss" Arabidopsis]
+"""
+import argparse
+
+from app.neo4j_client import get_driver
+from app.fulltext import (ENTITY_NAME_INDEX, PAPER_TITLE_INDEX, NODE_SEARCH_QUERY,
+                          GRAPH_SEARCH_QUERY, fulltext_query)
+from app.rag_service import ENTITY_PAPERS_QUERY, ENTITY_SEED_LIMIT
+
+# Queries as they were before the full-text indexes
+LEGACY_NODE_SEARCH_QUERY = """
+MATCH (n)
+WHERE toLower(n.name) CONTAINS toLower($q)
+RETURN n LIMIT 20
+"""
+
+LEGACY_GRAPH_SEARCH_QUERY = """
+MATCH (n)-[r]->(m)
+WHERE (n.name IS NOT NULL AND toLower(n.name) CONTAINS toLower($search_query))
+   OR (m.name IS NOT NULL AND toLower(m.name) CONTAINS toLower($search_query))
+RETURN n, r, m
+LIMIT 100
+"""
+
+LEGACY_ENTITY_PAPERS_QUERY = """
+MATCH (p:Paper)-[r1]-(e1)-[r2]-(e2)-[r3]-(p2:Paper)
+WHERE ANY(entity IN $entities WHERE
+    toLower(e1.name) CONTAINS toLower(entity) OR
+    toLower(e2.name) CONTAINS toLower(entity) OR
+    toLower(p.title) CONTAINS toLower(entity) OR
+    toLower(p2.title) CONTAINS toLower(entity)
+)
+WITH DISTINCT p, p2,
+    collect(DISTINCT e1.name) as entities1,
+    collect(DISTINCT e2.name) as entities2,
+    collect(DISTINCT type(r1)) as rel_types1,
+    collect(DISTINCT type(r2)) as rel_types2,
+    collect(DISTINCT type(r3)) as rel_types3
+RETURN DISTINCT p.paper_id as paper_id,
+    p.title as title,
+    entities1 + entities2 as all_entities,
+    rel_types1 + rel_types2 + rel_types3 as all_relationships,
+    size(entities1 + entities2) as entity_count
+ORDER BY entity_count DESC
+LIMIT 20
+"""
+
+
+def total_db_hits(plan) -> int:
+    """Sum of dbHits over a profiled plan and its children"""
+    if not plan:
+        return 0
+    hits = plan.get("dbHits", plan.get("args", {}).get("DbHits", 0)) or 0
+    return hits + sum(total_db_hits(child) for child in plan.get("children", []))
+
+
+def profile(session, cypher: str, **params):
+    """(db hits, rows) of a PROFILE run"""
+    result = session.run("PROFILE " + cypher, **params)
+    rows = len(list(result))
+    return total_db_hits(result.consume().profile), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terms", nargs="+", default=["microgravity", "bone loss", "Arabidopsis", "mice"])
+    args = parser.parse_args()
+
+    driver = get_driver()
+    if driver is None:
+        raise SystemExit("❌ Neo4j is not configured (NEO4J_URI / NEO4J_PASSWORD)")
+
+    print(f"{'query':<16} {'term':<16} {'before':>12} {'after':>12} {'ratio':>8}   rows before/after")
+    with driver.session() as session:
+        for term in args.terms:
+            search = fulltext_query(term)
+            cases = [
+                ("/search",
+                 (LEGACY_NODE_SEARCH_QUERY, {"q": term}),
+                 (NODE_SEARCH_QUERY, {"index": ENTITY_NAME_INDEX, "search": search})),
+                ("/graph?query=",
+                 (LEGACY_GRAPH_SEARCH_QUERY, {"search_query": term}),
+                 (GRAPH_SEARCH_QUERY, {"index": ENTITY_NAME_INDEX, "search_query": search})),
+                ("entity papers",
+                 (LEGACY_ENTITY_PAPERS_QUERY, {"entities": [term]}),
+                 (ENTITY_PAPERS_QUERY, {"entity_index": ENTITY_NAME_INDEX, "paper_index": PAPER_TITLE_INDEX,
+                                        "search": search, "seed_limit": ENTITY_SEED_LIMIT})),
+            ]
+            for name, (before_query, before_params), (after_query, after_params) in cases:
+                before_hits, before_rows = profile(session, before_query, **before_params)
+                after_hits, after_rows = profile(session, after_query, **after_params)
+                ratio = before_hits / after_hits if after_hits else float("inf")
+                print(f"{name:<16} {term[:16]:<16} {before_hits:>12,} {after_hits:>12,} {ratio:>7.1f}x   "
+                      f"{before_rows}/{after_rows}")
+
+    print("✅ Profiling complete")
+
+
+if __name__ == "__main__":
+    main()